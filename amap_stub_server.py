@@ -0,0 +1,211 @@
+"""
+高德步行路线接口的本地替身服务，用于压测和离线开发
+
+用法：
+    python amap_stub_server.py --port 8765 --latency-ms 120 --jitter 0.5
+    AMAP_REST_HOST=http://127.0.0.1:8765 streamlit run suzhou_tour_map.py
+
+实现 /v3/direction/walking（在起终点之间生成一条带轻微偏折的折线）、
+/v4/direction/bicycling（骑行，v4 返回格式）、/v3/direction/transit/integrated
+（公交，步行接驳 + 一段公交，延迟为其他接口的两倍）和
+/v3/geocode/geo（按地名哈希在苏州市区生成固定坐标，支持 batch）和
+/v3/distance（多个起点到一个终点的步行距离，取直线距离乘绕行系数），
+并按对数正态分布模拟接口延迟。
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from routing_providers import haversine, parse_coord, MODE_SPEEDS, WALKING_SPEED
+
+
+def fake_polyline(origin, destination, n_points=12, bend=0.08):
+    """起终点之间带偏折的折线，返回 (坐标字符串列表, 估算路程)"""
+    origin_lng, origin_lat = parse_coord(origin)
+    dest_lng, dest_lat = parse_coord(destination)
+    points = []
+    for i in range(n_points + 1):
+        t = i / n_points
+        # 沿垂直方向做正弦偏移，模拟沿街道绕行
+        offset = bend * math.sin(math.pi * t)
+        lng = origin_lng + (dest_lng - origin_lng) * t - (dest_lat - origin_lat) * offset
+        lat = origin_lat + (dest_lat - origin_lat) * t + (dest_lng - origin_lng) * offset
+        points.append(f"{lng:.6f},{lat:.6f}")
+    return points, 1.3 * haversine(origin_lng, origin_lat, dest_lng, dest_lat)
+
+
+def fake_walking_route(origin, destination, n_points=12):
+    """在起终点之间生成一条带偏折的步行折线（高德返回格式）"""
+    points, distance = fake_polyline(origin, destination, n_points)
+    return {
+        'status': '1',
+        'info': 'OK',
+        'route': {
+            'origin': origin,
+            'destination': destination,
+            'paths': [{
+                'distance': str(int(distance)),
+                'duration': str(int(distance / WALKING_SPEED)),
+                'steps': [{'polyline': ';'.join(points)}]
+            }]
+        }
+    }
+
+
+def fake_bicycling_route(origin, destination, n_points=12):
+    """骑行路线（高德 v4 返回格式：data.paths，errcode 为 0 表示成功）"""
+    points, distance = fake_polyline(origin, destination, n_points, bend=0.05)
+    return {
+        'errcode': 0,
+        'errmsg': 'OK',
+        'data': {
+            'origin': origin,
+            'destination': destination,
+            'paths': [{
+                'distance': int(distance),
+                'duration': int(distance / MODE_SPEEDS['bicycling']),
+                'steps': [{'polyline': ';'.join(points)}]
+            }]
+        }
+    }
+
+
+def fake_transit_route(origin, destination, n_points=12):
+    """公交路线：前后各一段步行接驳，中间一段公交（高德 transit/integrated 返回格式）"""
+    points, distance = fake_polyline(origin, destination, n_points, bend=0.03)
+    first, last = n_points // 6, n_points - n_points // 6
+    walking_distance = int(distance * 2 * first / n_points)
+    return {
+        'status': '1',
+        'info': 'OK',
+        'route': {
+            'origin': origin,
+            'destination': destination,
+            'distance': str(int(distance)),
+            'transits': [{
+                'distance': str(int(distance)),
+                'duration': str(int(distance / MODE_SPEEDS['transit'])),
+                'walking_distance': str(walking_distance),
+                'segments': [
+                    {
+                        'walking': {'steps': [{'polyline': ';'.join(points[:first + 1])}]},
+                        'bus': {'buslines': [{'name': '游2路', 'polyline': ';'.join(points[first:last + 1])}]}
+                    },
+                    {
+                        'walking': {'steps': [{'polyline': ';'.join(points[last:])}]},
+                        'bus': {'buslines': []}
+                    }
+                ]
+            }]
+        }
+    }
+
+
+def fake_distances(origins, destination):
+    """多个起点到同一终点的步行距离（高德距离测量接口返回格式），路程与 fake_polyline 一致"""
+    dest_lng, dest_lat = parse_coord(destination)
+    results = []
+    for i, origin in enumerate(origins, 1):
+        distance = 1.3 * haversine(*parse_coord(origin), dest_lng, dest_lat)
+        results.append({
+            'origin_id': str(i),
+            'dest_id': '1',
+            'distance': str(int(distance)),
+            'duration': str(int(distance / WALKING_SPEED)),
+        })
+    return {'status': '1', 'info': 'OK', 'count': str(len(results)), 'results': results}
+
+
+def fake_geocode(addresses):
+    """按地名哈希在苏州市区范围内生成固定坐标（高德地理编码返回格式）"""
+    geocodes = []
+    for address in addresses:
+        digest = hashlib.sha256(address.encode('utf-8')).digest()
+        lng = 120.55 + 0.12 * digest[0] / 255.0
+        lat = 31.26 + 0.10 * digest[1] / 255.0
+        geocodes.append({
+            'formatted_address': f"江苏省苏州市{address}",
+            'city': '苏州市',
+            'location': f"{lng:.6f},{lat:.6f}",
+        })
+    return {'status': '1', 'info': 'OK', 'count': str(len(geocodes)), 'geocodes': geocodes}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency_ms = 0.0
+    jitter = 0.0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == '/v3/direction/walking' and 'origin' in params and 'destination' in params:
+            self.simulate_latency()
+            body = fake_walking_route(params['origin'], params['destination'])
+        elif url.path == '/v4/direction/bicycling' and 'origin' in params and 'destination' in params:
+            self.simulate_latency()
+            body = fake_bicycling_route(params['origin'], params['destination'])
+        elif url.path == '/v3/direction/transit/integrated' and 'origin' in params and 'destination' in params:
+            # 公交规划需要计算换乘，通常明显慢于步行和骑行
+            self.simulate_latency(scale=2.0)
+            body = fake_transit_route(params['origin'], params['destination'])
+        elif url.path == '/v3/distance' and params.get('origins') and 'destination' in params:
+            self.simulate_latency()
+            body = fake_distances(params['origins'].split('|')[:100], params['destination'])
+        elif url.path == '/v3/geocode/geo' and params.get('address'):
+            self.simulate_latency()
+            addresses = params['address'].split('|') if params.get('batch') == 'true' else [params['address']]
+            body = fake_geocode(addresses[:10])
+        else:
+            body = {'status': '0', 'info': 'INVALID_PARAMS'}
+
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def simulate_latency(self, scale=1.0):
+        if self.latency_ms > 0:
+            time.sleep(scale * self.latency_ms / 1000.0 * random.lognormvariate(0, self.jitter))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port=0, latency_ms=0.0, jitter=0.0):
+    """在后台线程启动替身服务，返回 (server, 访问地址)；port=0 表示自动分配端口"""
+    handler = type('ConfiguredStubHandler', (StubHandler,), {
+        'latency_ms': latency_ms,
+        'jitter': jitter,
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='高德接口本地替身（步行 / 骑行 / 公交路线、地理编码）')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='模拟接口延迟的中位数（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='延迟的对数正态分布标准差')
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.port, args.latency_ms, args.jitter)
+    print(f"高德替身服务已启动：{url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+Batch curve fitting: one kinetic model fitted to thousands of series at once.
+
+The series are stacked into an (n_series, n_points) array and fitted by a
+vectorized Levenberg-Marquardt iteration: every step evaluates the model and
+its analytic Jacobian (kinetic_models) for all active series in one call,
+forms the k x k normal equations with einsum and solves them with a batched
+np.linalg.solve.  Each series keeps its own damping factor and stops on its
+own; only the series still iterating are carried into the next step.
+
+Series that do not converge (damping blown up, iteration limit, non-finite
+parameters) are refitted one by one with scipy's curve_fit in a process pool.
+
+    result = fit_batch(logistic_decay, t, Y)            # Y: (n_series, n_points)
+    result.params       (n_series, n_params)
+    result.covariance   (n_series, n_params, n_params)  same scaling as curve_fit
+    result.converged    (n_series,) bool
+    result.method       'batch', 'fallback' or 'failed' per series
+
+NaN values in Y are treated as missing points.  t is shared by all series
+(n_points,) or given per series (n_series, n_points).
+
+Command line (first CSV column is time, every other column is a series):
+    python batch_fit.py 生成数据_带噪音.csv --model exp_decay_offset
+Benchmarks: python bench_batch_fit.py
+"""
+import argparse
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.optimize import curve_fit
+
+from kinetic_models import MODELS, get_model, model_reference, resolve_model
+
+# Same stopping tolerances as curve_fit's lm (MINPACK): sqrt(machine epsilon)
+DEFAULT_FTOL = 1.49012e-08
+DEFAULT_XTOL = 1.49012e-08
+DEFAULT_GTOL = 0.0
+
+# Damping factor bounds; a series whose damping exceeds LAMBDA_MAX cannot make progress
+LAMBDA_INIT = 1e-3
+LAMBDA_MIN = 1e-12
+LAMBDA_MAX = 1e16
+
+# Fewer failed series than this are refitted in-process (a pool costs more than it saves)
+MIN_POOL_SERIES = 8
+
+
+class BatchFitResult:
+    """Result of fit_batch; all arrays are indexed by series"""
+
+    def __init__(self, params, covariance, converged, n_iter, sse, method):
+        self.params = params
+        self.covariance = covariance
+        self.converged = converged
+        self.n_iter = n_iter
+        self.sse = sse
+        self.method = method
+
+    def __len__(self):
+        return len(self.params)
+
+    @property
+    def n_fallback(self):
+        return int(np.sum(self.method != 'batch'))
+
+    def __repr__(self):
+        return (f"BatchFitResult({len(self)} series, {int(self.converged.sum())} converged, "
+                f"{self.n_fallback} refitted individually)")
+
+
+def _evaluate(model, t, params):
+    """Model values for each row of params; t is (n_points,) or (n, n_points)"""
+    return model(t, *(params[:, i:i + 1] for i in range(params.shape[1])))
+
+
+def _jacobian(model, t, params, shape):
+    jac = model.jac(t, *(params[:, i:i + 1] for i in range(params.shape[1])))
+    return np.broadcast_to(jac, shape + (params.shape[1],))
+
+
+def _normal_equations(jac, residuals):
+    """J^T J and J^T r for every series"""
+    return np.einsum('nmi,nmj->nij', jac, jac), np.einsum('nmi,nm->ni', jac, residuals)
+
+
+def _masked_residuals(model, t, params, y, mask):
+    residuals = _evaluate(model, t, params) - y
+    return np.where(mask, residuals, 0.0)
+
+
+def _covariance(jtj, sse, dof):
+    """curve_fit's covariance: pinv(J^T J) scaled by the residual variance (inf without spare points)"""
+    cov = np.linalg.pinv(jtj)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = np.where(dof > 0, sse / np.maximum(dof, 1), np.inf)
+        cov = cov * scale[:, None, None]
+    cov[dof <= 0] = np.inf
+    return cov
+
+
+def levenberg_marquardt(model, t, y, p0, mask=None, max_iter=None, ftol=DEFAULT_FTOL,
+                        xtol=DEFAULT_XTOL, gtol=DEFAULT_GTOL):
+    """
+    Vectorized Levenberg-Marquardt over all rows of y.
+
+    Returns (params, converged, n_iter, sse, jtj) where jtj is J^T J at the
+    final parameters (used for the covariance).
+    """
+    n_series = y.shape[0]
+    params = np.array(p0, dtype=float)
+    n_params = params.shape[1]
+    if max_iter is None:
+        max_iter = 100 * (n_params + 1)
+    if mask is None:
+        mask = np.ones(y.shape, dtype=bool)
+    y = np.where(mask, y, 0.0)
+    t_rows = t.ndim == 2
+
+    residuals = _masked_residuals(model, t, params, y, mask)
+    sse = np.einsum('nm,nm->n', residuals, residuals)
+    jac = np.where(mask[..., None], _jacobian(model, t, params, y.shape), 0.0)
+    jtj, jtr = _normal_equations(jac, residuals)
+
+    # Marquardt scaling as in MINPACK: damp each parameter by the largest curvature seen so far
+    scale = np.einsum('nii->ni', jtj).copy()
+    lam = np.full(n_series, LAMBDA_INIT)
+    nu = np.full(n_series, 2.0)
+    converged = np.zeros(n_series, dtype=bool)
+    n_iter = np.zeros(n_series, dtype=int)
+    active = np.flatnonzero(np.isfinite(sse) & np.isfinite(jtj).all(axis=(1, 2)))
+    # Only a series with at least one point per parameter can be fitted perfectly
+    determined = mask.sum(axis=1) >= n_params
+    eye = np.eye(n_params)
+
+    for _ in range(max_iter):
+        if active.size == 0:
+            break
+        a_jtj, a_jtr, a_lam = jtj[active], jtr[active], lam[active]
+        diag = np.maximum(scale[active], np.einsum('nii->ni', a_jtj))
+        diag = np.maximum(diag, 1e-12 * np.maximum(diag.max(axis=1, keepdims=True), 1e-300))
+        scale[active] = diag
+        damped = a_jtj + (a_lam[:, None] * diag)[:, :, None] * eye
+        try:
+            step = -np.linalg.solve(damped, a_jtr[:, :, None])[:, :, 0]
+        except np.linalg.LinAlgError:
+            # A degenerate series makes the whole stack fail; pinv handles it row by row
+            step = -np.einsum('nij,nj->ni', np.linalg.pinv(damped), a_jtr)
+
+        a_params = params[active]
+        trial = a_params + step
+        a_t = t[active] if t_rows else t
+        a_y, a_mask = y[active], mask[active]
+        trial_residuals = _masked_residuals(model, a_t, trial, a_y, a_mask)
+        trial_sse = np.einsum('nm,nm->n', trial_residuals, trial_residuals)
+        n_iter[active] += 1
+
+        # Gain ratio of actual to predicted reduction drives the damping (Nielsen's update)
+        a_sse = sse[active]
+        predicted = -2 * np.einsum('ni,ni->n', step, a_jtr) - np.einsum('ni,nij,nj->n', step, a_jtj, step)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rho = (a_sse - trial_sse) / predicted
+        accepted = np.isfinite(trial_sse) & (trial_sse <= a_sse) & (rho > 0)
+        a_nu = nu[active]
+        shrink = np.maximum(1 / 3, 1 - (2 * np.where(accepted, rho, 0) - 1) ** 3)
+        lam[active] = np.where(accepted, np.maximum(a_lam * shrink, LAMBDA_MIN), a_lam * a_nu)
+        nu[active] = np.where(accepted, 2.0, a_nu * 2)
+
+        done = np.zeros(active.size, dtype=bool)
+        if accepted.any():
+            idx = active[accepted]
+            old_sse = sse[idx]
+            new_sse = trial_sse[accepted]
+            new_params = trial[accepted]
+            params[idx] = new_params
+            sse[idx] = new_sse
+            residuals = trial_residuals[accepted]
+            jac = np.where(a_mask[accepted][..., None],
+                           _jacobian(model, t[idx] if t_rows else t, new_params, residuals.shape), 0.0)
+            jtj[idx], jtr[idx] = _normal_equations(jac, residuals)
+
+            # MINPACK's ftol test: both the actual and the predicted relative reduction are small
+            small_f = np.maximum(old_sse - new_sse, predicted[accepted]) <= ftol * np.maximum(old_sse, 1e-300)
+            small_x = np.linalg.norm(step[accepted], axis=1) <= xtol * (np.linalg.norm(new_params, axis=1) + xtol)
+            small_g = np.abs(jtr[idx]).max(axis=1) <= gtol
+            done[accepted] = small_f | small_x | small_g
+            converged[idx[done[accepted]]] = True
+
+        # A perfect fit leaves nothing to reduce
+        perfect = (sse[active] == 0.0) & determined[active]
+        done |= sse[active] == 0.0
+        converged[active[perfect]] = True
+        done |= lam[active] > LAMBDA_MAX
+        done |= ~np.isfinite(params[active]).all(axis=1)
+        active = active[~done]
+
+    converged &= np.isfinite(params).all(axis=1)
+    return params, converged, n_iter, sse, jtj
+
+
+def _fit_one(job):
+    """Refit a single series with curve_fit (runs in a worker process)"""
+    model, t, y, keep, p0, maxfev = job
+    model = resolve_model(model)
+    try:
+        popt, pcov = curve_fit(model, t[keep], y[keep], p0=p0, jac=model.jac, method='lm', maxfev=maxfev or 0)
+    except (RuntimeError, ValueError, np.linalg.LinAlgError):
+        return None
+    residuals = model(t[keep], *popt) - y[keep]
+    return popt, pcov, float(residuals @ residuals)
+
+
+def _refit(model, t, y, mask, p0, indices, workers, maxfev):
+    jobs = [(model_reference(model), t[i] if t.ndim == 2 else t, y[i], mask[i], p0[i], maxfev) for i in indices]
+    if workers == 1 or len(jobs) < MIN_POOL_SERIES:
+        return [_fit_one(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_fit_one, jobs, chunksize=max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))))
+
+
+def fit_batch(model, t, y, p0=None, max_iter=None, ftol=DEFAULT_FTOL, xtol=DEFAULT_XTOL,
+              gtol=DEFAULT_GTOL, fallback=True, workers=None, maxfev=None):
+    """
+    Fit model to every row of y.
+
+    model    a KineticModel (or its name in kinetic_models.MODELS)
+    t        (n_points,) shared time axis, or (n_series, n_points)
+    y        (n_series, n_points); NaN marks a missing point
+    p0       (n_params,) shared start, (n_series, n_params) per series, or model.p0
+    max_iter iterations per series, default 100 * (n_params + 1) like MINPACK's lm
+    fallback refit unconverged series with curve_fit in a process pool of `workers`
+    """
+    model = resolve_model(model)
+    y = np.atleast_2d(np.asarray(y, dtype=float))
+    t = np.asarray(t, dtype=float)
+    n_series, n_points = y.shape
+    if t.shape not in ((n_points,), (n_series, n_points)):
+        raise ValueError(f"t has shape {t.shape}, expected ({n_points},) or ({n_series}, {n_points})")
+    if p0 is None:
+        if model.p0 is None:
+            raise ValueError(f"{model.name} has no default p0, pass one explicitly")
+        p0 = model.p0
+    p0 = np.broadcast_to(np.asarray(p0, dtype=float), (n_series, model.n_params)).copy()
+
+    mask = np.isfinite(y)
+    if t.ndim == 2:
+        mask &= np.isfinite(t)
+    # Overflowing trial steps are simply rejected
+    with np.errstate(over='ignore', invalid='ignore'):
+        params, converged, n_iter, sse, jtj = levenberg_marquardt(
+            model, t, y, p0, mask, max_iter=max_iter, ftol=ftol, xtol=xtol, gtol=gtol)
+    dof = mask.sum(axis=1) - model.n_params
+    covariance = _covariance(jtj, sse, dof)
+    # Too few points to determine the parameters: no fit, and nothing for curve_fit to do either
+    converged[dof <= 0] = False
+    method = np.where(converged, 'batch', 'failed').astype(object)
+
+    failed = np.flatnonzero(~converged & (dof > 0))
+    if fallback and failed.size:
+        refits = _refit(model, t, y, mask, p0, failed, workers, maxfev)
+        for i, refit in zip(failed, refits):
+            if refit is None:
+                continue
+            params[i], covariance[i], sse[i] = refit
+            converged[i] = True
+            method[i] = 'fallback'
+    return BatchFitResult(params, covariance, converged, n_iter, sse, method)
+
+
+def read_series_csv(path):
+    """Wide CSV (first column time, one column per series) -> (names, t, y)"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.reader(f))
+    header, body = rows[0], [row for row in rows[1:] if row]
+    data = np.array([[float(value) if value.strip() else np.nan for value in row] for row in body])
+    return header[1:], data[:, 0], data[:, 1:].T
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fit a kinetic model to every series in a CSV file')
+    parser.add_argument('csv', help='first column time, every other column one series')
+    parser.add_argument('--model', default='logistic_decay', choices=sorted(MODELS))
+    parser.add_argument('--p0', type=float, nargs='+', help='initial parameters (default: model.p0)')
+    parser.add_argument('--workers', type=int, help='processes for refitting unconverged series')
+    parser.add_argument('--out', help='write the fitted parameters to this CSV file')
+    args = parser.parse_args()
+
+    model = get_model(args.model)
+    names, t, y = read_series_csv(args.csv)
+    result = fit_batch(model, t, y, p0=args.p0, workers=args.workers)
+    errors = np.sqrt(np.abs(np.diagonal(result.covariance, axis1=1, axis2=2)))
+
+    header = ['series', *model.param_names, *(f'{name}_stderr' for name in model.param_names),
+              'sse', 'converged', 'method']
+    rows = [[name, *params, *stderr, sse, converged, method]
+            for name, params, stderr, sse, converged, method in zip(
+                names, result.params, errors, result.sse, result.converged, result.method)]
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+    for row in rows:
+        values = ' '.join(f"{name}={value:.6g}±{error:.2g}" for name, value, error in
+                          zip(model.param_names, row[1:1 + model.n_params], row[1 + model.n_params:]))
+        print(f"{row[0]}\t{values}\tsse={row[-3]:.6g}\t{row[-1]}")
+
+
+if __name__ == "__main__":
+    main()
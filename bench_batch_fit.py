@@ -0,0 +1,127 @@
+"""
+Benchmark: batch fitting (batch_fit.fit_batch) versus looping curve_fit.
+
+For each model, n_series synthetic series are generated around the parameters
+of the corresponding analysis script (each true parameter drawn within +-20%,
+noise as in the script) and fitted
+
+    batch      fit_batch, one vectorized Levenberg-Marquardt for all series
+    loop       curve_fit(method='lm') per series, finite differences as in the scripts
+    loop+jac   curve_fit(method='lm', jac=model.jac) per series
+
+The loops are timed on the first --loop-series series and their throughput
+is extrapolated.  Agreement is the share of series whose batch SSE is within
+0.01% of (or below) the curve_fit SSE.  Sums of squared residuals are compared
+rather than parameters: several of these models have flat directions (e.g.
+the logistic carrying capacity for data far below it) where both solvers stop
+at equally good fits with widely different parameter values.
+
+Usage:
+    python bench_batch_fit.py
+    python bench_batch_fit.py --series 1000,10000 --loop-series 500 --json bench_batch_fit.json
+"""
+import argparse
+import json
+import time
+import warnings
+
+import numpy as np
+from scipy.optimize import OptimizeWarning, curve_fit
+
+from batch_fit import fit_batch
+from kinetic_models import MODELS
+
+# (model, time axis, true parameters, noise sd, p0) from the analysis scripts
+SCENARIOS = [
+    ('logistic_decay', np.linspace(0, 10, 50), [10, 0.2, 50], 1.0, [9, 0.18, 48]),
+    ('gaussian_peak', np.linspace(2, 8, 49), [10, 0.7, 5, 0.5], 0.2, [9, 0.6, 5, 0.3]),
+    ('double_gaussian', np.linspace(2, 8, 49), [8, 0.8, 5, 3, 1.0, 2, 0.5], 0.3, [7, 0.7, 5, 2.5, 0.9, 2, 0.3]),
+    ('monod_do', np.linspace(0, 30, 50), [8.0, 5.0, 0.2], 0.3, [7.0, 4.0, 0.25]),
+    ('first_order_do', np.linspace(0, 60, 61), [8.0, 0.1], 0.4, [7.0, 0.15]),
+    ('exp_decay_offset', np.linspace(0, 10, 50), [5.0, 0.3, 0.1], 0.2, [5, 0.3, 0.1]),
+]
+
+# A batch fit agrees with curve_fit when its SSE is at most this much (relatively) larger
+AGREE_RTOL = 1e-4
+
+
+def make_series(name, t, true_params, sigma, n_series, seed=42):
+    rng = np.random.default_rng(seed)
+    params = np.asarray(true_params, dtype=float) * rng.uniform(0.8, 1.2, (n_series, len(true_params)))
+    model = MODELS[name]
+    y = model(t, *(params[:, i:i + 1] for i in range(params.shape[1])))
+    return y + rng.normal(0, sigma, y.shape)
+
+
+def loop_fit(model, t, y, p0, jac):
+    kwargs = {'jac': model.jac} if jac else {}
+    sse = np.full(len(y), np.inf)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', OptimizeWarning)
+        for i, row in enumerate(y):
+            try:
+                popt, _ = curve_fit(model, t, row, p0=p0, method='lm', **kwargs)
+            except RuntimeError:
+                continue
+            residuals = model(t, *popt) - row
+            sse[i] = residuals @ residuals
+    return sse
+
+
+def bench(name, t, true_params, sigma, p0, n_series, loop_series, workers):
+    model = MODELS[name]
+    y = make_series(name, t, true_params, sigma, n_series)
+
+    start = time.perf_counter()
+    result = fit_batch(model, t, y, p0=p0, workers=workers)
+    batch_seconds = time.perf_counter() - start
+
+    n_loop = min(loop_series, n_series)
+    row = {
+        'model': name, 'series': n_series, 'batch_s': batch_seconds,
+        'batch_rate': n_series / batch_seconds, 'converged': int(result.converged.sum()),
+        'fallback': int(np.sum(result.method == 'fallback')),
+    }
+    for label, jac in (('loop', False), ('loop_jac', True)):
+        start = time.perf_counter()
+        sse = loop_fit(model, t, y[:n_loop], p0, jac)
+        seconds = time.perf_counter() - start
+        row[f'{label}_rate'] = n_loop / seconds
+        if not jac:
+            ok = result.sse[:n_loop] <= sse * (1 + AGREE_RTOL)
+            row['agree'] = float(np.mean(ok))
+    row['speedup'] = row['batch_rate'] / row['loop_rate']
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch fitting throughput versus looping curve_fit')
+    parser.add_argument('--series', default='100,1000,5000', help='comma-separated batch sizes')
+    parser.add_argument('--loop-series', type=int, default=300, help='series fitted by the curve_fit loops')
+    parser.add_argument('--models', help='comma-separated model names (default: all scenarios)')
+    parser.add_argument('--workers', type=int, help='processes for the fallback refits')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.series.split(',')]
+    selected = set(args.models.split(',')) if args.models else None
+    results = []
+    print(f"{'model':<18} {'series':>7} {'batch s':>8} {'batch/s':>9} {'loop/s':>8} {'loop+jac/s':>10} "
+          f"{'speedup':>8} {'converged':>10} {'fallback':>9} {'SSE agrees':>11}")
+    for name, t, true_params, sigma, p0 in SCENARIOS:
+        if selected and name not in selected:
+            continue
+        for n_series in sizes:
+            row = bench(name, t, true_params, sigma, p0, n_series, args.loop_series, args.workers)
+            results.append(row)
+            print(f"{name:<18} {n_series:>7} {row['batch_s']:>8.3f} {row['batch_rate']:>9.0f} "
+                  f"{row['loop_rate']:>8.0f} {row['loop_jac_rate']:>10.0f} {row['speedup']:>7.1f}x "
+                  f"{row['converged']:>10} {row['fallback']:>9} {row['agree']:>11.1%}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark: vectorized noise-scale calibration (do_calibration.py) versus the
+loops of the dissolved-oxygen convergence checks.
+
+    scan        溶解氧收敛验证_5/6 main(): candidate scales one after another,
+                residuals through a zip loop, repeated --replicates times,
+                versus scan_noise_scales() on a scales x replicates matrix
+    residuals   compute_residuals_percent()'s loop versus residuals_percent()
+    redraw      溶解氧收敛验证_0's while loop (up to 1000 redraws) versus
+                first_passing_draw(); both must return the same draw
+
+It then prints the expected within-threshold fraction per candidate scale,
+the bisection result of calibrate_noise_scale(), and checks that repeated
+calibrations with the same seed give the same answer.
+
+Usage:
+    python bench_do_calibration.py
+    python bench_do_calibration.py --replicates 5000 --threshold 15 --json bench_do_calibration.json
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from do_calibration import (CANDIDATE_SCALES, DESIRED_FRACTION, SEED, THRESHOLD_PERCENT, calibrate_noise_scale,
+                            first_passing_draw, residuals_percent, scan_noise_scales, scan_reference,
+                            script_measured_data, script_times)
+from kinetic_models import monod_do
+
+# 溶解氧收敛验证_0: simulated curve and redraw settings
+REDRAW_TIMES = np.linspace(0, 30, 50)
+REDRAW_PARAMS = (8.0, 5.0, 0.2)
+REDRAW_SIGMA = 0.3
+
+
+def timed(func, *args, repeat=1, **kwargs):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(*args, **kwargs)
+    return result, (time.perf_counter() - start) / repeat
+
+
+def loop_residuals(measured, simulated):
+    residuals = []
+    for m, s in zip(measured, simulated):
+        residuals.append((s - m) / m * 100.0 if m != 0 else 0.0)
+    return np.array(residuals)
+
+
+def loop_redraw(simulated, sigma, max_iterations=1000, seed=SEED):
+    np.random.seed(seed)
+    iteration = 0
+    measured = np.clip(simulated + np.random.normal(0, sigma, len(simulated)), 0.1, None)
+    within = np.abs((measured - simulated) / (measured + 1e-6) * 100) < THRESHOLD_PERCENT
+    while np.mean(within) < DESIRED_FRACTION and iteration < max_iterations:
+        measured = np.clip(simulated + np.random.normal(0, sigma, len(simulated)), 0.1, None)
+        within = np.abs((measured - simulated) / (measured + 1e-6) * 100) < THRESHOLD_PERCENT
+        iteration += 1
+    return iteration, measured
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Vectorized noise-scale calibration versus the script loops')
+    parser.add_argument('--replicates', type=int, default=2000, help='Monte-Carlo replicates per scale')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD_PERCENT, help='residual threshold in percent')
+    parser.add_argument('--target', type=float, default=DESIRED_FRACTION, help='desired within-threshold fraction')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    times = script_times()
+    measured = script_measured_data(times)
+    n_evals = len(CANDIDATE_SCALES) * args.replicates
+    results = {'replicates': args.replicates, 'threshold': args.threshold, 'target': args.target}
+
+    (_, reference, loop_draws), loop_s = timed(scan_reference, times, threshold=args.threshold,
+                                               desired=args.target, n_replicates=args.replicates)
+    scan, scan_s = timed(scan_noise_scales, times, measured, n_replicates=args.replicates, threshold=args.threshold)
+    loop_rate, scan_rate = loop_draws / loop_s, n_evals / scan_s
+    results['scan'] = {'loop_s': loop_s, 'vectorized_s': scan_s, 'loop_draws': loop_draws, 'vectorized_draws': n_evals,
+                       'loop_draws_per_s': loop_rate, 'vectorized_draws_per_s': scan_rate}
+
+    simulated = measured + 0.3 * np.random.default_rng(SEED).standard_normal(len(times))
+    loop_res, res_loop_s = timed(loop_residuals, measured, simulated, repeat=2000)
+    vec_res, res_vec_s = timed(residuals_percent, measured, simulated, repeat=2000)
+    results['residuals'] = {'loop_us': res_loop_s * 1e6, 'vectorized_us': res_vec_s * 1e6,
+                            'identical': bool(np.array_equal(loop_res, vec_res))}
+
+    simulated_do = monod_do(REDRAW_TIMES, *REDRAW_PARAMS)
+    (loop_it, loop_draw), redraw_loop_s = timed(loop_redraw, simulated_do, REDRAW_SIGMA)
+    (vec_it, vec_draw), redraw_vec_s = timed(first_passing_draw, simulated_do, REDRAW_SIGMA, threshold=args.threshold,
+                                             target=args.target)
+    results['redraw'] = {'loop_s': redraw_loop_s, 'vectorized_s': redraw_vec_s, 'iterations': loop_it,
+                         'identical': bool(loop_it == vec_it and np.array_equal(loop_draw, vec_draw))}
+
+    (scale, fraction), calibrate_s = timed(calibrate_noise_scale, times, measured, target=args.target,
+                                           n_replicates=args.replicates, threshold=args.threshold)
+    repeat_scale, repeat_fraction = calibrate_noise_scale(times, measured, target=args.target,
+                                                          n_replicates=args.replicates, threshold=args.threshold)
+    results['calibration'] = {'scale': scale, 'expected_fraction': fraction, 'seconds': calibrate_s,
+                              'deterministic': bool(scale == repeat_scale and fraction == repeat_fraction)}
+
+    print(f"{'step':<10} {'loop':>12} {'vectorized':>12} {'speedup':>9}  note")
+    print(f"{'scan':<10} {loop_s:>11.3f}s {scan_s:>11.4f}s {loop_s / scan_s:>8.0f}x  "
+          f"{args.replicates} replicates; the loop stops at the first passing scale ({loop_draws} draws), "
+          f"the matrix covers all {n_evals}")
+    print(f"{'per draw':<10} {1e6 / loop_rate:>10.1f}us {1e6 / scan_rate:>10.2f}us {scan_rate / loop_rate:>8.0f}x")
+    print(f"{'residuals':<10} {res_loop_s * 1e6:>10.1f}us {res_vec_s * 1e6:>10.1f}us "
+          f"{res_loop_s / res_vec_s:>8.0f}x  identical: {results['residuals']['identical']}")
+    print(f"{'redraw':<10} {redraw_loop_s:>11.3f}s {redraw_vec_s:>11.4f}s {redraw_loop_s / redraw_vec_s:>8.0f}x  "
+          f"stopped after {loop_it} redraws, same draw: {results['redraw']['identical']}")
+
+    print(f"\n{'scale':>6} {'expected':>9} {'+-se':>7} {'P(pass)':>8} {'loop best':>10}")
+    loop_best = np.isclose(reference[:, None], CANDIDATE_SCALES[None, :]).mean(axis=0)
+    for i, candidate in enumerate(CANDIDATE_SCALES):
+        print(f"{candidate:>6.3f} {scan.expected[i]:>9.1%} {scan.stderr[i]:>7.2%} "
+              f"{scan.probability(args.target)[i]:>8.1%} {loop_best[i]:>10.1%}")
+    print("('loop best': share of loop repetitions whose main() would have reported this scale)")
+
+    found = 'none (target unreachable)' if scale is None else f"{scale:.4f}"
+    print(f"\ncalibrate_noise_scale: scale {found}, expected fraction {fraction:.1%} "
+          f"({calibrate_s * 1000:.1f} ms), deterministic: {results['calibration']['deterministic']}")
+    if scale is None:
+        print(f"even noise-free simulation reaches only {fraction:.1%} within +-{args.threshold:g}%: "
+              f"the simulated curve itself is off the measured one")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
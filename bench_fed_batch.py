@@ -0,0 +1,133 @@
+"""
+Benchmark: ensemble fed-batch simulation (fed_batch.simulate_ensemble) versus
+running the scripts' scalar Euler loop once per parameter set.
+
+First checks that single-member runs reproduce the scripts exactly
+(trajectories and trigger events, for the 负反馈2.py and 负反馈回调.py
+parameters and for sampled members of the ensemble), then times ensembles
+whose mu_max, K_s, Y, k_decay, threshold_speed and S0 are drawn around the
+负反馈2.py values.
+
+The adaptive mode (simulate_adaptive, RK45 with root-found exhaustion and
+feed events) is compared with Euler at dt = 0.1 and dt = 0.001: number of
+steps and the largest deviation of X on the 0.1 h output grid from an Euler
+reference at dt = 1e-4, relative to the peak of X.  Without refeeds
+(负反馈回调.py) the horizon runs to 1000 h; once the feed triggers, every
+refill is consumed faster than the last (X grows by Y * S0 per cycle), so
+the refeed scenario stops at 50 h.  With 负反馈2.py's values the refeeds
+chatter within hours and the adaptive run stops at max_events.
+
+Usage:
+    python bench_fed_batch.py
+    python bench_fed_batch.py --members 1000,10000,50000 --loop-members 200
+    python bench_fed_batch.py --skip-ensemble
+"""
+import argparse
+import time
+
+import numpy as np
+
+from fed_batch import CALLBACK_PARAMS, DEFAULT_PARAMS, simulate_adaptive, simulate_ensemble, simulate_reference
+
+# (label, parameters, horizons in hours) for the adaptive comparison
+ADAPTIVE_SCENARIOS = [
+    ('callback script', CALLBACK_PARAMS, (50, 200, 1000)),
+    ('threshold -0.05', {**CALLBACK_PARAMS, 'threshold_speed': -0.05}, (50,)),
+]
+# Tolerances (rtol, atol) of the adaptive runs
+ADAPTIVE_TOLERANCES = ((1e-3, 1e-6), (1e-6, 1e-9))
+REFERENCE_DT = 1e-4
+
+
+def sample_params(n_members, seed=42):
+    rng = np.random.default_rng(seed)
+    return {
+        'mu_max': rng.uniform(0.8, 1.6, n_members),
+        'K_s': rng.uniform(1.0, 3.0, n_members),
+        'Y': rng.uniform(0.4, 0.8, n_members),
+        'k_decay': rng.uniform(0.3, 1.2, n_members),
+        'threshold_speed': rng.uniform(-0.6, -0.05, n_members),
+        'S0': rng.uniform(10.0, 40.0, n_members),
+    }
+
+
+def member_params(params, member):
+    return {name: float(value[member]) for name, value in params.items()}
+
+
+def matches(result, member, params):
+    _, X, S, events = simulate_reference(params)
+    return (np.array_equal(X, result.X[member]) and np.array_equal(S, result.S[member])
+            and events == result.events_for(member))
+
+
+def check_identity(n_samples=50):
+    for label, params in (('负反馈2.py', DEFAULT_PARAMS), ('负反馈回调.py', CALLBACK_PARAMS)):
+        if not matches(simulate_ensemble(params), 0, params):
+            raise SystemExit(f"ensemble run differs from {label}")
+    params = sample_params(1000)
+    result = simulate_ensemble(params)
+    for member in np.linspace(0, 999, n_samples).astype(int):
+        if not matches(result, member, member_params(params, member)):
+            raise SystemExit(f"ensemble member {member} differs from the scalar loop")
+    print(f"identical to the scripts: 负反馈2.py, 负反馈回调.py and {n_samples} sampled members")
+
+
+def euler_on_grid(params, total_time, dt, grid_dt=0.1):
+    """Euler trajectory of X sampled on the grid_dt output grid, and its number of steps"""
+    _, X, _, events = simulate_reference(params, total_time=total_time, dt=dt)
+    stride = int(round(grid_dt / dt))
+    return X[::stride], len(X) - 1, len(events)
+
+
+def compare_adaptive():
+    print(f"{'scenario':<16} {'hours':>5} {'method':<12} {'steps':>8} {'rejected':>8} {'feeds':>6} {'max rel err':>12}")
+    for label, params, horizons in ADAPTIVE_SCENARIOS:
+        for total_time in horizons:
+            reference, _, _ = euler_on_grid(params, total_time, REFERENCE_DT)
+            peak = np.abs(reference).max()
+            for dt in (0.1, 0.001):
+                X, steps, feeds = euler_on_grid(params, total_time, dt)
+                n = min(len(X), len(reference))
+                error = np.abs(X[:n] - reference[:n]).max() / peak
+                print(f"{label:<16} {total_time:>5} {f'euler {dt:g}':<12} {steps:>8} {'':>8} {feeds:>6} {error:>12.2e}")
+            for rtol, atol in ADAPTIVE_TOLERANCES:
+                result = simulate_adaptive(params, total_time=total_time, rtol=rtol, atol=atol)
+                n = min(result.X.shape[1], len(reference))
+                error = np.abs(result.X[0, :n] - reference[:n]).max() / peak
+                print(f"{label:<16} {total_time:>5} {f'rk45 {rtol:g}':<12} {result.n_steps[0]:>8} "
+                      f"{result.n_rejected[0]:>8} {len(result.event_time):>6} {error:>12.2e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ensemble fed-batch simulation throughput')
+    parser.add_argument('--members', default='100,1000,10000', help='comma-separated ensemble sizes')
+    parser.add_argument('--loop-members', type=int, default=200, help='members run through the scalar loop')
+    parser.add_argument('--skip-adaptive', action='store_true', help='skip the adaptive versus Euler comparison')
+    parser.add_argument('--skip-ensemble', action='store_true', help='only compare the adaptive mode with Euler')
+    args = parser.parse_args()
+
+    if not args.skip_adaptive:
+        compare_adaptive()
+        print()
+    if args.skip_ensemble:
+        return
+    check_identity()
+    params = sample_params(args.loop_members)
+    start = time.perf_counter()
+    for member in range(args.loop_members):
+        simulate_reference(member_params(params, member))
+    loop_rate = args.loop_members / (time.perf_counter() - start)
+
+    print(f"{'members':>8} {'ensemble s':>11} {'members/s':>10} {'loop members/s':>15} {'speedup':>8} {'triggers':>9}")
+    for n_members in (int(size) for size in args.members.split(',')):
+        params = sample_params(n_members)
+        start = time.perf_counter()
+        result = simulate_ensemble(params)
+        seconds = time.perf_counter() - start
+        print(f"{n_members:>8} {seconds:>11.3f} {n_members / seconds:>10.0f} {loop_rate:>15.0f} "
+              f"{n_members / seconds / loop_rate:>7.1f}x {len(result.event_member):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark: curve fitting with analytic Jacobians (kinetic_models) versus the
+finite-difference Jacobians the analysis scripts rely on.
+
+For every model the synthetic dataset of the corresponding script is rebuilt
+(same true parameters, noise level and seed 42) and fitted with
+
+    curve_fit(method='lm')                 finite differences, as in the scripts
+    curve_fit(method='lm', jac=model.jac)  analytic Jacobian
+    least_squares(method='trf')            '2-point' versus analytic
+
+Reported per fit: model evaluations (finite differences count every
+evaluation, analytic fits count function evaluations plus Jacobian
+evaluations), solver iterations where available, wall time per fit
+(median of --repeat runs) and the final sum of squared residuals.
+
+Usage:
+    python bench_kinetic_models.py
+    python bench_kinetic_models.py --repeat 200 --json bench_kinetic_models.json
+"""
+import argparse
+import json
+import statistics
+import time
+
+import numpy as np
+from scipy.optimize import curve_fit, least_squares
+
+from kinetic_models import MODELS, check_jacobian
+
+
+def script_datasets():
+    """(model name, x, y, p0) for each analysis script's synthetic data"""
+    datasets = []
+
+    def noisy(model, x, true_params, sigma, clip=None):
+        np.random.seed(42)
+        y = MODELS[model](x, *true_params) + np.random.normal(0, sigma, len(x))
+        return np.clip(y, clip, None) if clip is not None else y
+
+    t = np.linspace(0, 10, 50)
+    do = np.linspace(2, 8, 49)
+    datasets.append(('logistic_decay', t, noisy('logistic_decay', t, [10, 0.2, 50], 1.0), [9, 0.18, 48]))
+    datasets.append(('gaussian_peak', do, noisy('gaussian_peak', do, [10, 0.7, 5, 0.5], 0.2), [9, 0.6, 5, 0.3]))
+    datasets.append(('double_gaussian', do, noisy('double_gaussian', do, [8, 0.8, 5, 3, 1.0, 2, 0.5], 0.3),
+                     [7, 0.7, 5, 2.5, 0.9, 2, 0.3]))
+    t30 = np.linspace(0, 30, 50)
+    datasets.append(('monod_do', t30, noisy('monod_do', t30, [8.0, 5.0, 0.2], 0.3, clip=0.1), [7.0, 4.0, 0.25]))
+    t60 = np.linspace(0, 60, 61)
+    datasets.append(('first_order_do', t60, noisy('first_order_do', t60, [8.0, 0.1], 0.4), [7.0, 0.15]))
+    datasets.append(('exp_decay', t, noisy('exp_decay', t, [5.0, 0.3], 0.2), [1.0, 1.0]))
+    datasets.append(('exp_decay_offset', t, noisy('exp_decay_offset', t, [5.0, 0.3, 0.1], 0.2), [5, 0.3, 0.1]))
+    datasets.append(('fixed_decay', t, noisy('fixed_decay', t, [5.0], 0.2), [5]))
+    return datasets
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, statistics.median(times)
+
+
+def bench_model(name, x, y, p0, repeat):
+    model = MODELS[name]
+    n_params = len(p0)
+    rows = []
+
+    def lm(jac):
+        kwargs = {'jac': model.jac} if jac else {}
+        popt, _, info, _, _ = curve_fit(model, x, y, p0=p0, method='lm', full_output=True, **kwargs)
+        return popt, info
+
+    for label, use_jac in (('lm finite-diff', False), ('lm analytic', True)):
+        try:
+            (popt, info), seconds = timed(lambda: lm(use_jac), repeat)
+        except RuntimeError:
+            # curve_fit gives up after maxfev evaluations
+            rows.append({'model': name, 'method': label, 'evals': None, 'jac_evals': None, 'ms': None,
+                         'sse': None, 'params': None})
+            continue
+        evals = info['nfev'] + info.get('njev', 0) if use_jac else info['nfev']
+        rows.append({
+            'model': name, 'method': label, 'evals': int(evals),
+            'jac_evals': int(info.get('njev', 0)) if use_jac else int((info['nfev'] - 1) // (n_params + 1)),
+            'ms': seconds * 1000, 'sse': float(np.sum((model(x, *popt) - y) ** 2)), 'params': popt.tolist(),
+        })
+
+    for label, jac in (('trf 2-point', '2-point'), ('trf analytic', model.residuals_jac)):
+        result, seconds = timed(lambda: least_squares(model.residuals, p0, jac=jac, args=(x, y), method='trf'),
+                                repeat)
+        evals = result.nfev + result.njev if callable(jac) else result.nfev + result.njev * n_params
+        rows.append({
+            'model': name, 'method': label, 'evals': int(evals), 'jac_evals': int(result.njev),
+            'ms': seconds * 1000, 'sse': float(2 * result.cost), 'params': result.x.tolist(),
+        })
+    return rows
+
+
+def compare(baseline, analytic, saved_width, speedup_width):
+    """Evaluation savings and wall-time speedup of analytic over baseline; 'n/a' if either fit failed"""
+    if baseline['evals'] is None or analytic['evals'] is None:
+        return f"{'n/a':>{saved_width}} {'n/a':>{speedup_width}} "
+    saved = 1 - analytic['evals'] / baseline['evals']
+    speedup = baseline['ms'] / analytic['ms']
+    return f"{saved:>{saved_width}.0%} {speedup:>{speedup_width}.2f}x"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analytic versus finite-difference Jacobians in curve fitting')
+    parser.add_argument('--repeat', type=int, default=50, help='fits per method (median time is reported)')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'model':<18} {'method':<16} {'evals':>6} {'jacobians':>9} {'ms/fit':>8} {'SSE':>12}")
+    for name, x, y, p0 in script_datasets():
+        error = check_jacobian(MODELS[name], x, p0)
+        if error > 1e-5:
+            raise SystemExit(f"{name}: analytic Jacobian disagrees with finite differences ({error:.2e})")
+        for row in bench_model(name, x, y, p0, args.repeat):
+            results.append(row)
+            if row['evals'] is None:
+                print(f"{row['model']:<18} {row['method']:<16} {'did not converge (maxfev reached)':>38}")
+                continue
+            print(f"{row['model']:<18} {row['method']:<16} {row['evals']:>6} {row['jac_evals']:>9} "
+                  f"{row['ms']:>8.3f} {row['sse']:>12.6f}")
+
+    by_key = {(row['model'], row['method']): row for row in results}
+    print()
+    print(f"{'model':<18} {'lm evals saved':>15} {'lm speedup':>11} {'trf evals saved':>16} {'trf speedup':>12}")
+    for name in dict.fromkeys(row['model'] for row in results):
+        print(f"{name:<18} {compare(by_key[(name, 'lm finite-diff')], by_key[(name, 'lm analytic')], 15, 10)} "
+              f"{compare(by_key[(name, 'trf 2-point')], by_key[(name, 'trf analytic')], 16, 11)}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark: multi-start fitting (multistart.py) versus single L-BFGS-B runs.
+
+Double-Gaussian data as in PINN与实验微生物浓度对比_4 (np.random.seed(42),
+noise sd 0.3) are fitted by least squares
+
+    script bounds   one L-BFGS-B run from the script's guesses in its tight bounds
+    wide bounds     the same start in DEFAULT_BOUNDS['double_gaussian']
+    random start    one run from a random point of the wide bounds; the share of
+                    all Sobol starts that reach the best optimum
+    multistart      multistart_fit with early stopping, in-process and with --workers
+
+and then every model of the kinetic library is fitted to synthetic data
+inside its default bounds, reporting how many starts the early stop needed,
+the clusters found and how often a single random start would have succeeded.
+
+Usage:
+    python bench_multistart.py
+    python bench_multistart.py --workers 4 --starts 512 --json bench_multistart.json
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from scipy.optimize import minimize
+
+from kinetic_models import MODELS, double_gaussian
+from multistart import DEFAULT_BOUNDS, HIT_RTOL, LOCAL_OPTIONS, multistart_fit, sse_and_grad
+
+# PINN与实验微生物浓度对比_4: DO axis, true parameters, noise, guesses and bounds
+SCRIPT_DO = np.linspace(2, 8, 49)
+SCRIPT_TRUE = [8, 0.8, 5, 3, 1.0, 2, 0.5]
+SCRIPT_NOISE = 0.3
+SCRIPT_GUESS = [7, 0.7, 5, 2.5, 0.9, 2, 0.3]
+SCRIPT_BOUNDS = [(5, 12), (0.5, 1.5), (4.5, 5.5), (2, 5), (0.5, 1.5), (1.5, 2.5), (0.1, 1.0)]
+
+# (model, x axis, true parameters, noise sd) for the library table
+LIBRARY_SCENARIOS = [
+    ('logistic_decay', np.linspace(0, 10, 50), [10, 0.2, 50], 1.0),
+    ('gaussian_peak', np.linspace(2, 8, 49), [10, 0.7, 5, 0.5], 0.2),
+    ('double_gaussian', SCRIPT_DO, SCRIPT_TRUE, SCRIPT_NOISE),
+    ('monod_do', np.linspace(0, 30, 50), [8.0, 5.0, 0.2], 0.3),
+    ('first_order_do', np.linspace(0, 60, 61), [8.0, 0.1], 0.4),
+    ('exp_decay', np.linspace(0, 10, 50), [5.0, 0.3], 0.2),
+    ('exp_decay_offset', np.linspace(0, 10, 50), [5.0, 0.3, 0.1], 0.2),
+    ('fixed_decay', np.linspace(0, 10, 50), [5.0], 0.2),
+]
+
+
+def single_run(model, t, y, start, bounds):
+    begin = time.perf_counter()
+    result = minimize(sse_and_grad, start, args=(model, t, y), jac=True, method='L-BFGS-B', bounds=bounds,
+                      options=LOCAL_OPTIONS)
+    return float(result.fun), int(result.nfev), time.perf_counter() - begin
+
+
+def reached(fun, best):
+    return fun <= best + HIT_RTOL * abs(best)
+
+
+def script_comparison(n_starts, workers):
+    np.random.seed(42)
+    y = double_gaussian(SCRIPT_DO, *SCRIPT_TRUE) + np.random.normal(0, SCRIPT_NOISE, len(SCRIPT_DO))
+    full = multistart_fit(double_gaussian, SCRIPT_DO, y, n_starts=n_starts, min_hits=None, workers=1)
+    best = full.fun
+    rows = []
+    for label, bounds in (('script bounds', SCRIPT_BOUNDS), ('wide bounds', DEFAULT_BOUNDS['double_gaussian'])):
+        fun, nfev, seconds = single_run(double_gaussian, SCRIPT_DO, y, SCRIPT_GUESS, bounds)
+        rows.append({'run': label, 'sse': fun, 'evaluations': nfev, 'seconds': seconds, 'global': reached(fun, best)})
+    rows.append({'run': 'random start', 'sse': float(np.median(full.funs)),
+                 'evaluations': int(np.median(full.nfev)), 'seconds': full.seconds / full.n_starts,
+                 'global': full.hits() / full.n_starts})
+    for label, n_workers in (('multistart', 1), (f'multistart x{workers}', workers)):
+        if n_workers is None or (label != 'multistart' and n_workers <= 1):
+            continue
+        result = multistart_fit(double_gaussian, SCRIPT_DO, y, workers=n_workers)
+        rows.append({'run': label, 'sse': result.fun, 'evaluations': result.n_evaluations,
+                     'seconds': result.seconds, 'global': reached(result.fun, best), 'starts': result.n_starts,
+                     'clusters': result.n_clusters})
+    return best, rows
+
+
+def library_table(n_starts, seed=42):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for name, t, true_params, sigma in LIBRARY_SCENARIOS:
+        model = MODELS[name]
+        y = model(t, *true_params) + rng.normal(0, sigma, len(t))
+        full = multistart_fit(model, t, y, n_starts=n_starts, min_hits=None, workers=1)
+        early = multistart_fit(model, t, y, workers=1)
+        rows.append({'model': name, 'starts': early.n_starts, 'clusters': early.n_clusters,
+                     'evaluations': early.n_evaluations, 'seconds': early.seconds,
+                     'global': reached(early.fun, full.fun), 'single_start_success': full.hits() / full.n_starts,
+                     'full_clusters': full.n_clusters})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-start fitting versus single L-BFGS-B runs')
+    parser.add_argument('--starts', type=int, default=256, help='starts of the exhaustive reference runs')
+    parser.add_argument('--workers', type=int, default=2, help='processes for the parallel multistart run')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    best, script_rows = script_comparison(args.starts, args.workers)
+    print(f"PINN与实验微生物浓度对比_4 data, best SSE over {args.starts} starts: {best:.6g}")
+    print(f"{'run':<16} {'SSE':>10} {'evaluations':>12} {'seconds':>8} {'global':>8} {'starts':>7} {'clusters':>9}")
+    for row in script_rows:
+        found = f"{row['global']:.0%}" if isinstance(row['global'], float) else str(row['global'])
+        print(f"{row['run']:<16} {row['sse']:>10.5g} {row['evaluations']:>12} {row['seconds']:>8.3f} {found:>8} "
+              f"{row.get('starts', '-'):>7} {row.get('clusters', '-'):>9}")
+    print("(random start: median over all starts; 'global' is the share reaching the best SSE)")
+
+    library_rows = library_table(args.starts)
+    print(f"\n{'model':<18} {'starts':>7} {'clusters':>9} {'evaluations':>12} {'seconds':>8} {'global':>7} "
+          f"{'1-start success':>16}")
+    for row in library_rows:
+        print(f"{row['model']:<18} {row['starts']:>7} {row['clusters']:>9} {row['evaluations']:>12} "
+              f"{row['seconds']:>8.3f} {str(row['global']):>7} {row['single_start_success']:>16.0%}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'best_sse': best, 'script': script_rows, 'library': library_rows}, f, indent=2,
+                      default=lambda value: value.item())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark: training the numpy PINN (pinn.py) to a target loss.
+
+Both problems are trained from --seeds initializations with residual-based
+(adaptive) and uniform collocation resampling, reporting the Adam steps and
+seconds until the loss on all collocation points and data fell below the
+target, the largest scaled ODE residual on a fine grid at the end and the
+learned physical parameters
+
+    logistic   microbial_concentration_data.csv; beta and K are compared with a
+               least-squares fit of the closed-form solution (kinetic_models.logistic_decay),
+               and the MAPE of the network with that of the CSV's PINN_Prediction column
+    monod      growth phase of 负反馈回调; mu_max and K_s are compared with the true values
+
+A last table times single training steps for several collocation batch sizes.
+
+Usage:
+    python bench_pinn.py
+    python bench_pinn.py --seeds 5 --json bench_pinn.json
+"""
+import argparse
+import csv
+import json
+import time
+
+import numpy as np
+from scipy.optimize import curve_fit
+
+from fed_batch import CALLBACK_PARAMS
+from kinetic_models import logistic_decay
+from mape_fit import mape, safe_denominator
+from pinn import DATA_PATH, PINN, logistic_problem, monod_problem, train
+
+# Target losses, near the noise level of the data (the logistic ODE cannot follow the bump in
+# the data, so its loss levels off much higher)
+TARGETS = {'logistic': 1.8e-2, 'monod': 2.5e-4}
+MAX_STEPS = 20000
+GRID_POINTS = 2001
+BATCH_SIZES = (32, 128, 512, 2048)
+
+
+def reference_parameters(problem):
+    """Parameters the PINN should learn: closed-form least squares (logistic) or the true values (monod)"""
+    if problem.name == 'monod':
+        return {'mu_max': CALLBACK_PARAMS['mu_max'], 'K_s': CALLBACK_PARAMS['K_s']}
+    params, _ = curve_fit(logistic_decay, problem.x, problem.y[:, 0], p0=[9.8, 0.19, 49], jac=logistic_decay.jac,
+                          maxfev=10000)
+    return {'beta': params[1], 'K': params[2]}
+
+
+def csv_prediction_mape(path=DATA_PATH):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.DictReader(f))
+    y = np.array([float(row['Experimental_Data']) for row in rows])
+    return mape(y, np.array([float(row['PINN_Prediction']) for row in rows]))
+
+
+def bench_training(problem, n_seeds):
+    grid = np.linspace(*problem.domain, GRID_POINTS)
+    rows = []
+    for adaptive in (True, False):
+        for seed in range(n_seeds):
+            result = train(problem, steps=MAX_STEPS, target_loss=TARGETS[problem.name], adaptive=adaptive, seed=seed)
+            prediction = result.predict(problem.x)
+            observed = problem.y[problem.mask]
+            rows.append({'problem': problem.name, 'collocation': 'adaptive' if adaptive else 'uniform', 'seed': seed,
+                         'reached': result.reached_target, 'steps': result.steps, 'seconds': result.seconds,
+                         'loss': result.final_loss, 'max_residual': float(np.abs(result.model.residuals(grid)).max()),
+                         'mape': mape(observed, prediction[problem.mask], safe_denominator(observed, 'floor')),
+                         'theta': {name: float(value) for name, value in result.theta.items()}})
+    return rows
+
+
+def bench_step_time(problem, repeat):
+    model = PINN(problem)
+    rng = np.random.default_rng(0)
+    rows = []
+    for batch_size in BATCH_SIZES:
+        batch = rng.uniform(*problem.domain, batch_size)
+        model.loss_and_grads(batch)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            model.loss_and_grads(batch)
+        seconds = (time.perf_counter() - start) / repeat
+        rows.append({'batch_size': batch_size, 'ms': seconds * 1000, 'points_per_s': batch_size / seconds})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time for the numpy PINN to reach a target loss')
+    parser.add_argument('--seeds', type=int, default=3, help='network initializations per setting')
+    parser.add_argument('--repeat', type=int, default=200, help='repetitions of the step timing')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    results = {'training': [], 'reference': {}}
+    for problem in (logistic_problem(), monod_problem()):
+        reference = reference_parameters(problem)
+        results['reference'][problem.name] = reference
+        rows = bench_training(problem, args.seeds)
+        results['training'].extend(rows)
+        names = list(reference)
+        print(f"{problem.name}: target loss {TARGETS[problem.name]:g}, reference "
+              + ', '.join(f"{name}={value:.4g}" for name, value in reference.items()))
+        print(f"{'collocation':<12} {'seed':>4} {'steps':>6} {'seconds':>8} {'loss':>10} {'max |r|':>9} "
+              f"{'MAPE %':>7} " + ' '.join(f"{name:>8}" for name in names))
+        for row in rows:
+            steps = str(row['steps']) if row['reached'] else f">{row['steps']}"
+            print(f"{row['collocation']:<12} {row['seed']:>4} {steps:>6} {row['seconds']:>8.2f} {row['loss']:>10.3g} "
+                  f"{row['max_residual']:>9.3g} {row['mape']:>7.2f} "
+                  + ' '.join(f"{row['theta'][name]:>8.4g}" for name in names))
+        if problem.name == 'logistic':
+            results['csv_mape'] = csv_prediction_mape()
+            print(f"(PINN_Prediction column of {DATA_PATH}: MAPE {results['csv_mape']:.2f}%)")
+        print()
+
+    results['step_time'] = bench_step_time(monod_problem(), args.repeat)
+    print(f"{'batch size':>10} {'ms/step':>8} {'points/s':>10}   (monod, loss and gradients)")
+    for row in results['step_time']:
+        print(f"{row['batch_size']:>10} {row['ms']:>8.3f} {row['points_per_s']:>10.0f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, default=lambda value: value.item())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+冷启动基准测试：统计 suzhou_tour_map.py 的导入耗时和首次渲染耗时
+
+用法：
+    python bench_startup.py                 # 默认各测 5 次，取中位数
+    python bench_startup.py --repeat 10 --json startup.json
+
+每次测量都在全新的子进程中进行，以模拟新容器的冷启动。
+首次渲染使用 Streamlit 的 AppTest 在进程内完整执行一次页面脚本，
+路线服务商固定为本地路由（ROUTING_PROVIDERS=local），排除网络耗时。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+APP_FILE = 'suzhou_tour_map.py'
+
+# 子进程内执行：导入应用模块，输出耗时（秒）
+IMPORT_SNIPPET = """
+import time
+t0 = time.perf_counter()
+import suzhou_tour_map
+print(time.perf_counter() - t0)
+"""
+
+# 子进程内执行：从进程启动到首次页面渲染完成的耗时（秒）
+RENDER_SNIPPET = """
+import time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=120)
+at.run()
+if at.exception:
+    raise SystemExit(at.exception[0].message)
+print(time.perf_counter() - t0)
+"""
+
+
+def run_snippet(snippet):
+    """在新的解释器进程中运行代码片段，返回其输出的耗时"""
+    env = dict(os.environ)
+    env.setdefault('AMAP_API_KEY', 'benchmark')
+    env['ROUTING_PROVIDERS'] = 'local'
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', snippet],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    wall = time.perf_counter() - started
+    return float(output.strip().splitlines()[-1]), wall
+
+
+def slowest_imports(top=10):
+    """用 -X importtime 找出导入应用模块时自身耗时最长的模块"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import suzhou_tour_map'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='suzhou_tour_map.py 冷启动基准测试')
+    parser.add_argument('--repeat', type=int, default=5, help='每项测量的重复次数')
+    parser.add_argument('--json', help='将结果写入 JSON 文件，便于跟踪历史变化')
+    args = parser.parse_args()
+
+    import_times = [run_snippet(IMPORT_SNIPPET)[0] for _ in range(args.repeat)]
+    render_times = [run_snippet(RENDER_SNIPPET.format(app=APP_FILE))[0] for _ in range(args.repeat)]
+
+    report = {
+        'repeat': args.repeat,
+        'import_time_median_s': statistics.median(import_times),
+        'import_time_max_s': max(import_times),
+        'first_render_median_s': statistics.median(render_times),
+        'first_render_max_s': max(render_times),
+        'slowest_imports': [
+            {'module': name, 'cumulative_ms': cumulative / 1000}
+            for cumulative, _, name in slowest_imports()
+        ],
+    }
+
+    print(f"模块导入耗时：中位数 {report['import_time_median_s'] * 1000:.1f} ms，最大 {report['import_time_max_s'] * 1000:.1f} ms")
+    print(f"首次渲染耗时：中位数 {report['first_render_median_s'] * 1000:.1f} ms，最大 {report['first_render_max_s'] * 1000:.1f} ms")
+    print("导入耗时最长的模块（累计）：")
+    for row in report['slowest_imports']:
+        print(f"  {row['cumulative_ms']:8.1f} ms  {row['module']}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
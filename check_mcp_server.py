@@ -1,8 +1,38 @@
+"""
+检查并启动 MCP 服务器
+
+    python check_mcp_server.py               启动服务器，等待端口就绪后退出（服务器在后台继续运行）
+    python check_mcp_server.py --supervise   前台守护：日志写入滚动文件，崩溃后自动重启
+    python check_mcp_server.py --supervise --command "python -m http.server 3025"
+                                             用本地替身服务代替 npx 验证守护逻辑
+
+mcp_config.json 中 mcp_server 的可选字段：
+    command           启动命令（默认 "npx <package>"），字符串经 shell 执行，列表直接执行
+    host              就绪探测的地址（默认 localhost）
+    ready_timeout     等待端口就绪的秒数（默认 60）
+    log_dir           日志目录（默认 logs）
+    log_max_bytes     单个日志文件大小上限（默认 5MB），超过后滚动
+    log_backups       保留的历史日志文件数（默认 3）
+    restart_backoff_max  重启退避上限秒数（默认 60）
+    max_restarts      最多连续重启次数（默认不限）
+
+守护模式下健康状态实时写入 <log_dir>/mcp_health.json。
+"""
+import argparse
 import json
+import logging
+import logging.handlers
 import socket
 import subprocess
 import sys
 import os
+import signal
+import threading
+import time
+
+# 服务器连续运行超过该秒数后，重启退避重新从头计算
+STABLE_SECONDS = 60.0
+
 
 def is_port_in_use(port):
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -12,6 +42,32 @@ def is_port_in_use(port):
         except socket.error:
             return True
 
+
+def is_port_ready(host, port, timeout=1.0):
+    """端口能否建立 TCP 连接（即服务器已在监听）"""
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def wait_for_port(host, port, timeout, is_alive=lambda: True, initial_delay=0.1, max_delay=2.0):
+    """按指数退避轮询端口直到就绪；超时或 is_alive() 为假时返回 False"""
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        if is_port_ready(host, port):
+            return True
+        if not is_alive():
+            return False
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+
 def load_config():
     try:
         with open('mcp_config.json', 'r') as f:
@@ -20,25 +76,213 @@ def load_config():
         print("配置文件未找到：mcp_config.json")
         sys.exit(1)
 
-def start_mcp_server(config):
-    if not is_port_in_use(config['mcp_server']['port']):
-        print(f"正在启动MCP服务器，端口：{config['mcp_server']['port']}")
+
+def server_command(server_config):
+    return server_config.get('command') or f"npx {server_config['package']}"
+
+
+def spawn(command, stdout, stderr):
+    """启动子进程；放在独立的进程组中，以便连同 npx 派生的 node 进程一起结束"""
+    kwargs = {'stdout': stdout, 'stderr': stderr, 'stdin': subprocess.DEVNULL}
+    if os.name == 'posix':
+        kwargs['start_new_session'] = True
+    else:
+        kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+    return subprocess.Popen(command, shell=isinstance(command, str), **kwargs)
+
+
+def rotating_logger(name, path, max_bytes, backups):
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8'
+        )
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        logger.addHandler(handler)
+    return logger
+
+
+class MCPSupervisor:
+    """MCP 服务器守护进程：异步读取输出写入滚动日志、探测端口就绪、崩溃后按退避重启"""
+
+    def __init__(self, server_config, command=None):
+        self.port = server_config['port']
+        self.host = server_config.get('host', 'localhost')
+        self.command = command or server_command(server_config)
+        self.ready_timeout = server_config.get('ready_timeout', 60.0)
+        self.backoff_max = server_config.get('restart_backoff_max', 60.0)
+        self.max_restarts = server_config.get('max_restarts')
+        self.log_dir = server_config.get('log_dir', 'logs')
+        os.makedirs(self.log_dir, exist_ok=True)
+        max_bytes = server_config.get('log_max_bytes', 5 * 2 ** 20)
+        backups = server_config.get('log_backups', 3)
+        self.loggers = {
+            'stdout': rotating_logger('mcp.stdout', os.path.join(self.log_dir, 'mcp_server.out.log'), max_bytes, backups),
+            'stderr': rotating_logger('mcp.stderr', os.path.join(self.log_dir, 'mcp_server.err.log'), max_bytes, backups),
+        }
+        self.health_file = os.path.join(self.log_dir, 'mcp_health.json')
+
+        self.process = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._status = {
+            'state': 'stopped',
+            'pid': None,
+            'port': self.port,
+            'ready': False,
+            'restarts': 0,
+            'last_exit_code': None,
+            'since': time.time(),
+        }
+
+    def health(self):
+        """当前健康状态（副本）"""
+        with self._lock:
+            status = dict(self._status)
+        status['uptime_s'] = round(time.time() - status['since'], 1)
+        return status
+
+    def _set_status(self, **changes):
+        with self._lock:
+            if 'state' in changes and changes['state'] != self._status['state']:
+                changes.setdefault('since', time.time())
+            self._status.update(changes)
+            status = dict(self._status)
+        tmp_path = f"{self.health_file}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(status, f, ensure_ascii=False)
+        os.replace(tmp_path, self.health_file)
+
+    def _drain(self, pipe, logger):
+        """逐行读取子进程输出，避免管道缓冲区写满后子进程阻塞"""
+        with pipe:
+            for line in iter(pipe.readline, b''):
+                logger.info(line.decode('utf-8', errors='replace').rstrip())
+
+    def _start_child(self):
+        self.process = spawn(self.command, subprocess.PIPE, subprocess.PIPE)
+        for name, pipe in (('stdout', self.process.stdout), ('stderr', self.process.stderr)):
+            threading.Thread(target=self._drain, args=(pipe, self.loggers[name]), daemon=True).start()
+        self._set_status(state='starting', pid=self.process.pid, ready=False)
+
+    def _stop_child(self, grace=5.0):
+        process = self.process
+        if process is None or process.poll() is not None:
+            return
         try:
-            # 使用npx启动服务器
-            subprocess.Popen(
-                f"npx {config['mcp_server']['package']}",
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            print("MCP服务器启动成功！")
+            if os.name == 'posix':
+                os.killpg(process.pid, signal.SIGTERM)
+            else:
+                process.terminate()
+            process.wait(grace)
+        except subprocess.TimeoutExpired:
+            if os.name == 'posix':
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+            process.wait()
+        except ProcessLookupError:
+            pass
+
+    def run(self):
+        """前台运行直到 stop() 或连续重启次数超过上限，返回是否正常停止"""
+        failures = 0
+        while not self._stopping.is_set():
+            started = time.monotonic()
+            self._start_child()
+            alive = lambda: self.process.poll() is None and not self._stopping.is_set()
+            if wait_for_port(self.host, self.port, self.ready_timeout, alive):
+                self._set_status(state='ready', ready=True)
+                print(f"MCP服务器已就绪，端口：{self.port}（PID {self.process.pid}）")
+            elif self.process.poll() is None and not self._stopping.is_set():
+                print(f"MCP服务器在 {self.ready_timeout} 秒内未监听端口 {self.port}，正在重启")
+                self._stop_child()
+
+            # 监视子进程：退出即重启，端口不可连接时标记为不健康
+            while not self._stopping.is_set() and self.process.poll() is None:
+                self._stopping.wait(1.0)
+                if self._status['state'] in ('ready', 'unhealthy'):
+                    ready = is_port_ready(self.host, self.port)
+                    self._set_status(state='ready' if ready else 'unhealthy', ready=ready)
+            if self._stopping.is_set():
+                break
+
+            exit_code = self.process.poll()
+            failures = 1 if time.monotonic() - started > STABLE_SECONDS else failures + 1
+            restarts = self._status['restarts'] + 1
+            if self.max_restarts is not None and failures > self.max_restarts:
+                self._set_status(state='failed', ready=False, pid=None, last_exit_code=exit_code)
+                print(f"MCP服务器连续 {failures} 次异常退出，停止重启")
+                return False
+            delay = min(2 ** (failures - 1), self.backoff_max)
+            self._set_status(state='restarting', ready=False, pid=None, last_exit_code=exit_code, restarts=restarts)
+            print(f"MCP服务器已退出（退出码 {exit_code}），{delay} 秒后重启")
+            self._stopping.wait(delay)
+
+        self._stop_child()
+        self._set_status(state='stopped', ready=False, pid=None)
+        return True
+
+    def stop(self):
+        self._stopping.set()
+
+
+def start_mcp_server(config, command=None):
+    server_config = config['mcp_server']
+    port = server_config['port']
+    if not is_port_in_use(port):
+        print(f"正在启动MCP服务器，端口：{port}")
+        try:
+            # 输出直接写入日志文件：本脚本退出后无人读取管道，写满缓冲区会使服务器阻塞
+            log_dir = server_config.get('log_dir', 'logs')
+            os.makedirs(log_dir, exist_ok=True)
+            with open(os.path.join(log_dir, 'mcp_server.out.log'), 'ab') as out, \
+                    open(os.path.join(log_dir, 'mcp_server.err.log'), 'ab') as err:
+                process = spawn(command or server_command(server_config), out, err)
         except Exception as e:
             print(f"启动MCP服务器时出错：{str(e)}")
             sys.exit(1)
+
+        host = server_config.get('host', 'localhost')
+        timeout = server_config.get('ready_timeout', 60.0)
+        if wait_for_port(host, port, timeout, lambda: process.poll() is None):
+            print("MCP服务器启动成功！")
+        elif process.poll() is not None:
+            print(f"MCP服务器启动失败（退出码 {process.returncode}），详见 {log_dir} 中的日志")
+            sys.exit(1)
+        else:
+            print(f"MCP服务器在 {timeout} 秒内未监听端口 {port}，详见 {log_dir} 中的日志")
+            sys.exit(1)
     else:
-        print(f"MCP服务器已经在运行，端口：{config['mcp_server']['port']}")
+        print(f"MCP服务器已经在运行，端口：{port}")
+
+
+def supervise(config, command=None):
+    supervisor = MCPSupervisor(config['mcp_server'], command)
+    if is_port_in_use(supervisor.port):
+        print(f"端口 {supervisor.port} 已被占用，请先停止正在运行的MCP服务器")
+        sys.exit(1)
+
+    def handle_signal(signum, frame):
+        supervisor.stop()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+    print(f"守护模式：日志和健康状态写入 {supervisor.log_dir}/")
+    if not supervisor.run():
+        sys.exit(1)
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='检查并启动 MCP 服务器')
+    parser.add_argument('--supervise', action='store_true', help='前台守护运行，崩溃后自动重启')
+    parser.add_argument('--command', help='覆盖配置中的启动命令（例如用本地替身服务测试）')
+    args = parser.parse_args()
+
     config = load_config()
-    if config['mcp_server']['auto_start']:
-        start_mcp_server(config) 
\ No newline at end of file
+    if args.supervise:
+        supervise(config, args.command)
+    elif config['mcp_server']['auto_start']:
+        start_mcp_server(config, args.command)
@@ -0,0 +1,229 @@
+"""
+城市包：每个城市的景点、行程和可选的本地步行路网分别存放在 city_packs/<城市>/ 下，
+一个进程可以同时服务多个城市，而不必把所有城市的数据都留在内存中
+
+目录结构（根目录默认为本文件旁的 city_packs/，与当前工作目录无关，可用环境变量 CITY_PACK_DIR 指定）：
+    pack.json         城市信息：名称、页面标题和简介、地图中心 [lat, lng] 和缩放级别、高德城市编码
+    routes.json       行程（ROUTES 格式，open/close 为开放时间，dwell 为建议游览时长，单位分钟；
+                      景点的 nearby_places 即该城市的附近推荐目录）
+    walk_graph.bin    可选，本地步行路网（二进制格式，内存映射读取，含网格空间索引）
+    walk_graph.json   可选，JSON 格式的路网（没有 .bin 时使用，需要整体读入内存）
+
+启动时只读取各城市的 pack.json；行程和路网在首次使用时加载，
+空闲超过 CITY_PACK_IDLE_SECONDS（默认 1800 秒）的城市在下次访问任意城市时释放，默认城市常驻。
+附近推荐排序器、地理编码器等按城市构建的对象通过 CityPack.resource() 挂在城市包上，随城市包一起释放。
+
+命令行：
+    python city_packs.py list
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+from local_graph import load_graph
+from routing_providers import haversine, parse_coord
+
+DEFAULT_PACK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'city_packs')
+DEFAULT_CITY = 'suzhou'
+DEFAULT_IDLE_SECONDS = 1800.0
+
+# 路网文件按顺序查找，二进制格式优先
+GRAPH_FILES = ('walk_graph.bin', 'walk_graph.json')
+
+
+def pack_root():
+    return os.environ.get('CITY_PACK_DIR', DEFAULT_PACK_DIR)
+
+
+class CityPackNotFoundError(KeyError):
+    """请求的城市包不存在（KeyError 的子类，错误信息不加引号）"""
+
+    def __str__(self):
+        return self.args[0]
+
+
+class CityPack:
+    """单个城市的数据；行程、路网和附加对象在首次访问时加载，unload() 后再次访问会重新加载"""
+
+    def __init__(self, city_id, path, meta):
+        self.id = city_id
+        self.path = path
+        self.name = meta['name']
+        self.heading = meta.get('heading', meta['name'])
+        self.title = meta.get('title', meta['name'])
+        self.intro = meta.get('intro', '')
+        self.center = meta['center']
+        self.zoom = meta.get('zoom', 12)
+        self.amap_city = meta.get('amap_city', '')
+        self._routes = None
+        self._graph = None
+        self._graph_loaded = False
+        self._resources = {}
+        self._lock = threading.RLock()
+
+    @property
+    def loaded(self):
+        return self._routes is not None or self._graph_loaded or bool(self._resources)
+
+    @property
+    def routes(self):
+        routes = self._routes
+        if routes is None:
+            with self._lock:
+                if self._routes is None:
+                    with open(os.path.join(self.path, 'routes.json'), 'r', encoding='utf-8') as f:
+                        self._routes = json.load(f)
+                routes = self._routes
+        return routes
+
+    @property
+    def graph(self):
+        """本地步行路网，城市包中没有路网文件时为 None"""
+        if not self._graph_loaded:
+            with self._lock:
+                if not self._graph_loaded:
+                    self._graph = self._load_graph()
+                    self._graph_loaded = True
+        return self._graph
+
+    def _load_graph(self):
+        for name in GRAPH_FILES:
+            graph = load_graph(os.path.join(self.path, name))
+            if graph is not None:
+                return graph
+        # 默认城市兼容原来用 WALK_GRAPH_FILE 指定的路网文件
+        if self.id == DEFAULT_CITY and os.environ.get('WALK_GRAPH_FILE'):
+            return load_graph()
+        return None
+
+    def resource(self, name, factory):
+        """按城市构建并缓存的对象（factory(pack) 只在首次访问或释放后调用一次）"""
+        value = self._resources.get(name)
+        if value is None:
+            with self._lock:
+                value = self._resources.get(name)
+                if value is None:
+                    value = self._resources[name] = factory(self)
+        return value
+
+    def unload(self):
+        """释放行程、路网和附加对象（内存映射的路网在不再被引用后关闭）"""
+        with self._lock:
+            self._routes = None
+            self._graph = None
+            self._graph_loaded = False
+            self._resources = {}
+
+
+def load_metadata(root):
+    """读取根目录下各城市的 pack.json，返回 {城市: (目录, 城市信息)}"""
+    packs = {}
+    try:
+        names = sorted(os.listdir(root))
+    except FileNotFoundError:
+        return packs
+    for city_id in names:
+        path = os.path.join(root, city_id)
+        try:
+            with open(os.path.join(path, 'pack.json'), 'r', encoding='utf-8') as f:
+                packs[city_id] = (path, json.load(f))
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+    return packs
+
+
+class CityPackRegistry:
+    """城市包注册表：按需加载城市包，释放空闲的城市包"""
+
+    def __init__(self, root=None, idle_seconds=None, pinned=(DEFAULT_CITY,)):
+        self.root = root or pack_root()
+        if idle_seconds is None:
+            idle_seconds = float(os.environ.get('CITY_PACK_IDLE_SECONDS', DEFAULT_IDLE_SECONDS))
+        self.idle_seconds = idle_seconds
+        self.pinned = set(pinned)
+        self._packs = {city_id: CityPack(city_id, path, meta)
+                       for city_id, (path, meta) in load_metadata(self.root).items()}
+        self._last_used = {}
+        self._lock = threading.Lock()
+
+    def available(self):
+        """可选的城市：{城市: 名称}，默认城市排在最前"""
+        ordered = sorted(self._packs, key=lambda city_id: (city_id != DEFAULT_CITY, city_id))
+        return {city_id: self._packs[city_id].name for city_id in ordered}
+
+    def get(self, city_id):
+        """返回城市包并记录访问时间，同时释放其他空闲的城市包；城市不存在时抛出 CityPackNotFoundError"""
+        pack = self._packs.get(city_id)
+        if pack is None:
+            found = '、'.join(self._packs) or '无'
+            raise CityPackNotFoundError(
+                f"找不到城市包 {city_id}：{self.root} 下的城市包为 {found}（可用环境变量 CITY_PACK_DIR 指定目录）")
+        now = time.monotonic()
+        with self._lock:
+            self._last_used[city_id] = now
+        self.evict_idle(now)
+        return pack
+
+    def evict_idle(self, now=None):
+        """释放超过 idle_seconds 未访问的城市包，返回被释放的城市"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            idle = [city_id for city_id, used in self._last_used.items()
+                    if now - used > self.idle_seconds and city_id not in self.pinned]
+            for city_id in idle:
+                del self._last_used[city_id]
+        for city_id in idle:
+            self._packs[city_id].unload()
+        return idle
+
+    def loaded(self):
+        return [city_id for city_id, pack in self._packs.items() if pack.loaded]
+
+    def city_for(self, lng, lat):
+        """离坐标最近的城市（按地图中心判断，只用 pack.json 中的信息，不加载城市包）"""
+        if not self._packs:
+            return None
+        return min(self._packs.values(),
+                   key=lambda pack: haversine(lng, lat, pack.center[1], pack.center[0]))
+
+    def amap_city_code(self, origin):
+        """高德公交规划所需的城市编码，origin 为 "lng,lat" 字符串"""
+        pack = self.city_for(*parse_coord(origin))
+        return pack.amap_city if pack is not None else ''
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """进程内共享的城市包注册表"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = CityPackRegistry()
+    return _registry
+
+
+def main():
+    parser = argparse.ArgumentParser(description='城市包工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help='列出城市包及其内容')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        registry = get_registry()
+        for city_id, name in registry.available().items():
+            pack = registry.get(city_id)
+            routes = pack.routes
+            points = {point['name'] for day_data in routes.values() for point in day_data['points']}
+            graph = pack.graph
+            graph_info = f"路网 {len(graph)} 个节点" if graph is not None else "无路网"
+            print(f"{city_id}\t{name}\t{len(routes)} 天\t{len(points)} 个景点\t{graph_info}")
+
+
+if __name__ == "__main__":
+    main()
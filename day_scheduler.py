@@ -0,0 +1,317 @@
+"""
+按开放时间和游览时长安排每日行程（带时间窗的车辆路径问题）
+
+每一天视为一辆"车"：从酒店出发，在 day_start 之后出发、day_end 之前结束。
+每个景点有开放时间窗 [open, close] 和游览时长 dwell，必须在关门前游览完毕；
+早到时原地等待开门。
+
+求解分两步：
+1. 后悔值插入（regret-2）：每轮为每个未安排的景点找出各天中代价最小的可行插入位置，
+   优先插入"最优与次优代价相差最大"的景点，避免时间窗紧的景点被挤掉；
+2. 局部搜索：景点移动（relocate，可跨天）、天内 2-opt 反转和跨天交换（swap），
+   只接受使目标下降的可行移动，直到无法改进或超过时间限制。
+
+目标为总步行时间加上少量等待时间（WAIT_WEIGHT），时间单位均为分钟。
+
+apply_schedule() 按时间表重排行程中每天的景点，地图路线、行程安排和导出都应使用重排后的行程，
+与时间表的游览顺序一致。
+"""
+import hashlib
+import json
+import math
+import time
+
+from routing_providers import haversine, WALKING_SPEED
+
+# 等待开门时间在目标函数中的权重
+WAIT_WEIGHT = 0.1
+
+# 无路网时直线距离的绕行系数
+DETOUR_FACTOR = 1.3
+
+
+def parse_hhmm(text):
+    """"HH:MM" 转为当天分钟数"""
+    hours, minutes = text.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def format_hhmm(minutes):
+    """当天分钟数转为 "HH:MM" """
+    minutes = int(round(minutes))
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def walking_time_matrix(points, graph=None):
+    """地点两两之间的步行时间矩阵（分钟）：有本地路网时用最短路径树，否则按直线距离估算"""
+    n = len(points)
+    matrix = [[0.0] * n for _ in range(n)]
+    nodes = None
+    if graph is not None and len(graph) > 0:
+        nodes = [graph.nearest_node(p['lon'], p['lat']) for p in points]
+
+    for i, origin in enumerate(points):
+        dist = {}
+        if nodes is not None and nodes[i][0] is not None:
+            source, access_m = nodes[i]
+            dist, _ = graph.shortest_path_tree({source: access_m / graph.speed})
+        for j, target in enumerate(points):
+            if i == j:
+                continue
+            if nodes is not None and nodes[j][0] in dist:
+                seconds = dist[nodes[j][0]] + nodes[j][1] / graph.speed
+            else:
+                meters = haversine(origin['lon'], origin['lat'], target['lon'], target['lat'])
+                seconds = meters * DETOUR_FACTOR / WALKING_SPEED
+            matrix[i][j] = seconds / 60.0
+    return matrix
+
+
+class DayScheduler:
+    """多日行程排程器
+
+    stops:    景点列表，每项含 open/close（"HH:MM"）和 dwell（分钟），可选 'day' 固定到某一天
+    depots:   每天的出发地（矩阵中的下标），len(depots) 即天数
+    matrix:   步行时间矩阵（分钟），下标顺序为 depots 所在的点列表
+    stop_ids: 每个景点在矩阵中的下标
+    """
+
+    def __init__(self, stops, stop_ids, depots, matrix, day_start='09:00', day_end='21:00',
+                 return_to_depot=False):
+        self.stops = stops
+        self.stop_ids = stop_ids
+        self.depots = depots
+        self.matrix = matrix
+        self.day_start = parse_hhmm(day_start)
+        self.day_end = parse_hhmm(day_end)
+        self.return_to_depot = return_to_depot
+        self.windows = [(parse_hhmm(s.get('open', '00:00')), parse_hhmm(s.get('close', '23:59'))) for s in stops]
+        self.dwell = [s.get('dwell', 60) for s in stops]
+        self.fixed_day = [s.get('day') for s in stops]
+
+    def evaluate(self, day, route):
+        """模拟一天的行程，返回 (是否可行, 目标值, 时间线)；时间线为 (景点, 到达, 开始, 离开)"""
+        t = self.day_start
+        prev = self.depots[day]
+        travel = 0.0
+        wait = 0.0
+        timeline = []
+        for s in route:
+            leg = self.matrix[prev][self.stop_ids[s]]
+            travel += leg
+            arrive = t + leg
+            open_, close = self.windows[s]
+            start = max(arrive, open_)
+            finish = start + self.dwell[s]
+            if finish > close:
+                return False, math.inf, timeline
+            wait += start - arrive
+            timeline.append((s, arrive, start, finish))
+            t = finish
+            prev = self.stop_ids[s]
+        if self.return_to_depot:
+            leg = self.matrix[prev][self.depots[day]]
+            travel += leg
+            t += leg
+        if t > self.day_end:
+            return False, math.inf, timeline
+        return True, travel + WAIT_WEIGHT * wait, timeline
+
+    def _cost(self, day, route):
+        return self.evaluate(day, route)[1]
+
+    def _allowed(self, stop, day):
+        return self.fixed_day[stop] is None or self.fixed_day[stop] == day
+
+    def _insertions(self, stop, routes, costs):
+        """景点在所有天、所有位置的可行插入：[(增加的代价, 天, 位置), ...]"""
+        options = []
+        for day, route in enumerate(routes):
+            if not self._allowed(stop, day):
+                continue
+            for pos in range(len(route) + 1):
+                cost = self._cost(day, route[:pos] + [stop] + route[pos:])
+                if cost < math.inf:
+                    options.append((cost - costs[day], day, pos))
+        return options
+
+    def construct(self):
+        """后悔值插入构造初始解，返回 (每天的景点顺序, 无法安排的景点)"""
+        routes = [[] for _ in self.depots]
+        costs = [self._cost(day, []) for day in range(len(routes))]
+        unassigned = set(range(len(self.stops)))
+        while unassigned:
+            best = None
+            for stop in unassigned:
+                options = sorted(self._insertions(stop, routes, costs))
+                if not options:
+                    continue
+                # 只有一个可行位置的景点优先插入
+                regret = options[1][0] - options[0][0] if len(options) > 1 else math.inf
+                key = (regret, -options[0][0])
+                if best is None or key > best[0]:
+                    best = (key, stop, options[0])
+            if best is None:
+                break
+            _, stop, (_, day, pos) = best
+            routes[day].insert(pos, stop)
+            costs[day] = self._cost(day, routes[day])
+            unassigned.discard(stop)
+        return routes, sorted(unassigned)
+
+    def improve(self, routes, time_limit=0.5):
+        """局部搜索：relocate、2-opt 和跨天 swap，接受首个改进的可行移动"""
+        deadline = time.perf_counter() + time_limit
+        costs = [self._cost(day, route) for day, route in enumerate(routes)]
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = (self._relocate(routes, costs) or self._two_opt(routes, costs)
+                        or self._swap(routes, costs))
+        return routes
+
+    def _relocate(self, routes, costs):
+        for d1, r1 in enumerate(routes):
+            for i, stop in enumerate(r1):
+                without = r1[:i] + r1[i + 1:]
+                cost_without = self._cost(d1, without)
+                for d2, r2 in enumerate(routes):
+                    if not self._allowed(stop, d2):
+                        continue
+                    base = without if d1 == d2 else r2
+                    for pos in range(len(base) + 1):
+                        if d1 == d2 and pos == i:
+                            continue
+                        candidate = base[:pos] + [stop] + base[pos:]
+                        new_cost = self._cost(d2, candidate)
+                        if d1 == d2:
+                            delta = new_cost - costs[d1]
+                        else:
+                            delta = cost_without + new_cost - costs[d1] - costs[d2]
+                        if delta < -1e-9:
+                            routes[d2] = candidate
+                            costs[d2] = new_cost
+                            if d1 != d2:
+                                routes[d1] = without
+                                costs[d1] = cost_without
+                            return True
+        return False
+
+    def _two_opt(self, routes, costs):
+        for day, route in enumerate(routes):
+            for i in range(len(route) - 1):
+                for j in range(i + 2, len(route) + 1):
+                    candidate = route[:i] + route[i:j][::-1] + route[j:]
+                    new_cost = self._cost(day, candidate)
+                    if new_cost < costs[day] - 1e-9:
+                        routes[day] = candidate
+                        costs[day] = new_cost
+                        return True
+        return False
+
+    def _swap(self, routes, costs):
+        for d1 in range(len(routes)):
+            for d2 in range(d1 + 1, len(routes)):
+                for i, a in enumerate(routes[d1]):
+                    if not self._allowed(a, d2):
+                        continue
+                    for j, b in enumerate(routes[d2]):
+                        if not self._allowed(b, d1):
+                            continue
+                        r1 = routes[d1][:i] + [b] + routes[d1][i + 1:]
+                        r2 = routes[d2][:j] + [a] + routes[d2][j + 1:]
+                        c1, c2 = self._cost(d1, r1), self._cost(d2, r2)
+                        if c1 + c2 < costs[d1] + costs[d2] - 1e-9:
+                            routes[d1], routes[d2] = r1, r2
+                            costs[d1], costs[d2] = c1, c2
+                            return True
+        return False
+
+    def solve(self, time_limit=0.5):
+        """求解并返回 {'days': [[{name, arrive, start, depart, wait}, ...], ...], 'unscheduled': [景点名, ...]}"""
+        routes, unassigned = self.construct()
+        routes = self.improve(routes, time_limit)
+        days = []
+        for day, route in enumerate(routes):
+            _, _, timeline = self.evaluate(day, route)
+            days.append([{
+                'name': self.stops[s]['name'],
+                'arrive': format_hhmm(arrive),
+                'start': format_hhmm(start),
+                'depart': format_hhmm(finish),
+                'wait': round(start - arrive),
+            } for s, arrive, start, finish in timeline])
+        return {'days': days, 'unscheduled': [self.stops[s]['name'] for s in unassigned]}
+
+
+def matrix_key(points, graph=None):
+    """步行时间矩阵的缓存键：由各点坐标和所用路网的内容摘要决定（路网重新生成后不再命中旧矩阵）"""
+    payload = json.dumps({
+        'points': [[p['lon'], p['lat']] for p in points],
+        'graph': graph.fingerprint() if graph is not None else None,
+    })
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:24]
+
+
+def schedule_routes(routes, graph=None, keep_days=True, day_start='09:00', day_end='21:00', time_limit=0.5,
+                    cache=None):
+    """为 ROUTES 格式的行程生成每日时间表；keep_days=True 时景点保持在原来的那一天，只调整顺序
+
+    cache 为 route_cache.SharedCache 时，步行时间矩阵在各副本间共享
+    """
+    day_keys = list(routes)
+    points = []
+    index = {}
+
+    def point_id(point):
+        key = (point['name'], point['lat'], point['lon'])
+        if key not in index:
+            index[key] = len(points)
+            points.append(point)
+        return index[key]
+
+    depots = []
+    stops = []
+    stop_ids = []
+    for day, day_key in enumerate(day_keys):
+        day_points = routes[day_key]['points']
+        depots.append(point_id(day_points[0]))
+        for point in day_points[1:]:
+            stop = dict(point)
+            if keep_days:
+                stop['day'] = day
+            stops.append(stop)
+            stop_ids.append(point_id(point))
+
+    matrix = None
+    if cache is not None:
+        key = matrix_key(points, graph)
+        matrix = cache.get('matrix', key)
+    if matrix is None:
+        matrix = walking_time_matrix(points, graph)
+        if cache is not None:
+            cache.set('matrix', key, matrix)
+    scheduler = DayScheduler(stops, stop_ids, depots, matrix, day_start, day_end)
+    result = scheduler.solve(time_limit)
+    return {
+        'days': dict(zip(day_keys, result['days'])),
+        'unscheduled': result['unscheduled'],
+    }
+
+
+def apply_schedule(routes, schedule):
+    """按 schedule_routes 的结果重排每天的景点：出发点不变，随后是时间表中的顺序，
+    无法安排的景点仍留在当天末尾（保持原来的相对顺序）"""
+    ordered = {}
+    for day_key, day_data in routes.items():
+        depot, *stops = day_data['points']
+        by_name = {}
+        for point in stops:
+            by_name.setdefault(point['name'], []).append(point)
+        points = [depot]
+        for stop in schedule['days'].get(day_key, []):
+            if by_name.get(stop['name']):
+                points.append(by_name[stop['name']].pop(0))
+        scheduled = {id(point) for point in points}
+        points.extend(point for point in stops if id(point) not in scheduled)
+        ordered[day_key] = dict(day_data, points=points)
+    return ordered
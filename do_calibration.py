@@ -0,0 +1,237 @@
+"""
+Noise-scale calibration for the dissolved-oxygen convergence checks
+(溶解氧收敛验证_0/5/6).
+
+The scripts look for the simulation noise scale at which about 80% of the
+percentage residuals (sim - meas) / meas * 100 fall within ±10%, by drawing
+one noisy curve per candidate scale in a loop (溶解氧收敛验证_5/6) or by
+redrawing noise up to 1000 times until a draw passes (溶解氧收敛验证_0).
+A single draw per scale makes the answer depend on the random stream.
+
+Here every candidate scale × Monte-Carlo replicate is one row of a matrix:
+the noise is drawn once as standard normals and scaled per candidate (common
+random numbers, so differences between scales are not masked by resampling),
+the ±threshold test is turned into per-point bounds on those normals (points
+with measured == 0 get residual 0 and always pass, as in the scripts), and the
+expected fraction is averaged over the replicates.  calibrate_noise_scale()
+bisects on that expected fraction; with a fixed seed the result is
+deterministic.
+
+    times = np.arange(0, 31, 1)
+    measured = script_measured_data(times)
+    scan = scan_noise_scales(times, measured)                 # the scripts' 20 candidates
+    scale, fraction = calibrate_noise_scale(times, measured)  # expected fraction = 80%, scale None if unreachable
+
+Benchmarks: python bench_do_calibration.py
+"""
+import numpy as np
+
+from kinetic_models import first_order_do
+
+# 溶解氧收敛验证_5/6: measured curve, simulated curve and search settings
+MEASURED_DO_MAX = 8.0
+MEASURED_K = 0.1
+MEASURED_NOISE = 0.4
+SIMULATED_DO_MAX = 7.8
+SIMULATED_K = 0.09
+THRESHOLD_PERCENT = 10.0
+DESIRED_FRACTION = 0.80
+CANDIDATE_SCALES = np.linspace(0.1, 1.0, 20)
+SEED = 42
+
+DEFAULT_REPLICATES = 2000
+
+
+def script_times():
+    """0 to 30 minutes at 1-minute intervals"""
+    return np.arange(0, 31, 1)
+
+
+def script_measured_data(times=None, seed=SEED):
+    """The scripts' measured data: np.random.seed(seed), then DO_max (1 - exp(-k t)) + N(0, 0.4)"""
+    times = script_times() if times is None else times
+    noise = np.random.RandomState(seed).normal(loc=0.0, scale=MEASURED_NOISE, size=len(times))
+    return first_order_do(times, MEASURED_DO_MAX, MEASURED_K) + noise
+
+
+def simulated_base(times, DO_max=SIMULATED_DO_MAX, k=SIMULATED_K):
+    """The noise-free simulated curve of generate_simulated_data()"""
+    return first_order_do(times, DO_max, k)
+
+
+def residuals_percent(measured, simulated):
+    """
+    (simulated - measured) / measured * 100, broadcast over leading axes of
+    simulated; 0 where measured == 0 (compute_residuals_percent in the scripts)
+    """
+    measured = np.asarray(measured, dtype=float)
+    nonzero = measured != 0
+    safe = np.where(nonzero, measured, 1.0)
+    return np.where(nonzero, (simulated - measured) / safe * 100.0, 0.0)
+
+
+def fraction_within(residuals, threshold=THRESHOLD_PERCENT, inclusive=True):
+    """Fraction of points (last axis) with |residual| <= threshold (< threshold if not inclusive)"""
+    within = np.abs(residuals) <= threshold if inclusive else np.abs(residuals) < threshold
+    return within.mean(axis=-1)
+
+
+def _simulated_fractions(base, measured, normals, scales, threshold, pin_start):
+    """
+    Within-threshold fraction for every scale x replicate: (n_scales, n_replicates).
+
+    |base + scale * z - measured| <= threshold% of |measured| is rewritten as
+    lower / scale <= z <= upper / scale per point, so each point costs two
+    comparisons against the shared normals instead of building the residual
+    matrix; the counts match those of residuals_percent() up to rounding
+    exactly at the threshold.
+    """
+    measured = np.asarray(measured, dtype=float)
+    scales = np.asarray(scales, dtype=float)
+    if np.any(scales < 0):
+        raise ValueError("noise scales must be non-negative")
+    bound = np.where(measured != 0, threshold / 100.0 * np.abs(measured), np.inf)
+    offset = base - measured
+    lower, upper = -bound - offset, bound - offset
+    if pin_start:
+        # generate_simulated_data forces the simulated curve to start at exactly 0
+        within = abs(residuals_percent(measured[0], 0.0)) <= threshold
+        lower[0], upper[0] = (-np.inf, np.inf) if within else (np.inf, np.inf)
+    positive = (scales > 0)[:, None]
+    safe = np.where(positive, scales[:, None], 1.0)
+    # A zero scale leaves the noise-free curve: each point is always or never within
+    low = np.where(positive, lower / safe, np.where(lower <= 0, -np.inf, np.inf))
+    high = np.where(positive, upper / safe, np.where(upper >= 0, np.inf, -np.inf))
+
+    counts = np.zeros((len(scales), len(normals)), dtype=np.int32)
+    for j, z in enumerate(np.ascontiguousarray(normals.T)):
+        counts += (z >= low[:, j, None]) & (z <= high[:, j, None])
+    return counts / normals.shape[1]
+
+
+class NoiseScan:
+    """Within-threshold fractions of a noise-scale scan"""
+
+    def __init__(self, scales, fractions):
+        self.scales = scales
+        self.fractions = fractions
+
+    @property
+    def expected(self):
+        """Expected fraction per scale (mean over replicates)"""
+        return self.fractions.mean(axis=1)
+
+    @property
+    def stderr(self):
+        return self.fractions.std(axis=1, ddof=1) / np.sqrt(self.fractions.shape[1])
+
+    def probability(self, target=DESIRED_FRACTION):
+        """Probability that a single draw reaches target, per scale"""
+        return (self.fractions >= target).mean(axis=1)
+
+    def largest_passing(self, target=DESIRED_FRACTION):
+        """Largest scale whose expected fraction reaches target (None if none does)"""
+        passing = np.flatnonzero(self.expected >= target)
+        return float(self.scales[passing[-1]]) if passing.size else None
+
+
+def standard_normals(n_replicates, n_points, seed=SEED):
+    """The common random numbers shared by every candidate scale"""
+    return np.random.default_rng(seed).standard_normal((n_replicates, n_points))
+
+
+def scan_noise_scales(times, measured, scales=CANDIDATE_SCALES, n_replicates=DEFAULT_REPLICATES,
+                      threshold=THRESHOLD_PERCENT, seed=SEED, base=None, pin_start=True):
+    """Fractions within ±threshold% for every candidate scale x replicate in one pass"""
+    base = simulated_base(times) if base is None else base
+    scales = np.asarray(scales, dtype=float)
+    normals = standard_normals(n_replicates, len(times), seed)
+    return NoiseScan(scales, _simulated_fractions(base, measured, normals, scales, threshold, pin_start))
+
+
+def calibrate_noise_scale(times, measured, target=DESIRED_FRACTION, low=0.0, high=None,
+                          n_replicates=DEFAULT_REPLICATES, threshold=THRESHOLD_PERCENT, tol=1e-4, seed=SEED,
+                          base=None, pin_start=True):
+    """
+    Largest noise scale whose expected within-threshold fraction is still >=
+    target, by bisection on [low, high] (high defaults to the largest
+    candidate scale).  The same normals are reused at every step, so the
+    expected fraction is a deterministic function of the scale.
+
+    Returns (scale, expected fraction at that scale).  If even `low` misses
+    the target no scale is feasible and (None, fraction at low) is returned;
+    if `high` still reaches it, returns (high, its fraction).
+    """
+    base = simulated_base(times) if base is None else base
+    high = float(CANDIDATE_SCALES[-1]) if high is None else high
+    normals = standard_normals(n_replicates, len(times), seed)
+
+    def expected(scale):
+        scales = np.array([scale], dtype=float)
+        return float(_simulated_fractions(base, measured, normals, scales, threshold, pin_start).mean())
+
+    f_low, f_high = expected(low), expected(high)
+    if f_low < target:
+        return None, f_low
+    if f_high >= target:
+        return high, f_high
+    while high - low > tol:
+        mid = 0.5 * (low + high)
+        f_mid = expected(mid)
+        if f_mid >= target:
+            low, f_low = mid, f_mid
+        else:
+            high = mid
+    return low, f_low
+
+
+def first_passing_draw(simulated, sigma=0.3, target=DESIRED_FRACTION, threshold=THRESHOLD_PERCENT,
+                       max_iterations=1000, clip=0.1, seed=SEED):
+    """
+    Vectorized form of 溶解氧收敛验证_0's redraw loop: all max_iterations
+    measured curves (simulated + N(0, sigma), clipped at `clip`) are drawn at
+    once and the first whose fraction of |residual| < threshold% (denominator
+    measured + 1e-6) reaches target is returned as (iteration, measured).
+    If none does, the last draw is returned, as the loop ends with it.
+    """
+    simulated = np.asarray(simulated, dtype=float)
+    # Row i holds the i-th sequential draw of np.random.seed(seed), as in the script
+    noise = np.random.RandomState(seed).normal(0, sigma, (max_iterations + 1, len(simulated)))
+    measured = np.clip(simulated + noise, clip, None)
+    percent = (measured - simulated) / (measured + 1e-6) * 100
+    passing = np.flatnonzero(fraction_within(percent, threshold, inclusive=False) >= target)
+    iteration = int(passing[0]) if passing.size else max_iterations
+    return iteration, measured[iteration]
+
+
+def scan_reference(times=None, scales=CANDIDATE_SCALES, threshold=THRESHOLD_PERCENT,
+                   desired=DESIRED_FRACTION, n_replicates=1, seed=SEED):
+    """
+    The scripts' main() search, repeated n_replicates times on one random
+    stream: one scalar draw per scale, residuals through a Python loop, stop at
+    the first scale that reaches desired.  Returns (measured, best scale of
+    each repetition, total number of draws); the first repetition is exactly
+    the scripts' result.
+    """
+    times = script_times() if times is None else times
+    rng = np.random.RandomState(seed)
+    measured = first_order_do(times, MEASURED_DO_MAX, MEASURED_K) + rng.normal(0.0, MEASURED_NOISE, len(times))
+    base = simulated_base(times)
+    best_scales, n_draws = [], 0
+    for _ in range(n_replicates):
+        best_scale, best_fraction = None, 0.0
+        for scale in scales:
+            simulated = base + rng.normal(loc=0.0, scale=scale, size=len(times))
+            simulated[0] = 0.0
+            n_draws += 1
+            residuals = []
+            for m, s in zip(measured, simulated):
+                residuals.append((s - m) / m * 100.0 if m != 0 else 0.0)
+            residuals = np.array(residuals)
+            fraction = np.sum(np.abs(residuals) <= threshold) / len(residuals)
+            if fraction > best_fraction:
+                best_fraction, best_scale = fraction, scale
+            if fraction >= desired:
+                break
+        best_scales.append(best_scale)
+    return measured, np.array(best_scales, dtype=float), n_draws
@@ -0,0 +1,487 @@
+"""
+Ensemble simulator for the substrate-feedback (fed-batch) model of 负反馈2.py
+and 负反馈回调.py.
+
+Model, per member:
+    growth (S > 1e-3)   dX/dt = mu_max S / (K_s + S) X,   dS/dt = -(dX/dt) / Y
+    decay  (otherwise)  dX/dt = -k_decay X,               dS/dt = 0
+    feed trigger        when dX/dt <= threshold_speed the substrate is refilled
+                        to S0 and the step is recomputed in the growth phase
+
+simulate_ensemble() advances thousands of parameter sets together with the
+same forward Euler scheme as the scripts (dt = 0.1 over 50 h by default).
+Every parameter may be a scalar or an array over the members; the growth or
+decay phase and the feed trigger are applied per member with masks, and the
+trigger events are recorded in flat arrays (member, step, time, X).
+
+With a single member the trajectories and events are identical, bit for bit,
+to the scripts' loops; simulate_reference() is that loop, kept as the ground
+truth for the comparison.
+
+simulate_adaptive() (or simulate_ensemble(method='rk45')) integrates the same
+model with adaptive Dormand-Prince steps per member, locating substrate
+exhaustion and the feed trigger as roots of event functions instead of at
+the next grid point, and interpolates the results at the requested times.
+It converges to the Euler solution as dt -> 0 with a few dozen steps where
+Euler needs thousands.
+
+    result = simulate_ensemble({'mu_max': np.linspace(0.8, 1.6, 5000)})
+    result.X                 (n_members, n_steps)
+    result.events_for(0)     [(time, X), ...] as the scripts' trigger_events
+
+Benchmarks: python bench_fed_batch.py
+"""
+import numpy as np
+
+# Parameters of 负反馈2.py
+DEFAULT_PARAMS = {
+    'X0': 0.1,
+    'S0': 30.0,
+    'mu_max': 1.2,
+    'K_s': 2.0,
+    'Y': 0.6,
+    'k_decay': 0.8,
+    'threshold_speed': -0.3,
+}
+# Parameters of 负反馈回调.py
+CALLBACK_PARAMS = {
+    'X0': 0.1,
+    'S0': 1.0,
+    'mu_max': 0.4,
+    'K_s': 0.5,
+    'Y': 0.5,
+    'k_decay': 0.1,
+    'threshold_speed': -0.5,
+}
+PARAM_NAMES = tuple(DEFAULT_PARAMS)
+
+TOTAL_TIME = 50
+DT = 0.1
+
+# Substrate below this counts as exhausted (decay phase)
+S_EPS = 1e-3
+
+
+class EnsembleResult:
+    """
+    Trajectories and feed-trigger events of an ensemble run.
+
+    Euler runs record the step index of each event (event_step); adaptive
+    runs record exact event times, substrate exhaustion events and per-member
+    solver statistics (n_steps, n_rejected, status).
+    """
+
+    def __init__(self, t, X, S, params, event_member, event_time, event_X, event_step=None,
+                 exhaustion_member=None, exhaustion_time=None, n_steps=None, n_rejected=None, status=None):
+        self.t = t
+        self.X = X
+        self.S = S
+        self.params = params
+        self.event_member = event_member
+        self.event_time = event_time
+        self.event_X = event_X
+        self.event_step = event_step
+        self.exhaustion_member = exhaustion_member
+        self.exhaustion_time = exhaustion_time
+        self.n_steps = n_steps
+        self.n_rejected = n_rejected
+        self.status = status
+
+    @property
+    def n_members(self):
+        return len(self.X)
+
+    @property
+    def n_triggers(self):
+        """Number of feed triggers per member"""
+        return np.bincount(self.event_member, minlength=self.n_members)
+
+    def first_trigger_time(self):
+        """Time of each member's first feed trigger (NaN if it never triggered)"""
+        first = np.full(self.n_members, np.nan)
+        # Events are recorded in step order, so the first occurrence per member is the earliest
+        members, index = np.unique(self.event_member, return_index=True)
+        first[members] = self.event_time[index]
+        return first
+
+    def events_for(self, member):
+        """[(time, X), ...] for one member, like the scripts' trigger_events"""
+        selected = self.event_member == member
+        return list(zip(self.event_time[selected].tolist(), self.event_X[selected].tolist()))
+
+    def __repr__(self):
+        return f"EnsembleResult({self.n_members} members, {len(self.t)} steps, {len(self.event_member)} triggers)"
+
+
+def ensemble_params(params=None, n_members=None):
+    """
+    Complete parameter arrays for an ensemble: missing names take the
+    DEFAULT_PARAMS values and everything is broadcast to (n_members,).
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    unknown = set(params) - set(PARAM_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+    arrays = {name: np.asarray(params[name], dtype=float) for name in PARAM_NAMES}
+    shape = np.broadcast_shapes(*(value.shape for value in arrays.values()))
+    if len(shape) > 1:
+        raise ValueError(f"Parameters must be scalars or 1-D arrays, got shape {shape}")
+    if n_members is None:
+        n_members = shape[0] if shape else 1
+    return {name: np.broadcast_to(value, (n_members,)) for name, value in arrays.items()}
+
+
+def time_points(total_time=TOTAL_TIME, dt=DT):
+    """Time grid of the scripts: np.arange(0, total_time, dt)"""
+    return np.arange(0, total_time, dt)
+
+
+def simulate_ensemble(params=None, total_time=TOTAL_TIME, dt=DT, n_members=None, method='euler', **options):
+    """
+    Simulate every member at once.
+
+    params     {name: scalar or (n_members,) array}; defaults from DEFAULT_PARAMS
+    n_members  only needed when every parameter is a scalar
+    method     'euler': the scripts' fixed-step scheme;
+               'rk45': adaptive integration (simulate_adaptive) reported on the same time grid,
+               options are passed on to it
+    """
+    if method == 'rk45':
+        return simulate_adaptive(params, total_time, t_eval=time_points(total_time, dt), n_members=n_members,
+                                 **options)
+    if method != 'euler':
+        raise ValueError(f"Unknown method '{method}', expected 'euler' or 'rk45'")
+    p = ensemble_params(params, n_members)
+    t = time_points(total_time, dt)
+    n_steps = len(t)
+    n = len(p['X0'])
+    mu_max, K_s, Y, k_decay = p['mu_max'], p['K_s'], p['Y'], p['k_decay']
+    S0, threshold = p['S0'], p['threshold_speed']
+    neg_k_decay = -k_decay
+    # Growth rate right after a refill is the same every time for a member
+    mu_refill = mu_max * S0 / (K_s + S0)
+
+    X = np.empty((n, n_steps))
+    S = np.empty((n, n_steps))
+    X[:, 0] = p['X0']
+    S[:, 0] = S0
+    x, s = X[:, 0].copy(), S[:, 0].copy()
+    event_member, event_step, event_X = [], [], []
+
+    for i in range(1, n_steps):
+        growth = s > S_EPS
+        # Decay-phase members may divide by zero here (K_s = S = 0); their mu is never used
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mu = mu_max * s / (K_s + s)
+        dxdt = np.where(growth, mu * x, neg_k_decay * x)
+        dsdt = np.where(growth, -dxdt / Y, 0.0)
+
+        triggered = dxdt <= threshold
+        if triggered.any():
+            members = np.flatnonzero(triggered)
+            # As in the scripts the refill overwrites the previous step's substrate
+            S[members, i - 1] = S0[members]
+            s = np.where(triggered, S0, s)
+            dxdt = np.where(triggered, mu_refill * x, dxdt)
+            dsdt = np.where(triggered, -dxdt / Y, dsdt)
+            event_member.append(members)
+            event_step.append(np.full(len(members), i))
+            event_X.append(x[members])
+
+        x = x + dxdt * dt
+        s = np.maximum(s + dsdt * dt, 0.0)
+        X[:, i] = x
+        S[:, i] = s
+
+    def flat(chunks, dtype):
+        return np.concatenate(chunks).astype(dtype) if chunks else np.empty(0, dtype=dtype)
+
+    event_step = flat(event_step, np.int32)
+    return EnsembleResult(t, X, S, p, flat(event_member, np.int32), t[event_step], flat(event_X, float),
+                          event_step=event_step)
+
+
+# Dormand-Prince 5(4) tableau with its 4th-order dense output (as scipy's RK45)
+RK_C = np.array([0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1])
+RK_A = [np.array(row) for row in (
+    [],
+    [1 / 5],
+    [3 / 40, 9 / 40],
+    [44 / 45, -56 / 15, 32 / 9],
+    [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+    [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+)]
+RK_B = np.array([35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84])
+RK_E = np.array([-71 / 57600, 0, 71 / 16695, -71 / 1920, 17253 / 339200, -22 / 525, 1 / 40])
+RK_P = np.array([
+    [1, -8048581381 / 2820520608, 8663915743 / 2820520608, -12715105075 / 11282082432],
+    [0, 0, 0, 0],
+    [0, 131558114200 / 32700410799, -68118460800 / 10900136933, 87487479700 / 32700410799],
+    [0, -1754552775 / 470086768, 14199869525 / 1410260304, -10690763975 / 1880347072],
+    [0, 127303824393 / 49829197408, -318862633887 / 49829197408, 701980252875 / 199316789632],
+    [0, -282668133 / 205662961, 2019193451 / 616988883, -1453857185 / 822651844],
+    [0, 40617522 / 29380423, -110615467 / 29380423, 69997945 / 29380423],
+])
+
+# Step size control
+SAFETY = 0.9
+MIN_FACTOR = 0.2
+MAX_FACTOR = 10.0
+FIRST_STEP = 0.01
+# Event times are located by regula falsi (Illinois variant) to this fraction of the step
+EVENT_TOL = 1e-12
+EVENT_MAX_ITERATIONS = 60
+
+# Member status after simulate_adaptive
+STATUS_OK = 0
+STATUS_MAX_EVENTS = 1
+STATUS_MAX_STEPS = 2
+STATUS_STEP_SIZE = 3
+
+
+def _rhs(y, growth, mu_max, K_s, Y, k_decay):
+    """d[X, S]/dt for states y = [X, S] of shape (2, n); the phase is fixed within a step"""
+    x, s = y
+    mu = mu_max * s / (K_s + s)
+    dxdt = np.where(growth, mu * x, -k_decay * x)
+    dsdt = np.where(growth, -dxdt / Y, 0.0)
+    return np.stack([dxdt, dsdt])
+
+
+def _dense(y, h, Q, theta):
+    """State at t + theta h from the step's dense output Q (2, n, 4)"""
+    powers = np.cumprod(np.broadcast_to(theta, (4,) + np.shape(theta)), axis=0)
+    return y + h * np.einsum('dnp,pn->dn', Q, powers)
+
+
+def _event_values(y, growth, dxdt, threshold):
+    """Event functions; both cross from positive to <= 0 at an event"""
+    exhaustion = np.where(growth, y[1] - S_EPS, np.inf)
+    return exhaustion, dxdt - threshold
+
+
+def _find_event(g, g_lo, g_hi):
+    """
+    First theta in (0, 1] with g(theta) <= 0, given g(0) = g_lo > 0 >= g(1) = g_hi
+    (vectorized Illinois iteration; the returned side always satisfies g <= 0)
+    """
+    lo, hi = np.zeros(len(g_lo)), np.ones(len(g_lo))
+    g_lo, g_hi = np.array(g_lo, dtype=float), np.array(g_hi, dtype=float)
+    side = np.zeros(len(g_lo), dtype=int)
+    for _ in range(EVENT_MAX_ITERATIONS):
+        open_ = hi - lo > EVENT_TOL
+        if not open_.any():
+            break
+        # The secant point can stall when g_lo is huge; fall back to bisection when it is not strictly inside
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mid = lo - g_lo * (hi - lo) / (g_hi - g_lo)
+        inside = np.isfinite(mid) & (mid > lo) & (mid < hi)
+        mid = np.where(inside, mid, 0.5 * (lo + hi))
+        g_mid = g(mid)
+        positive = open_ & (g_mid > 0)
+        negative = open_ & ~positive
+        # Illinois: halve the retained end's value when the same end is kept twice in a row
+        g_hi = np.where(positive & (side == 1), 0.5 * g_hi, g_hi)
+        g_lo = np.where(negative & (side == -1), 0.5 * g_lo, g_lo)
+        lo, g_lo = np.where(positive, mid, lo), np.where(positive, g_mid, g_lo)
+        hi, g_hi = np.where(negative, mid, hi), np.where(negative, g_mid, g_hi)
+        side = np.where(positive, 1, np.where(negative, -1, side))
+        # A root found to within rounding closes the bracket
+        hi = np.where(negative & (g_mid == 0), mid, hi)
+        lo = np.where(negative & (g_mid == 0), mid, lo)
+    return hi
+
+
+def simulate_adaptive(params=None, total_time=TOTAL_TIME, t_eval=None, n_members=None, rtol=1e-3, atol=1e-6,
+                      first_step=FIRST_STEP, max_step=np.inf, max_events=1000, max_steps=100000):
+    """
+    Adaptive Dormand-Prince (RK45) integration of every member with per-member
+    step sizes, error control and root-found events:
+
+        substrate exhaustion   S falls to 1e-3: switch to the decay phase; if the
+                               decay rate is already <= threshold_speed, refeed at once
+        feed trigger           dX/dt falls to threshold_speed: refill S to S0 (growth phase)
+
+    Results are interpolated with the 4th-order dense output at t_eval (default:
+    the scripts' grid time_points(total_time)).  At an event time the state just
+    before the event is reported.
+
+    A member stops early with status STATUS_MAX_EVENTS after max_events feed
+    triggers (the refeed can chatter: each refill is consumed faster than the
+    last), STATUS_MAX_STEPS after max_steps accepted steps, or STATUS_STEP_SIZE
+    when the step size underflows; its remaining outputs are NaN.
+    """
+    p = ensemble_params(params, n_members)
+    t_eval = time_points(total_time) if t_eval is None else np.asarray(t_eval, dtype=float)
+    t_end = max(float(total_time), float(t_eval[-1]) if len(t_eval) else 0.0)
+    n = len(p['X0'])
+
+    X = np.full((n, len(t_eval)), np.nan)
+    S = np.full((n, len(t_eval)), np.nan)
+    y = np.stack([np.array(p['X0'], dtype=float), np.array(p['S0'], dtype=float)])
+    t = np.zeros(n)
+    h = np.full(n, min(first_step, max_step, t_end))
+    growth = y[1] > S_EPS
+    n_steps = np.zeros(n, dtype=int)
+    n_rejected = np.zeros(n, dtype=int)
+    n_events = np.zeros(n, dtype=int)
+    status = np.full(n, STATUS_OK)
+    # Next output index per member; outputs at t = 0 are the initial state
+    next_out = np.full(n, np.searchsorted(t_eval, 0.0, side='right'))
+    X[:, :next_out[0]] = y[0][:, None]
+    S[:, :next_out[0]] = y[1][:, None]
+    events = {'member': [], 'time': [], 'X': [], 'exhaustion_member': [], 'exhaustion_time': []}
+
+    # Trial stages may overshoot into invalid states (S <= -K_s, overflow); their steps are rejected
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        active = np.flatnonzero(t < t_end)
+        while active.size:
+            mu_max, K_s, Y, k_decay = (p[name][active] for name in ('mu_max', 'K_s', 'Y', 'k_decay'))
+            S0, threshold = p['S0'][active], p['threshold_speed'][active]
+            a_y, a_t, a_h, a_growth = y[:, active], t[active], h[active], growth[active]
+            a_h = np.minimum(a_h, t_end - a_t)
+
+            K = np.empty((7,) + a_y.shape)
+            K[0] = _rhs(a_y, a_growth, mu_max, K_s, Y, k_decay)
+            for i in range(1, 6):
+                stage = a_y + a_h * np.einsum('k,kdn->dn', RK_A[i], K[:i])
+                K[i] = _rhs(stage, a_growth, mu_max, K_s, Y, k_decay)
+            y_new = a_y + a_h * np.einsum('k,kdn->dn', RK_B, K[:6])
+            K[6] = _rhs(y_new, a_growth, mu_max, K_s, Y, k_decay)
+
+            scale = atol + rtol * np.maximum(np.abs(a_y), np.abs(y_new))
+            error = np.sqrt(np.mean((a_h * np.einsum('k,kdn->dn', RK_E, K) / scale) ** 2, axis=0))
+            accepted = np.isfinite(error) & (error < 1)
+            factor = SAFETY * error ** -0.2
+            factor = np.where(accepted, np.minimum(MAX_FACTOR, factor), np.clip(factor, MIN_FACTOR, 1.0))
+            factor[~np.isfinite(error)] = MIN_FACTOR
+            h[active] = np.minimum(a_h * factor, max_step)
+            n_rejected[active[~accepted]] += 1
+
+            tiny = ~accepted & (a_h * MIN_FACTOR <= 1e-14 * np.maximum(1.0, np.abs(a_t)))
+            status[active[tiny]] = STATUS_STEP_SIZE
+
+            if accepted.any():
+                acc = np.flatnonzero(accepted)
+                members = active[acc]
+                step_h, step_y = a_h[acc], a_y[:, acc]
+                Q = np.einsum('kdn,kp->dnp', K[:, :, acc], RK_P)
+                start_exh, start_trig = _event_values(step_y, a_growth[acc], K[0, 0, acc], threshold[acc])
+                end_exh, end_trig = _event_values(y_new[:, acc], a_growth[acc], K[6, 0, acc], threshold[acc])
+                # Only functions positive at the start of the step can cross within it
+                end_trig = np.where(start_trig > 0, end_trig, np.inf)
+                crossed = np.flatnonzero(np.minimum(end_exh, end_trig) <= 0)
+
+                theta = np.ones(len(acc))
+                exhausted = np.zeros(len(acc), dtype=bool)
+                triggered = np.zeros(len(acc), dtype=bool)
+                if crossed.size:
+                    c_growth, c_threshold = a_growth[acc][crossed], threshold[acc][crossed]
+                    c_params = (mu_max[acc][crossed], K_s[acc][crossed], Y[acc][crossed], k_decay[acc][crossed])
+                    c_y, c_h, c_Q = step_y[:, crossed], step_h[crossed], Q[:, crossed]
+                    trig_live = start_trig[crossed] > 0
+
+                    def combined(th):
+                        state = _dense(c_y, c_h, c_Q, th)
+                        exh, trig = _event_values(state, c_growth, _rhs(state, c_growth, *c_params)[0], c_threshold)
+                        return exh, np.where(trig_live, trig, np.inf)
+
+                    hi = _find_event(lambda th: np.minimum(*combined(th)), np.minimum(start_exh, start_trig)[crossed],
+                                     np.minimum(end_exh, end_trig)[crossed])
+                    exh, trig = combined(hi)
+                    theta[crossed] = hi
+                    exhausted[crossed] = exh <= 0
+                    triggered[crossed] = (trig <= 0) & ~(exh <= 0)
+
+                t_stop = a_t[acc] + theta * step_h
+                y_stop = np.where(theta < 1, _dense(step_y, step_h, Q, theta), y_new[:, acc])
+
+                # Dense output for every t_eval point passed by this step
+                last = np.searchsorted(t_eval, t_stop, side='right')
+                counts = last - next_out[members]
+                if counts.sum():
+                    rows = np.repeat(np.arange(len(acc)), counts)
+                    offsets = np.cumsum(counts) - counts
+                    cols = next_out[members][rows] + np.arange(counts.sum()) - offsets[rows]
+                    th = (t_eval[cols] - a_t[acc][rows]) / step_h[rows]
+                    out = _dense(step_y[:, rows], step_h[rows], Q[:, rows], th)
+                    X[members[rows], cols] = out[0]
+                    S[members[rows], cols] = out[1]
+                    next_out[members] = last
+
+                t[members] = t_stop
+                n_steps[members] += 1
+                x_stop, s_stop = y_stop
+                new_growth = a_growth[acc].copy()
+
+                if exhausted.any():
+                    new_growth[exhausted] = False
+                    s_stop = np.where(exhausted, S_EPS, s_stop)
+                    events['exhaustion_member'].append(members[exhausted])
+                    events['exhaustion_time'].append(t_stop[exhausted])
+                    # Refeed at once when the decay rate already meets the threshold (as the Euler loop does)
+                    triggered |= exhausted & (-k_decay[acc] * x_stop <= threshold[acc])
+
+                if triggered.any():
+                    new_growth[triggered] = True
+                    s_stop = np.where(triggered, S0[acc], s_stop)
+                    events['member'].append(members[triggered])
+                    events['time'].append(t_stop[triggered])
+                    events['X'].append(x_stop[triggered])
+                    n_events[members[triggered]] += 1
+                    # Start again with a small step: the refill is a discontinuity
+                    h[members[triggered]] = np.minimum(h[members[triggered]], first_step)
+
+                y[:, members] = np.stack([x_stop, s_stop])
+                growth[members] = new_growth
+                status[members[n_events[members] >= max_events]] = STATUS_MAX_EVENTS
+                status[members[n_steps[members] >= max_steps]] = STATUS_MAX_STEPS
+
+            active = active[(t[active] < t_end) & (status[active] == STATUS_OK)]
+
+    def flat(chunks, dtype):
+        return np.concatenate(chunks).astype(dtype) if chunks else np.empty(0, dtype=dtype)
+
+    # Events were collected step by step; order them by time (then member) as the Euler run records them
+    member, time, event_X = flat(events['member'], np.int32), flat(events['time'], float), flat(events['X'], float)
+    order = np.lexsort((member, time))
+    exh_member, exh_time = flat(events['exhaustion_member'], np.int32), flat(events['exhaustion_time'], float)
+    exh_order = np.lexsort((exh_member, exh_time))
+    return EnsembleResult(t_eval, X, S, p, member[order], time[order], event_X[order],
+                          exhaustion_member=exh_member[exh_order], exhaustion_time=exh_time[exh_order],
+                          n_steps=n_steps, n_rejected=n_rejected, status=status)
+
+
+def simulate_reference(params=None, total_time=TOTAL_TIME, dt=DT):
+    """The scripts' scalar loop for one parameter set: (t, X, S, trigger_events)"""
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    t = time_points(total_time, dt)
+    n_steps = len(t)
+    X = np.zeros(n_steps)
+    S = np.zeros(n_steps)
+    X[0] = params['X0']
+    S[0] = params['S0']
+    trigger_events = []
+
+    for i in range(1, n_steps):
+        prev_X = X[i - 1]
+        prev_S = S[i - 1]
+        if prev_S > S_EPS:
+            mu = params['mu_max'] * prev_S / (params['K_s'] + prev_S)
+            dXdt = mu * prev_X
+            dSdt = -dXdt / params['Y']
+        else:
+            dXdt = -params['k_decay'] * prev_X
+            dSdt = 0.0
+
+        if dXdt <= params['threshold_speed']:
+            S[i - 1] = params['S0']
+            prev_S = params['S0']
+            mu = params['mu_max'] * prev_S / (params['K_s'] + prev_S)
+            dXdt = mu * prev_X
+            dSdt = -dXdt / params['Y']
+            trigger_events.append((t[i], prev_X))
+
+        X[i] = prev_X + dXdt * dt
+        S[i] = max(prev_S + dSdt * dt, 0)
+    return t, X, S, trigger_events
@@ -0,0 +1,262 @@
+"""
+批量地理编码：把用户输入的地名转换为坐标（高德坐标 GCJ-02）
+
+查找顺序：
+1. 本地景点目录（ROUTES 中的景点和附近推荐）模糊匹配，命中则不发起任何请求；
+2. 持久缓存（route_cache.SharedCache 的 'geocode' 命名空间，默认 SQLite 文件）；
+3. 远程地理编码服务：剩余的地名一次性并发请求（高德每次请求最多批量 10 个地址），
+   添加十个景点只需要一轮并发请求。
+
+远程服务由环境变量 GEOCODER 指定：
+    amap                    高德地理编码（默认，需要 AMAP_API_KEY）
+    baidu                   百度地理编码（读取 baidu_map_config.json）
+    gazetteer:places.csv    本地地名表（CSV 列为 name,lat,lon[,address]，坐标为高德坐标）
+
+命令行：
+    python geocoding.py 拙政园 虎丘 金鸡湖
+"""
+import argparse
+import csv
+import difflib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from routing_providers import load_baidu_config
+
+DEFAULT_CITY = '苏州'
+
+# 目录模糊匹配的相似度阈值
+FUZZY_CUTOFF = 0.8
+# 加在景点名后仍指同一地点的泛称
+GENERIC_SUFFIXES = ('风景区', '旅游区', '景区', '景点')
+
+GEOCODE_NAMESPACE = 'geocode'
+
+
+def normalize_name(name):
+    return ''.join(name.split()).lower()
+
+
+def place(name, lng, lat, address='', source=''):
+    return {'name': name, 'lat': lat, 'lon': lng, 'address': address, 'source': source}
+
+
+class Geocoder:
+    """地理编码服务接口：geocode_batch 返回与 names 一一对应的结果（未找到为 None）"""
+
+    name = 'base'
+    # 单次请求可包含的地名数
+    batch_size = 1
+
+    def geocode_batch(self, names):
+        raise NotImplementedError
+
+
+class AMapGeocoder(Geocoder):
+    """高德地理编码，batch=true 时一次请求最多 10 个地址"""
+
+    name = 'amap'
+    batch_size = 10
+
+    def __init__(self, api_key, city=DEFAULT_CITY, timeout=5.0, host=None):
+        self.api_key = api_key
+        self.city = city
+        self.timeout = timeout
+        host = host or os.environ.get('AMAP_REST_HOST', 'https://restapi.amap.com')
+        self.base_url = f"{host.rstrip('/')}/v3/geocode/geo"
+
+    def geocode_batch(self, names):
+        import requests  # 延迟导入，缩短应用冷启动时间
+
+        params = {
+            'key': self.api_key,
+            'address': '|'.join(names),
+            'city': self.city,
+            'batch': 'true' if len(names) > 1 else 'false',
+            'output': 'json',
+        }
+        result = requests.get(self.base_url, params=params, timeout=self.timeout).json()
+        if result.get('status') != '1':
+            return [None] * len(names)
+        geocodes = result.get('geocodes', [])
+        places = []
+        for name, geocode in zip(names, geocodes + [None] * (len(names) - len(geocodes))):
+            # 批量查询中未找到的地址返回空的 location
+            location = geocode.get('location') if geocode else None
+            if not location or not isinstance(location, str):
+                places.append(None)
+                continue
+            lng, lat = map(float, location.split(','))
+            places.append(place(name, lng, lat, geocode.get('formatted_address', ''), self.name))
+        return places
+
+
+class BaiduGeocoder(Geocoder):
+    """百度地理编码，直接返回高德坐标（ret_coordtype=gcj02ll）"""
+
+    name = 'baidu'
+
+    def __init__(self, ak, city=DEFAULT_CITY, timeout=5.0,
+                 base_url="https://api.map.baidu.com/geocoding/v3/"):
+        self.ak = ak
+        self.city = city
+        self.timeout = timeout
+        self.base_url = base_url
+
+    def geocode_batch(self, names):
+        import requests  # 延迟导入，缩短应用冷启动时间
+
+        places = []
+        for name in names:
+            params = {
+                'ak': self.ak,
+                'address': name,
+                'city': self.city,
+                'ret_coordtype': 'gcj02ll',
+                'output': 'json',
+            }
+            result = requests.get(self.base_url, params=params, timeout=self.timeout).json()
+            location = result.get('result', {}).get('location') if result.get('status') == 0 else None
+            places.append(place(name, location['lng'], location['lat'], '', self.name) if location else None)
+        return places
+
+
+class GazetteerGeocoder(Geocoder):
+    """本地地名表，不依赖网络；先精确匹配，再模糊匹配"""
+
+    name = 'gazetteer'
+
+    def __init__(self, path):
+        self.entries = {}
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            for row in csv.DictReader(f):
+                self.entries[normalize_name(row['name'])] = place(
+                    row['name'], float(row['lon']), float(row['lat']), row.get('address', ''), self.name
+                )
+
+    def geocode_batch(self, names):
+        return [fuzzy_lookup(self.entries, name) for name in names]
+
+
+def fuzzy_lookup(entries, name, cutoff=FUZZY_CUTOFF):
+    """在 {规范化名称: 地点} 中查找：精确匹配、目录名加泛称（"拙政园景区" → "拙政园"）、difflib 相似度
+
+    输入在目录名之外还有其他内容时（"苏州博物馆西馆"、"拙政园附近的酒店"）是另一个地点，
+    即使相似度够高也不匹配，返回 None 交给远程地理编码
+    """
+    key = normalize_name(name)
+    if key in entries:
+        return entries[key]
+    for suffix in GENERIC_SUFFIXES:
+        if key.endswith(suffix) and key[:-len(suffix)] in entries:
+            return entries[key[:-len(suffix)]]
+    # 反过来（输入是目录名的一部分，如"平江路" → "平江路小吃"）容易误配，同样只按相似度判断
+    for match in difflib.get_close_matches(key, list(entries), n=3, cutoff=cutoff):
+        if match not in key:
+            return entries[match]
+    return None
+
+
+def catalog_from_routes(routes):
+    """景点目录：{规范化名称: 地点}，包含行程中的景点和附近推荐"""
+    entries = {}
+    for day_data in routes.values():
+        for point in day_data['points']:
+            entries[normalize_name(point['name'])] = place(
+                point['name'], point['lon'], point['lat'], point.get('info', ''), 'catalog'
+            )
+            for places in point.get('nearby_places', {}).values():
+                for nearby in places:
+                    entries[normalize_name(nearby['name'])] = place(
+                        nearby['name'], nearby['lon'], nearby['lat'], nearby.get('desc', ''), 'catalog'
+                    )
+    return entries
+
+
+class BatchGeocoder:
+    """目录模糊匹配 → 持久缓存 → 一轮并发远程请求"""
+
+    def __init__(self, remote=None, catalog=None, cache=None, max_workers=16, namespace=GEOCODE_NAMESPACE):
+        self.remote = remote
+        self.catalog = catalog or {}
+        self.cache = cache
+        self.max_workers = max_workers
+        self.namespace = namespace
+
+    def geocode(self, names):
+        """返回 {地名: 地点或 None}；地点含 name/lat/lon/address/source"""
+        results = {}
+        pending = []
+        for name in dict.fromkeys(n.strip() for n in names if n.strip()):
+            found = fuzzy_lookup(self.catalog, name)
+            if found is None and self.cache is not None:
+                found = self.cache.get(self.namespace, normalize_name(name))
+            if found is not None:
+                results[name] = found
+            else:
+                pending.append(name)
+
+        if pending and self.remote is not None:
+            size = self.remote.batch_size
+            batches = [pending[i:i + size] for i in range(0, len(pending), size)]
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+                for batch, places in zip(batches, executor.map(self._safe_batch, batches)):
+                    for name, found in zip(batch, places):
+                        results[name] = found
+                        if found is not None and self.cache is not None:
+                            self.cache.set(self.namespace, normalize_name(name), found)
+        for name in pending:
+            results.setdefault(name, None)
+        return results
+
+    def _safe_batch(self, names):
+        try:
+            return self.remote.geocode_batch(names)
+        except Exception:
+            return [None] * len(names)
+
+
+def build_remote_geocoder(amap_key, spec=None, city=DEFAULT_CITY):
+    """根据 GEOCODER（amap / baidu / gazetteer:<path>）创建远程地理编码服务，不可用时返回 None"""
+    spec = spec or os.environ.get('GEOCODER', 'amap')
+    if spec == 'amap':
+        return AMapGeocoder(amap_key, city) if amap_key else None
+    if spec == 'baidu':
+        config = load_baidu_config()
+        if config and config.get('ak'):
+            return BaiduGeocoder(config['ak'], city, timeout=config.get('timeout', 5000) / 1000.0)
+        return None
+    if spec.startswith('gazetteer:'):
+        return GazetteerGeocoder(spec[len('gazetteer:'):])
+    raise ValueError(f"不支持的地理编码服务：{spec}")
+
+
+def build_geocoder(amap_key, routes, cache=None, spec=None, city=DEFAULT_CITY):
+    """city 为地理编码限定的城市名；同名地点在不同城市坐标不同，缓存按城市分开（苏州沿用原来的命名空间）"""
+    namespace = GEOCODE_NAMESPACE if city == DEFAULT_CITY else f"{GEOCODE_NAMESPACE}:{city}"
+    return BatchGeocoder(build_remote_geocoder(amap_key, spec, city), catalog_from_routes(routes), cache,
+                         namespace=namespace)
+
+
+def main():
+    from city_packs import DEFAULT_CITY as DEFAULT_PACK, get_registry
+    from route_cache import build_cache
+
+    parser = argparse.ArgumentParser(description='批量地理编码')
+    parser.add_argument('names', nargs='+', help='地名')
+    parser.add_argument('--geocoder', help='amap / baidu / gazetteer:<path>（默认读取环境变量 GEOCODER）')
+    parser.add_argument('--city', default=DEFAULT_PACK, help='城市包名称（景点目录和查询范围）')
+    args = parser.parse_args()
+
+    pack = get_registry().get(args.city)
+    geocoder = build_geocoder(os.environ.get('AMAP_API_KEY', ''), pack.routes, build_cache(), args.geocoder,
+                              pack.name)
+    for name, found in geocoder.geocode(args.names).items():
+        if found is None:
+            print(f"{name}\t未找到")
+        else:
+            print(f"{name}\t{found['lon']},{found['lat']}\t{found['name']}\t{found['source']}\t{found['address']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+行程静态包：预先渲染默认行程（路线、景点标记、"行程安排"文本和高德导航链接），
+默认访问直接读取静态包，不再实时请求路线接口
+
+构建（默认城市；其他城市用 --city 指定城市包）：
+    AMAP_API_KEY=... python itinerary_bundle.py build
+    AMAP_API_KEY=... python itinerary_bundle.py build --city hangzhou
+
+输出目录 bundles/<内容哈希>/（根目录可用环境变量 ITINERARY_BUNDLE_DIR 指定）：
+    map.html           folium 地图页面
+    itinerary.geojson  每段路线的几何和景点
+    itinerary.md       行程安排
+    manifest.json      内容哈希、构建时间和各文件的 sha256
+
+静态包中的路线和行程安排按时间表（day_scheduler）重排后的游览顺序渲染，与页面一致。
+内容哈希由行程数据和静态包格式版本计算。行程数据修改后哈希随之变化，
+页面找不到匹配的静态包时会自动改回实时渲染，直到重新构建。
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+BUNDLE_FORMAT_VERSION = 3
+DEFAULT_BUNDLE_DIR = 'bundles'
+
+BUNDLE_FILES = ('map.html', 'itinerary.geojson', 'itinerary.md')
+
+
+def bundle_root():
+    return os.environ.get('ITINERARY_BUNDLE_DIR', DEFAULT_BUNDLE_DIR)
+
+
+def content_hash(routes):
+    """行程数据的内容哈希（与字典顺序无关）"""
+    payload = json.dumps(
+        {'format': BUNDLE_FORMAT_VERSION, 'routes': routes},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def load_bundle(routes, root=None):
+    """读取与行程数据匹配的静态包，返回 {'hash', 'map_html', 'itinerary_md'}；不存在时返回 None"""
+    digest = content_hash(routes)
+    bundle_dir = os.path.join(root or bundle_root(), digest)
+    try:
+        with open(os.path.join(bundle_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        with open(os.path.join(bundle_dir, 'map.html'), 'r', encoding='utf-8') as f:
+            map_html = f.read()
+        with open(os.path.join(bundle_dir, 'itinerary.md'), 'r', encoding='utf-8') as f:
+            itinerary_md = f.read()
+    except FileNotFoundError:
+        return None
+    if manifest.get('content_hash') != digest:
+        return None
+    return {'hash': digest, 'map_html': map_html, 'itinerary_md': itinerary_md}
+
+
+def atomic_write(path, data):
+    """先写临时文件再替换，避免读到写了一半的文件"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def leg_feature(day_key, day_data, start_point, end_point, line, amap_url):
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'LineString', 'coordinates': [[lng, lat] for lat, lng in line]},
+        'properties': {
+            'day': day_key,
+            'from': start_point['name'],
+            'to': end_point['name'],
+            'color': day_data['color'],
+            'amap_url': amap_url,
+        },
+    }
+
+
+def point_feature(day_key, point):
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [point['lon'], point['lat']]},
+        'properties': {
+            'day': day_key,
+            'name': point['name'],
+            'info': point['info'],
+            'type': point['type'],
+        },
+    }
+
+
+def build_bundle(root=None, city=None):
+    """实时请求路线并渲染城市包的默认行程，写入静态包目录，返回目录路径"""
+    import suzhou_tour_map as app
+    from city_packs import DEFAULT_CITY, get_registry
+    from recommendations import NearbyRanker
+    from day_scheduler import apply_schedule, schedule_routes
+
+    city = city or DEFAULT_CITY
+    pack = get_registry().get(city)
+    graph = pack.graph
+    schedule = schedule_routes(pack.routes, graph)
+    routes = apply_schedule(pack.routes, schedule)
+    folium, _ = app.load_map_libs()
+    m = app.create_base_map(city)
+    features = []
+    for day_key, day_data in routes.items():
+        points = day_data['points']
+        color = day_data['color']
+        for i in range(len(points) - 1):
+            start_point = points[i]
+            end_point = points[i + 1]
+            line = app.draw_default_route(m, start_point, end_point, color)
+            if not line:
+                # 与页面一致：路线不可用时使用虚线直线连接
+                line = [[start_point['lat'], start_point['lon']], [end_point['lat'], end_point['lon']]]
+                folium.PolyLine(line, weight=2, color=color, opacity=0.5, dash_array='5,10').add_to(m)
+            features.append(leg_feature(
+                day_key, day_data, start_point, end_point, line,
+                app.get_amap_url(start_point, end_point)
+            ))
+        for point in points:
+            app.add_point_marker(m, point)
+            features.append(point_feature(day_key, point))
+
+    contents = {
+        'map.html': m.get_root().render(),
+        'itinerary.geojson': json.dumps({'type': 'FeatureCollection', 'features': features}, ensure_ascii=False),
+        'itinerary.md': '\n'.join(app.itinerary_lines(
+            {}, NearbyRanker(graph, router=app.get_router(), cache=app.get_route_cache()), schedule, routes
+        )),
+    }
+
+    # 页面按城市包中原始的行程数据查找静态包
+    digest = content_hash(pack.routes)
+    bundle_dir = os.path.join(root or bundle_root(), digest)
+    os.makedirs(bundle_dir, exist_ok=True)
+    manifest = {
+        'content_hash': digest,
+        'format': BUNDLE_FORMAT_VERSION,
+        'built_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'files': {},
+    }
+    for name in BUNDLE_FILES:
+        data = contents[name].encode('utf-8')
+        atomic_write(os.path.join(bundle_dir, name), data)
+        manifest['files'][name] = hashlib.sha256(data).hexdigest()
+    # manifest 最后写入，页面只有在所有文件就绪后才会使用该静态包
+    atomic_write(
+        os.path.join(bundle_dir, 'manifest.json'),
+        json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8')
+    )
+    return bundle_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description='行程静态包工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help='渲染默认行程并写入静态包')
+    build.add_argument('--out', help=f'静态包根目录（默认 {DEFAULT_BUNDLE_DIR}）')
+    build.add_argument('--city', help='城市包名称（默认 suzhou）')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        print(f"静态包已写入 {build_bundle(args.out, args.city)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+行程导出：把每天的完整路线几何、途经点和景点信息流式写成 GPX 或 GeoJSON
+
+导出内容由生成器逐段产生（每次一小段文本），路线按路段依次请求和解析，
+不在内存中构建整份文档，几万个顶点的多日行程也只占用单个路段的内存。
+坐标默认转换为 WGS-84（GPX 和 GeoJSON 规范要求，GPS 设备和大多数地图软件使用），
+--coords gcj02 时保留高德坐标。
+
+命令行：
+    python itinerary_export.py --format gpx --out suzhou.gpx
+    python itinerary_export.py --format geojson --manual-routes plan.json > suzhou.geojson
+    python itinerary_export.py --city hangzhou --out hangzhou.gpx
+    python itinerary_export.py --leg-modes modes.json --out suzhou.gpx
+
+plan.json 为手动规划的途经点：{"维也纳国际酒店-拙政园": [[lat, lng], ...], ...}
+modes.json 为各路段的出行方式：{"维也纳国际酒店-拙政园": "bicycling", ...}，未指定的路段按步行
+"""
+import argparse
+import json
+import os
+import sys
+from xml.sax.saxutils import escape
+
+from routing_providers import gcj02_to_wgs84, is_valid_route
+
+# 每次输出的坐标数，平衡生成器调用开销和单段文本大小
+COORDS_PER_CHUNK = 1000
+# 未在 leg_modes 中指定出行方式的路段
+DEFAULT_MODE = 'walking'
+
+EXPORT_FORMATS = {
+    'gpx': ('application/gpx+xml', 'gpx'),
+    'geojson': ('application/geo+json', 'geojson'),
+}
+
+
+def leg_chain(start_point, end_point, waypoints):
+    """路段的完整点序列（[lat, lng]）：起点、途经点、终点"""
+    return ([[start_point['lat'], start_point['lon']]] + [list(p) for p in waypoints or []]
+            + [[end_point['lat'], end_point['lon']]])
+
+
+def iter_legs(routes, manual_routes=None):
+    """依次产生 (day_key, day_data, start_point, end_point, waypoints)"""
+    manual_routes = manual_routes or {}
+    for day_key, day_data in routes.items():
+        points = day_data['points']
+        for i in range(len(points) - 1):
+            route_key = f"{points[i]['name']}-{points[i + 1]['name']}"
+            yield day_key, day_data, points[i], points[i + 1], manual_routes.get(route_key, [])
+
+
+def leg_mode(leg_modes, start_point, end_point):
+    """路段的出行方式（leg_modes 为 {路段名称: 出行方式}）"""
+    return (leg_modes or {}).get(f"{start_point['name']}-{end_point['name']}", DEFAULT_MODE)
+
+
+def iter_leg_vertices(fetch, start_point, end_point, waypoints, wgs84=True, mode=DEFAULT_MODE):
+    """逐个产生路段的顶点 (lng, lat)：按点序列逐段请求路线并解析折线，某段无结果时用直线连接"""
+    chain = leg_chain(start_point, end_point, waypoints)
+    last = None
+    for (lat1, lng1), (lat2, lng2) in zip(chain, chain[1:]):
+        result = fetch(f"{lng1},{lat1}", f"{lng2},{lat2}", mode)
+        if is_valid_route(result):
+            coords = (coord for step in result['route']['paths'][0]['steps']
+                      for coord in step.get('polyline', '').split(';') if coord)
+        else:
+            coords = (f"{lng1},{lat1}", f"{lng2},{lat2}")
+        for coord in coords:
+            lng, lat = map(float, coord.split(','))
+            if wgs84:
+                lng, lat = gcj02_to_wgs84(lng, lat)
+            # 相邻两段首尾重合的顶点只输出一次
+            if (lng, lat) != last:
+                last = (lng, lat)
+                yield lng, lat
+
+
+def _chunks(vertices, fmt, sep):
+    batch = []
+    for lng, lat in vertices:
+        batch.append(fmt.format(lng=lng, lat=lat))
+        if len(batch) >= COORDS_PER_CHUNK:
+            yield sep.join(batch)
+            batch = []
+    if batch:
+        yield sep.join(batch)
+
+
+def _convert(lng, lat, wgs84):
+    return gcj02_to_wgs84(lng, lat) if wgs84 else (lng, lat)
+
+
+def iter_waypoints(routes, manual_routes, wgs84=True):
+    """产生 (day_key, 名称, lng, lat, 属性) 形式的景点和途经点"""
+    for day_key, day_data in routes.items():
+        for point in day_data['points']:
+            lng, lat = _convert(point['lon'], point['lat'], wgs84)
+            yield day_key, point['name'], lng, lat, {'info': point['info'], 'type': point['type']}
+    for day_key, _, start_point, end_point, waypoints in iter_legs(routes, manual_routes):
+        for i, (lat, lng) in enumerate(waypoints):
+            lng, lat = _convert(lng, lat, wgs84)
+            route_key = f"{start_point['name']}-{end_point['name']}"
+            yield day_key, f"{route_key} 途经点 {i + 1}", lng, lat, {'type': 'waypoint', 'route': route_key}
+
+
+def iter_geojson(routes, fetch, manual_routes=None, wgs84=True, leg_modes=None):
+    """流式生成 GeoJSON FeatureCollection：景点和途经点为 Point，每个路段为一条 LineString"""
+    yield '{"type":"FeatureCollection","features":['
+    first = True
+    for day_key, name, lng, lat, props in iter_waypoints(routes, manual_routes, wgs84):
+        feature = {
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [round(lng, 6), round(lat, 6)]},
+            'properties': dict(props, day=day_key, name=name),
+        }
+        yield ('' if first else ',') + json.dumps(feature, ensure_ascii=False)
+        first = False
+
+    for day_key, day_data, start_point, end_point, waypoints in iter_legs(routes, manual_routes):
+        mode = leg_mode(leg_modes, start_point, end_point)
+        properties = {
+            'day': day_key,
+            'from': start_point['name'],
+            'to': end_point['name'],
+            'color': day_data['color'],
+            'waypoints': len(waypoints),
+            'mode': mode,
+        }
+        yield (('' if first else ',') + '{"type":"Feature","properties":'
+               + json.dumps(properties, ensure_ascii=False)
+               + ',"geometry":{"type":"LineString","coordinates":[')
+        first = False
+        vertices = iter_leg_vertices(fetch, start_point, end_point, waypoints, wgs84, mode)
+        for i, chunk in enumerate(_chunks(vertices, '[{lng:.6f},{lat:.6f}]', ',')):
+            yield (',' if i else '') + chunk
+        yield ']}}'
+    yield ']}\n'
+
+
+def iter_gpx(routes, fetch, manual_routes=None, wgs84=True, title='苏州行程', leg_modes=None):
+    """流式生成 GPX 1.1：景点和途经点为 <wpt>，每天一条 <trk>，每个路段一个 <trkseg>"""
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield ('<gpx version="1.1" creator="suzhou-tour-planner" xmlns="http://www.topografix.com/GPX/1/1">\n'
+           f'<metadata><name>{escape(title)}</name></metadata>\n')
+    # GPX 规定 <wpt> 必须出现在 <trk> 之前
+    for day_key, name, lng, lat, props in iter_waypoints(routes, manual_routes, wgs84):
+        desc = f"<desc>{escape(props['info'])}</desc>" if 'info' in props else ''
+        yield (f'<wpt lat="{lat:.6f}" lon="{lng:.6f}"><name>{escape(name)}</name>{desc}'
+               f'<type>{escape(props["type"])}</type></wpt>\n')
+
+    current_day = None
+    for day_key, day_data, start_point, end_point, waypoints in iter_legs(routes, manual_routes):
+        if day_key != current_day:
+            if current_day is not None:
+                yield '</trk>\n'
+            current_day = day_key
+            yield f'<trk><name>{escape(day_data["name"])}</name><desc>{escape(day_data["description"])}</desc>\n'
+        mode = leg_mode(leg_modes, start_point, end_point)
+        yield f'<trkseg><!-- {escape(start_point["name"])} → {escape(end_point["name"])} ({mode}) -->\n'
+        vertices = iter_leg_vertices(fetch, start_point, end_point, waypoints, wgs84, mode)
+        for chunk in _chunks(vertices, '<trkpt lat="{lat:.6f}" lon="{lng:.6f}"/>', '\n'):
+            yield chunk + '\n'
+        yield '</trkseg>\n'
+    if current_day is not None:
+        yield '</trk>\n'
+    yield '</gpx>\n'
+
+
+def iter_export(fmt, routes, fetch, manual_routes=None, wgs84=True, leg_modes=None, title='苏州行程'):
+    """按格式选择生成器；title 为 GPX 的行程名称（城市包的 name 加"行程"）"""
+    if fmt == 'gpx':
+        return iter_gpx(routes, fetch, manual_routes, wgs84, title, leg_modes)
+    if fmt == 'geojson':
+        return iter_geojson(routes, fetch, manual_routes, wgs84, leg_modes)
+    raise ValueError(f"不支持的导出格式：{fmt}")
+
+
+def prefetch_legs(prefetcher, routes, manual_routes=None, leg_modes=None):
+    """导出前在后台并发请求所有路段（按各自的出行方式），顺序输出时大多已命中缓存"""
+    for _, _, start_point, end_point, waypoints in iter_legs(routes, manual_routes):
+        prefetcher.prefetch_chain(leg_chain(start_point, end_point, waypoints),
+                                  leg_mode(leg_modes, start_point, end_point))
+
+
+def main():
+    from city_packs import DEFAULT_CITY, get_registry
+    from routing_providers import build_router
+    from route_prefetch import RoutePrefetcher
+    from route_cache import build_cache
+
+    parser = argparse.ArgumentParser(description='导出行程路线为 GPX / GeoJSON')
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='gpx')
+    parser.add_argument('--out', help='输出文件（默认标准输出）')
+    parser.add_argument('--manual-routes', help='手动规划途经点的 JSON 文件')
+    parser.add_argument('--leg-modes', help='各路段出行方式的 JSON 文件（默认全部步行）')
+    parser.add_argument('--coords', choices=['wgs84', 'gcj02'], default='wgs84', help='输出坐标系')
+    parser.add_argument('--city', default=DEFAULT_CITY, help='城市包名称')
+    args = parser.parse_args()
+    registry = get_registry()
+    pack = registry.get(args.city)
+    routes = pack.routes
+
+    manual_routes = {}
+    if args.manual_routes:
+        with open(args.manual_routes, 'r', encoding='utf-8') as f:
+            manual_routes = json.load(f)
+    leg_modes = {}
+    if args.leg_modes:
+        with open(args.leg_modes, 'r', encoding='utf-8') as f:
+            leg_modes = json.load(f)
+
+    # 公交规划按路段起点所在城市的编码请求，与页面一致
+    router = build_router(os.environ.get('AMAP_API_KEY', ''), city=registry.amap_city_code)
+    prefetcher = RoutePrefetcher(router.route, build_cache())
+    prefetch_legs(prefetcher, routes, manual_routes, leg_modes)
+    chunks = iter_export(args.format, routes, prefetcher.get, manual_routes, args.coords == 'wgs84', leg_modes,
+                         title=f"{pack.name}行程")
+
+    out = open(args.out, 'w', encoding='utf-8') if args.out else sys.stdout
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.out:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Shared kinetic models with analytic Jacobians.
+
+Every model is a KineticModel: calling it evaluates the model, and model.jac
+returns the derivatives with respect to each parameter.  Both follow the
+curve_fit calling convention f(t, *params), so a fit only needs
+
+    popt, pcov = curve_fit(exp_decay, t, y, p0=[5, 0.3], method='lm', jac=exp_decay.jac)
+
+and least_squares can use model.residuals / model.residuals_jac directly.
+
+Evaluation is fully vectorized: parameters may be scalars or arrays that
+broadcast against t, e.g. params of shape (n_series, 1) with t of shape
+(n_points,) evaluates n_series curves at once.  The Jacobian then has shape
+broadcast(t, params) + (n_params,).
+
+Models (same formulas as the analysis scripts):
+    logistic_decay    PINN 与实验微生物浓度对比_0/1/2   K a e / (K + a (e - 1)), e = exp(-b t)
+    gaussian_peak     PINN与实验微生物浓度对比_3        a exp(-b (x - c)^2) + d
+    double_gaussian   PINN与实验微生物浓度对比_4        two Gaussian peaks plus a baseline
+    monod_do          溶解氧收敛验证_0/1                DO_max (1 - exp(-mu_max t / (Ks + t + 1e-6)))
+    first_order_do    溶解氧收敛验证_5/6                DO_max (1 - exp(-k t))
+    exp_decay         levenberg-marquardt             a exp(-b t)
+    exp_decay_offset  levenberg-marquardt_1           a exp(-b t) + c
+    fixed_decay       levenberg-marquardt_2/3         a exp(-0.1 t) + 2
+
+Benchmarks: python bench_kinetic_models.py
+"""
+import numpy as np
+
+# Keeps the Monod denominator away from zero at t = 0 (as in the original scripts)
+MONOD_EPS = 1e-6
+
+
+class KineticModel:
+    """
+    A model function f(t, *params) together with its analytic Jacobian.
+
+    jac_terms(t, *params) returns one array (or scalar, for constant
+    derivatives) per parameter; jac() broadcasts them into one array with
+    the parameters along the last axis.
+    """
+
+    def __init__(self, name, func, jac_terms, param_names, p0=None):
+        self.name = name
+        self.func = func
+        self.jac_terms = jac_terms
+        self.param_names = tuple(param_names)
+        self.p0 = None if p0 is None else np.asarray(p0, dtype=float)
+        self.__name__ = name
+        self.__doc__ = func.__doc__
+
+    @property
+    def n_params(self):
+        return len(self.param_names)
+
+    def __call__(self, t, *params):
+        return self.func(np.asarray(t, dtype=float), *params)
+
+    def jac(self, t, *params):
+        """d f / d params, shape broadcast(t, params) + (n_params,)"""
+        t = np.asarray(t, dtype=float)
+        if all(np.ndim(p) == 0 for p in params):
+            shape = t.shape
+        else:
+            shape = np.broadcast_shapes(t.shape, *(np.shape(p) for p in params))
+        out = np.empty(shape + (len(self.param_names),))
+        for i, term in enumerate(self.jac_terms(t, *params)):
+            out[..., i] = term
+        return out
+
+    def residuals(self, params, t, y):
+        """Residuals in the least_squares convention fun(params, *args)"""
+        return self(t, *params) - y
+
+    def residuals_jac(self, params, t, y):
+        return self.jac(t, *params)
+
+    def __repr__(self):
+        return f"KineticModel({self.name}: {', '.join(self.param_names)})"
+
+
+def _logistic_decay(t, alpha, beta, carrying_capacity):
+    """Microbial growth model used by the PINN comparison scripts"""
+    e = np.exp(-beta * t)
+    return (carrying_capacity * alpha * e) / (carrying_capacity + alpha * (e - 1))
+
+
+def _logistic_decay_jac(t, alpha, beta, carrying_capacity):
+    # Scalar factors are grouped so that each term costs as few array operations as possible
+    e = np.exp(-beta * t)
+    denom = alpha * e + (carrying_capacity - alpha)
+    q = e / (denom * denom)
+    d_alpha = (carrying_capacity * carrying_capacity) * q
+    d_beta = (-carrying_capacity * alpha * (carrying_capacity - alpha)) * (t * q)
+    d_capacity = (alpha * alpha) * (e * q - q)
+    return d_alpha, d_beta, d_capacity
+
+
+def _gaussian_peak(x, alpha, beta, gamma, delta):
+    """Single Gaussian-like peak on a constant baseline"""
+    return alpha * np.exp(-beta * (x - gamma) ** 2) + delta
+
+
+def _gaussian_peak_jac(x, alpha, beta, gamma, delta):
+    u = x - gamma
+    u2 = u * u
+    g = np.exp(-beta * u2)
+    ug = u * g
+    return g, -alpha * (u2 * g), (2 * alpha * beta) * ug, 1.0
+
+
+def _double_gaussian(x, alpha1, beta1, gamma1, alpha2, beta2, gamma2, delta):
+    """Two Gaussian peaks on a constant baseline"""
+    peak1 = alpha1 * np.exp(-beta1 * (x - gamma1) ** 2)
+    peak2 = alpha2 * np.exp(-beta2 * (x - gamma2) ** 2)
+    return peak1 + peak2 + delta
+
+
+def _double_gaussian_jac(x, alpha1, beta1, gamma1, alpha2, beta2, gamma2, delta):
+    peak1 = _gaussian_peak_jac(x, alpha1, beta1, gamma1, 0.0)[:3]
+    peak2 = _gaussian_peak_jac(x, alpha2, beta2, gamma2, 0.0)[:3]
+    return peak1 + peak2 + (1.0,)
+
+
+def _monod_do(t, DO_max, Ks, mu_max):
+    """Monod-like dissolved oxygen curve"""
+    return DO_max * (1 - np.exp(-mu_max * t / (Ks + t + MONOD_EPS)))
+
+
+def _monod_do_jac(t, DO_max, Ks, mu_max):
+    denom = t + (Ks + MONOD_EPS)
+    ratio = t / denom
+    h = np.exp(-mu_max * ratio)
+    h_ratio = h * ratio
+    return 1 - h, (-DO_max * mu_max) * (h_ratio / denom), DO_max * h_ratio
+
+
+def _first_order_do(t, DO_max, k):
+    """First-order approach to saturation, DO_max (1 - exp(-k t))"""
+    return DO_max * (1.0 - np.exp(-k * t))
+
+
+def _first_order_do_jac(t, DO_max, k):
+    e = np.exp(-k * t)
+    return 1.0 - e, DO_max * (t * e)
+
+
+def _exp_decay(t, alpha, beta):
+    """Exponential decay a exp(-b t)"""
+    return alpha * np.exp(-beta * t)
+
+
+def _exp_decay_jac(t, alpha, beta):
+    e = np.exp(-beta * t)
+    return e, -alpha * (t * e)
+
+
+def _exp_decay_offset(t, alpha, beta, gamma):
+    """Exponential decay with a constant offset"""
+    return alpha * np.exp(-beta * t) + gamma
+
+
+def _exp_decay_offset_jac(t, alpha, beta, gamma):
+    e = np.exp(-beta * t)
+    return e, -alpha * (t * e), 1.0
+
+
+def _fixed_decay(t, alpha):
+    """Exponential decay with the rate and offset fixed (rate 0.1, offset 2)"""
+    return alpha * np.exp(-0.1 * t) + 2
+
+
+def _fixed_decay_jac(t, alpha):
+    return (np.exp(-0.1 * t),)
+
+
+logistic_decay = KineticModel('logistic_decay', _logistic_decay, _logistic_decay_jac,
+                              ['alpha', 'beta', 'carrying_capacity'], p0=[9, 0.18, 48])
+gaussian_peak = KineticModel('gaussian_peak', _gaussian_peak, _gaussian_peak_jac,
+                             ['alpha', 'beta', 'gamma', 'delta'], p0=[9, 0.6, 5, 0.3])
+double_gaussian = KineticModel('double_gaussian', _double_gaussian, _double_gaussian_jac,
+                               ['alpha1', 'beta1', 'gamma1', 'alpha2', 'beta2', 'gamma2', 'delta'],
+                               p0=[7, 0.7, 5, 2.5, 0.9, 2, 0.3])
+monod_do = KineticModel('monod_do', _monod_do, _monod_do_jac, ['DO_max', 'Ks', 'mu_max'], p0=[8.0, 5.0, 0.2])
+first_order_do = KineticModel('first_order_do', _first_order_do, _first_order_do_jac, ['DO_max', 'k'],
+                              p0=[8.0, 0.1])
+exp_decay = KineticModel('exp_decay', _exp_decay, _exp_decay_jac, ['alpha', 'beta'], p0=[1.0, 1.0])
+exp_decay_offset = KineticModel('exp_decay_offset', _exp_decay_offset, _exp_decay_offset_jac,
+                                ['alpha', 'beta', 'gamma'], p0=[5, 0.3, 0.1])
+fixed_decay = KineticModel('fixed_decay', _fixed_decay, _fixed_decay_jac, ['alpha'], p0=[5])
+
+MODELS = {model.name: model for model in (
+    logistic_decay, gaussian_peak, double_gaussian, monod_do, first_order_do,
+    exp_decay, exp_decay_offset, fixed_decay,
+)}
+
+
+def get_model(name):
+    """Look up a model by name (see MODELS)"""
+    try:
+        return MODELS[name]
+    except KeyError:
+        raise ValueError(f"Unknown model '{name}', expected one of: {', '.join(MODELS)}") from None
+
+
+def model_reference(model):
+    """
+    What to send a worker process for model: the name of a library model
+    (see MODELS), otherwise the model itself, which must then be picklable.
+    resolve_model() turns it back into the model.
+    """
+    return model.name if MODELS.get(getattr(model, 'name', None)) is model else model
+
+
+def resolve_model(reference):
+    """The model for a model_reference() (or a model name)"""
+    return get_model(reference) if isinstance(reference, str) else reference
+
+
+def check_jacobian(model, t, params, step=1e-6):
+    """
+    Largest relative difference between model.jac and central finite
+    differences at params; used by the benchmark as a sanity check.
+    """
+    params = np.asarray(params, dtype=float)
+    analytic = model.jac(t, *params)
+    numeric = np.empty_like(analytic)
+    for i in range(len(params)):
+        h = step * max(1.0, abs(params[i]))
+        up, down = params.copy(), params.copy()
+        up[i] += h
+        down[i] -= h
+        numeric[..., i] = (model(t, *up) - model(t, *down)) / (2 * h)
+    scale = np.maximum(np.abs(numeric).max(), 1e-12)
+    return float(np.abs(analytic - numeric).max() / scale)
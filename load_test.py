@@ -0,0 +1,251 @@
+"""
+多会话压测：模拟 N 个并发用户操作 suzhou_tour_map.py，评估单进程可承载的会话数
+
+用法：
+    python load_test.py --sessions 1,5,10,20 --iterations 3 --latency-ms 120
+    python load_test.py --sessions 10 --json load_report.json
+
+每个会话在独立线程中通过 Streamlit AppTest 执行页面脚本，与 `streamlit run`
+一样在同一进程内并发 rerun（共享 GIL 和 st.cache_resource 中的路线缓存）。
+路线请求发往本地高德替身服务（amap_stub_server.py），不消耗真实 API 配额。
+
+模拟的用户操作：
+    打开页面 → 勾选"启用手动路线规划" → 对随机路段"开始规划" →
+    逐个添加途经点 → 删除一个途经点 → "完成规划" → "重新规划所有路线"
+
+地图点击来自 st_folium 自定义组件，AppTest 无法直接触发，且按钮回调中的
+st.rerun() 在 AppTest 下会重复触发；因此点击和按钮的效果直接写入
+session_state 后再执行一次 rerun，测得的是与真实操作相同的 rerun 开销。
+
+输出：吞吐量（rerun/秒）、rerun 耗时 p50/p95/p99、进程 CPU 时间和
+每会话平均 CPU、每会话增加的常驻内存。
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import threading
+import time
+
+from tracing import percentile
+
+APP_FILE = 'suzhou_tour_map.py'
+
+
+def current_rss_mb():
+    """当前进程常驻内存（MB）"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        # 非 Linux 平台退化为峰值内存（macOS 单位为字节，Linux 为 KB）
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage / 2 ** 20 if usage > 2 ** 32 else usage / 1024
+
+
+def pin_shared_runtime():
+    """AppTest 每次 run 结束都会把全局 Runtime 置空，并发会话下其他会话的脚本线程
+    会因此拿不到 Runtime 而卡死；这里固定一个所有会话共享的 Runtime 替身"""
+    from unittest.mock import MagicMock
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.runtime import Runtime
+
+    shared = MagicMock(spec=Runtime)
+    shared.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    shared.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: shared)
+    Runtime.exists = classmethod(lambda cls: True)
+
+
+def route_legs():
+    """列出所有路段：(route_key, 起点, 终点)"""
+    from suzhou_tour_map import ROUTES
+    legs = []
+    for day_data in ROUTES.values():
+        points = day_data['points']
+        for i in range(len(points) - 1):
+            legs.append((f"{points[i]['name']}-{points[i + 1]['name']}", points[i], points[i + 1]))
+    return legs
+
+
+class Session:
+    """单个模拟用户"""
+
+    def __init__(self, session_id, args, legs):
+        from streamlit.testing.v1 import AppTest
+
+        self.rng = random.Random(args.seed + session_id)
+        self.args = args
+        self.legs = legs
+        self.at = AppTest.from_file(APP_FILE, default_timeout=args.timeout)
+        self.latencies = []
+        self.errors = 0
+
+    def rerun(self, action):
+        started = time.perf_counter()
+        self.at.run()
+        self.latencies.append((action, time.perf_counter() - started))
+        if self.at.exception:
+            self.errors += 1
+        if self.args.think_ms > 0:
+            time.sleep(self.rng.expovariate(1000.0 / self.args.think_ms))
+
+    def random_waypoint(self, start_point, end_point):
+        t = self.rng.random()
+        return [
+            start_point['lat'] + (end_point['lat'] - start_point['lat']) * t + self.rng.uniform(-0.003, 0.003),
+            start_point['lon'] + (end_point['lon'] - start_point['lon']) * t + self.rng.uniform(-0.003, 0.003),
+        ]
+
+    def open_page(self):
+        self.rerun('open')
+        self.at.checkbox(key='enable_manual').check()
+        self.rerun('enable_manual')
+
+    def plan_leg(self):
+        state = self.at.session_state
+        route_key, start_point, end_point = self.rng.choice(self.legs)
+
+        # 开始规划
+        state.current_route = route_key
+        state.planning_mode = True
+        waypoints = state.waypoints
+        waypoints.setdefault(route_key, [])
+        state.waypoints = waypoints
+        self.rerun('start_plan')
+
+        # 添加途经点
+        for _ in range(self.args.waypoints):
+            waypoints = state.waypoints
+            waypoints[route_key].append(self.random_waypoint(start_point, end_point))
+            state.waypoints = waypoints
+            self.rerun('add_waypoint')
+
+        # 删除一个途经点
+        waypoints = state.waypoints
+        if waypoints[route_key]:
+            waypoints[route_key].pop(self.rng.randrange(len(waypoints[route_key])))
+            state.waypoints = waypoints
+            self.rerun('remove_waypoint')
+
+        # 完成规划
+        manual_routes = state.manual_routes
+        manual_routes[route_key] = state.waypoints[route_key]
+        state.manual_routes = manual_routes
+        state.current_route = None
+        state.planning_mode = False
+        self.rerun('save_plan')
+
+    def replan_all(self):
+        state = self.at.session_state
+        state.manual_routes = {}
+        state.current_route = None
+        state.waypoints = {}
+        state.planning_mode = False
+        self.rerun('replan_all')
+
+    def run(self, start_barrier):
+        start_barrier.wait()
+        for _ in range(self.args.iterations):
+            self.plan_leg()
+            self.replan_all()
+
+
+def run_level(n_sessions, args, legs):
+    """以 n_sessions 个并发会话运行一轮压测，返回统计结果"""
+    rss_before = current_rss_mb()
+    sessions = [Session(i, args, legs) for i in range(n_sessions)]
+
+    # 先串行打开页面，使会话状态常驻内存后再统计内存增量
+    for session in sessions:
+        session.open_page()
+    rss_loaded = current_rss_mb()
+
+    barrier = threading.Barrier(n_sessions + 1)
+    threads = [threading.Thread(target=s.run, args=(barrier,), daemon=True) for s in sessions]
+    for thread in threads:
+        thread.start()
+    cpu_start = time.process_time()
+    barrier.wait()
+    wall_start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    latencies = [lat for s in sessions for action, lat in s.latencies if action not in ('open', 'enable_manual')]
+    by_action = {}
+    for s in sessions:
+        for action, lat in s.latencies:
+            by_action.setdefault(action, []).append(lat)
+
+    return {
+        'sessions': n_sessions,
+        'reruns': len(latencies),
+        'errors': sum(s.errors for s in sessions),
+        'wall_s': wall,
+        'throughput_rps': len(latencies) / wall if wall > 0 else float('nan'),
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'cpu_s': cpu,
+        'cpu_per_session_s': cpu / n_sessions,
+        'cpu_utilization': cpu / wall if wall > 0 else float('nan'),
+        'rss_mb': current_rss_mb(),
+        'rss_per_session_mb': max(rss_loaded - rss_before, 0.0) / n_sessions,
+        'by_action_p50_ms': {k: statistics.median(v) * 1000 for k, v in by_action.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='suzhou_tour_map.py 多会话压测')
+    parser.add_argument('--sessions', default='1,5,10', help='并发会话数，多个值用逗号分隔，依次压测')
+    parser.add_argument('--iterations', type=int, default=3, help='每个会话重复规划的次数')
+    parser.add_argument('--waypoints', type=int, default=3, help='每次规划添加的途经点数')
+    parser.add_argument('--think-ms', type=float, default=0.0, help='两次操作之间的平均思考时间（毫秒）')
+    parser.add_argument('--latency-ms', type=float, default=80.0, help='高德替身服务的延迟中位数（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0.5, help='替身服务延迟的对数正态标准差')
+    parser.add_argument('--amap-host', help='使用已运行的替身服务，不在进程内启动')
+    parser.add_argument('--timeout', type=float, default=120.0, help='单次 rerun 超时（秒）')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='将结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    if args.amap_host:
+        os.environ['AMAP_REST_HOST'] = args.amap_host
+    else:
+        from amap_stub_server import start_stub_server
+        _, host = start_stub_server(latency_ms=args.latency_ms, jitter=args.jitter)
+        os.environ['AMAP_REST_HOST'] = host
+    os.environ.setdefault('AMAP_API_KEY', 'load-test')
+    os.environ['ROUTING_PROVIDERS'] = 'amap'
+
+    pin_shared_runtime()
+    # 压测线程在脚本上下文之外读写 session_state，屏蔽由此产生的大量告警
+    logging.getLogger('streamlit.runtime.scriptrunner.script_run_context').addFilter(
+        lambda record: 'missing ScriptRunContext' not in record.getMessage()
+    )
+    legs = route_legs()
+    reports = []
+    print(f"{'会话':>4} {'rerun':>6} {'错误':>4} {'吞吐(/s)':>9} {'p50(ms)':>8} {'p95(ms)':>8} {'p99(ms)':>8} "
+          f"{'CPU/会话(s)':>11} {'CPU占用':>7} {'内存/会话(MB)':>13}")
+    for n in [int(x) for x in args.sessions.split(',') if x.strip()]:
+        report = run_level(n, args, legs)
+        reports.append(report)
+        print(f"{report['sessions']:>4} {report['reruns']:>6} {report['errors']:>4} {report['throughput_rps']:>9.2f} "
+              f"{report['p50_ms']:>8.1f} {report['p95_ms']:>8.1f} {report['p99_ms']:>8.1f} "
+              f"{report['cpu_per_session_s']:>11.2f} {report['cpu_utilization']:>7.0%} {report['rss_per_session_mb']:>13.2f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,496 @@
+"""
+本地步行路网：最短路径树与步行等时圈
+
+路网文件（默认 walk_graph.json，可用环境变量 WALK_GRAPH_FILE 指定）格式：
+    {"nodes": [[lng, lat], ...], "edges": [[u, v, 长度(米)], ...]}
+坐标为高德坐标（GCJ-02），边按双向步行处理。
+
+扩展名为 .bin 的路网文件为二进制格式（邻接表按 CSR 存放，附带网格空间索引），
+读取时内存映射，不解析、不复制，只有实际访问到的部分才会调入内存，
+多个进程打开同一文件时共用操作系统的页缓存。
+
+生成路网：在城市包（见 city_packs.py）的景点目录（酒店、景点、附近推荐）两两之间请求步行路线，
+把返回的折线合并成路网，默认写入城市包目录：
+    AMAP_API_KEY=... python local_graph.py build --city suzhou
+    python local_graph.py pack walk_graph.json --out walk_graph.bin    # JSON 路网转为二进制格式
+"""
+import argparse
+import bisect
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from routing_providers import haversine, parse_coord, WALKING_SPEED
+
+DEFAULT_GRAPH_FILE = 'walk_graph.json'
+
+# 二进制路网文件头：魔数、节点数、邻接表长度（边数的两倍）、网格数、网格边长（度）
+BINARY_MAGIC = b'WGRAPH01'
+BINARY_HEADER = struct.Struct('<8sqqqd')
+
+# 米/度（苏州纬度附近的近似值，用于局部平面投影）
+METERS_PER_DEG_LAT = 110540.0
+METERS_PER_DEG_LNG_EQUATOR = 111320.0
+
+
+class WalkGraph:
+    """步行路网（邻接表），边权为步行时间（秒）"""
+
+    def __init__(self, nodes, edges, speed=WALKING_SPEED, index_cell_deg=0.002):
+        self.nodes = [tuple(node) for node in nodes]
+        self.speed = speed
+        self.adjacency = [[] for _ in self.nodes]
+        for u, v, length in edges:
+            seconds = length / speed
+            self.adjacency[u].append((v, seconds))
+            self.adjacency[v].append((u, seconds))
+
+        # 网格空间索引，用于查找最近节点
+        self._index_cell = index_cell_deg
+        self._index = {}
+        for i, (lng, lat) in enumerate(self.nodes):
+            self._index.setdefault(self._cell(lng, lat), []).append(i)
+
+        self._isochrone_cache = {}
+        self._cache_lock = threading.Lock()
+        self.source_path = None
+        self._fingerprint = None
+
+    def fingerprint(self):
+        """路网内容的摘要，用作跨副本缓存的键：读自文件时为文件内容的 SHA-256，否则由节点和边计算
+
+        重新生成路网（即使节点数不变）或修改边长后摘要随之改变，旧的缓存结果不再命中
+        """
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            if self.source_path is not None:
+                with open(self.source_path, 'rb') as f:
+                    for block in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(block)
+            else:
+                digest.update(json.dumps([self.speed, self.nodes, self.adjacency]).encode('utf-8'))
+            self._fingerprint = digest.hexdigest()[:24]
+        return self._fingerprint
+
+    def _cell(self, lng, lat):
+        return int(math.floor(lng / self._index_cell)), int(math.floor(lat / self._index_cell))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def nearest_node(self, lng, lat, max_rings=25):
+        """查找离给定坐标最近的节点，返回 (节点编号, 距离米)；附近没有节点时返回 (None, inf)"""
+        cx, cy = self._cell(lng, lat)
+        best, best_dist, found_ring = None, float('inf'), None
+        for ring in range(max_rings + 1):
+            for dx in range(-ring, ring + 1):
+                for dy in range(-ring, ring + 1):
+                    if max(abs(dx), abs(dy)) != ring:
+                        continue
+                    for i in self._index.get((cx + dx, cy + dy), ()):
+                        d = haversine(lng, lat, *self.nodes[i])
+                        if d < best_dist:
+                            best, best_dist = i, d
+            if best is not None and found_ring is None:
+                found_ring = ring
+            # 找到候选后再多搜一圈，保证不会漏掉相邻网格中更近的节点
+            if found_ring is not None and ring > found_ring:
+                break
+        return best, best_dist
+
+    def shortest_path_tree(self, sources, max_seconds=float('inf')):
+        """多源 Dijkstra：sources 为 {节点: 初始耗时}，返回 (耗时字典, 前驱字典)，超过 max_seconds 的节点不展开"""
+        dist = {}
+        parent = {}
+        heap = [(cost, node, None) for node, cost in sources.items()]
+        heapq.heapify(heap)
+        while heap:
+            cost, node, prev = heapq.heappop(heap)
+            if node in dist:
+                continue
+            dist[node] = cost
+            parent[node] = prev
+            for nbr, seconds in self.adjacency[node]:
+                new_cost = cost + seconds
+                if nbr not in dist and new_cost <= max_seconds:
+                    heapq.heappush(heap, (new_cost, nbr, node))
+        return dist, parent
+
+    def isochrone(self, lng, lat, budget_minutes, cell_m=40.0, offroad_m=120.0):
+        """单个时间预算的步行等时圈（GeoJSON MultiPolygon 几何）"""
+        return self.isochrones(lng, lat, [budget_minutes], cell_m, offroad_m)[budget_minutes]
+
+    def isochrones(self, lng, lat, budgets_minutes, cell_m=40.0, offroad_m=120.0):
+        """多个时间预算的步行等时圈，返回 {预算分钟: GeoJSON 几何}；结果按 (起点, 时间预算) 缓存，
+        缺失的预算共用一次最短路径树计算"""
+        origin = (round(lng, 6), round(lat, 6), cell_m, offroad_m)
+        with self._cache_lock:
+            results = {b: self._isochrone_cache[origin + (b,)]
+                       for b in budgets_minutes if origin + (b,) in self._isochrone_cache}
+        missing = [b for b in budgets_minutes if b not in results]
+        if missing:
+            computed = self._compute_isochrones(lng, lat, missing, cell_m, offroad_m)
+            with self._cache_lock:
+                for budget, geometry in computed.items():
+                    self._isochrone_cache[origin + (budget,)] = geometry
+            results.update(computed)
+        return results
+
+    def _compute_isochrones(self, lng, lat, budgets_minutes, cell_m, offroad_m):
+        max_seconds = max(budgets_minutes) * 60.0
+        node, access_m = self.nearest_node(lng, lat)
+        dist = {}
+        if node is not None:
+            dist, _ = self.shortest_path_tree({node: access_m / self.speed}, max_seconds)
+
+        projection = LocalProjection(lng, lat)
+        results = {}
+        for budget in budgets_minutes:
+            budget_seconds = budget * 60.0
+            cells = set()
+            # 起点本身可离开路网步行
+            rasterize_disk(cells, 0.0, 0.0, min(budget_seconds * self.speed, offroad_m), cell_m)
+            for u, cost in dist.items():
+                if cost > budget_seconds:
+                    continue
+                for v, seconds in self.adjacency[u]:
+                    # 沿边按网格间距采样，剩余时间内可离开路网步行 offroad_m 以内
+                    reach = min(1.0, (budget_seconds - cost) / seconds) if seconds > 0 else 1.0
+                    steps = max(1, int(seconds * self.speed * reach / cell_m))
+                    ux, uy = projection.forward(*self.nodes[u])
+                    vx, vy = projection.forward(*self.nodes[v])
+                    for k in range(steps + 1):
+                        t = reach * k / steps
+                        remaining = budget_seconds - cost - seconds * t
+                        radius = min(remaining * self.speed, offroad_m)
+                        rasterize_disk(cells, ux + (vx - ux) * t, uy + (vy - uy) * t, radius, cell_m)
+            results[budget] = cells_to_multipolygon(cells, cell_m, projection)
+        return results
+
+
+class _NodeView:
+    """内存映射的节点坐标，按下标返回 (lng, lat)"""
+
+    def __init__(self, lngs, lats):
+        self.lngs = lngs
+        self.lats = lats
+
+    def __len__(self):
+        return len(self.lngs)
+
+    def __getitem__(self, i):
+        return self.lngs[i], self.lats[i]
+
+
+class _AdjacencyView:
+    """内存映射的 CSR 邻接表，按节点返回 [(相邻节点, 步行秒数), ...]"""
+
+    def __init__(self, offsets, targets, lengths, speed):
+        self.offsets = offsets
+        self.targets = targets
+        self.lengths = lengths
+        self.speed = speed
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, u):
+        start, end = self.offsets[u], self.offsets[u + 1]
+        return [(v, length / self.speed) for v, length in zip(self.targets[start:end], self.lengths[start:end])]
+
+
+class _CellIndex:
+    """内存映射的网格空间索引：网格键有序存放，按键二分查找"""
+
+    def __init__(self, keys, offsets, nodes):
+        self.keys = keys
+        self.offsets = offsets
+        self.nodes = nodes
+
+    def get(self, cell, default=()):
+        key = cell_key(*cell)
+        i = bisect.bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return default
+        return self.nodes[self.offsets[i]:self.offsets[i + 1]]
+
+
+def cell_key(cx, cy):
+    """网格坐标编码为一个整数，按 (cx, cy) 的顺序排序"""
+    return (cx << 32) + (cy & 0xFFFFFFFF)
+
+
+class MappedWalkGraph(WalkGraph):
+    """内存映射的二进制路网，接口与 WalkGraph 相同"""
+
+    def __init__(self, path, speed=WALKING_SPEED):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n_nodes, n_adjacent, n_cells, cell_deg = BINARY_HEADER.unpack_from(self._mmap, 0)
+        if magic != BINARY_MAGIC:
+            raise ValueError(f"不是二进制路网文件：{path}")
+
+        view = memoryview(self._mmap)
+        offset = BINARY_HEADER.size
+
+        def take(typecode, count):
+            nonlocal offset
+            size = array(typecode).itemsize * count
+            part = view[offset:offset + size].cast(typecode)
+            offset += size
+            return part
+
+        # 8 字节的数组在前，4 字节的数组在后，各数组保持对齐
+        lngs = take('d', n_nodes)
+        lats = take('d', n_nodes)
+        adjacency_offsets = take('q', n_nodes + 1)
+        lengths = take('d', n_adjacent)
+        cell_keys = take('q', n_cells)
+        cell_offsets = take('q', n_cells + 1)
+        targets = take('i', n_adjacent)
+        cell_nodes = take('i', n_nodes)
+
+        self.nodes = _NodeView(lngs, lats)
+        self.speed = speed
+        self.adjacency = _AdjacencyView(adjacency_offsets, targets, lengths, speed)
+        self._index_cell = cell_deg
+        self._index = _CellIndex(cell_keys, cell_offsets, cell_nodes)
+        self._isochrone_cache = {}
+        self._cache_lock = threading.Lock()
+        self.source_path = path
+        self._fingerprint = None
+
+
+def write_binary_graph(data, path, index_cell_deg=0.002):
+    """把 {"nodes", "edges"} 格式的路网写成二进制文件（先写临时文件再替换，正在读取的进程不受影响）"""
+    nodes = data['nodes']
+    n_nodes = len(nodes)
+    degree = [0] * n_nodes
+    for u, v, _ in data['edges']:
+        degree[u] += 1
+        degree[v] += 1
+    adjacency_offsets = array('q', [0] * (n_nodes + 1))
+    for i in range(n_nodes):
+        adjacency_offsets[i + 1] = adjacency_offsets[i] + degree[i]
+    targets = array('i', [0] * adjacency_offsets[-1])
+    lengths = array('d', [0.0] * adjacency_offsets[-1])
+    cursor = list(adjacency_offsets[:-1])
+    for u, v, length in data['edges']:
+        for a, b in ((u, v), (v, u)):
+            targets[cursor[a]] = b
+            lengths[cursor[a]] = length
+            cursor[a] += 1
+
+    cells = {}
+    for i, (lng, lat) in enumerate(nodes):
+        cell = (int(math.floor(lng / index_cell_deg)), int(math.floor(lat / index_cell_deg)))
+        cells.setdefault(cell_key(*cell), []).append(i)
+    cell_keys = array('q', sorted(cells))
+    cell_offsets = array('q', [0])
+    cell_nodes = array('i')
+    for key in cell_keys:
+        cell_nodes.extend(cells[key])
+        cell_offsets.append(len(cell_nodes))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(BINARY_HEADER.pack(BINARY_MAGIC, n_nodes, len(targets), len(cell_keys), index_cell_deg))
+        f.write(array('d', (lng for lng, _ in nodes)).tobytes())
+        f.write(array('d', (lat for _, lat in nodes)).tobytes())
+        for part in (adjacency_offsets, lengths, cell_keys, cell_offsets, targets, cell_nodes):
+            f.write(part.tobytes())
+    os.replace(tmp_path, path)
+
+
+def save_graph(data, path):
+    """按扩展名写入 JSON 或二进制路网文件"""
+    if path.endswith('.bin'):
+        write_binary_graph(data, path)
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+
+class LocalProjection:
+    """以给定点为原点的局部平面投影（米），小范围内误差可忽略"""
+
+    def __init__(self, lng0, lat0):
+        self.lng0 = lng0
+        self.lat0 = lat0
+        self.kx = METERS_PER_DEG_LNG_EQUATOR * math.cos(math.radians(lat0))
+        self.ky = METERS_PER_DEG_LAT
+
+    def forward(self, lng, lat):
+        return (lng - self.lng0) * self.kx, (lat - self.lat0) * self.ky
+
+    def inverse(self, x, y):
+        return self.lng0 + x / self.kx, self.lat0 + y / self.ky
+
+
+def rasterize_disk(cells, x, y, radius, cell_m):
+    """把圆形区域覆盖的网格单元（按单元中心判断）加入 cells"""
+    if radius <= 0:
+        cells.add((int(math.floor(x / cell_m)), int(math.floor(y / cell_m))))
+        return
+    r2 = radius * radius
+    for i in range(int(math.floor((x - radius) / cell_m)), int(math.floor((x + radius) / cell_m)) + 1):
+        cx = (i + 0.5) * cell_m - x
+        for j in range(int(math.floor((y - radius) / cell_m)), int(math.floor((y + radius) / cell_m)) + 1):
+            cy = (j + 0.5) * cell_m - y
+            if cx * cx + cy * cy <= r2:
+                cells.add((i, j))
+    cells.add((int(math.floor(x / cell_m)), int(math.floor(y / cell_m))))
+
+
+def cells_to_multipolygon(cells, cell_m, projection):
+    """把网格单元合并为矩形并输出 GeoJSON MultiPolygon（同一行连续单元合并，再与上下行相同区间合并）"""
+    rows = {}
+    for i, j in cells:
+        rows.setdefault(j, []).append(i)
+
+    rectangles = []
+    open_runs = {}
+    for j in sorted(rows):
+        columns = sorted(rows[j])
+        runs = []
+        start = prev = columns[0]
+        for i in columns[1:]:
+            if i != prev + 1:
+                runs.append((start, prev))
+                start = i
+            prev = i
+        runs.append((start, prev))
+
+        next_open = {}
+        for run in runs:
+            # 与上一行相同区间的矩形向上延伸
+            if run in open_runs and open_runs[run][1] == j - 1:
+                next_open[run] = (open_runs.pop(run)[0], j)
+            else:
+                next_open[run] = (j, j)
+        for run, (j0, j1) in open_runs.items():
+            rectangles.append((run, j0, j1))
+        open_runs = next_open
+    for run, (j0, j1) in open_runs.items():
+        rectangles.append((run, j0, j1))
+
+    polygons = []
+    for (i0, i1), j0, j1 in rectangles:
+        x0, x1 = i0 * cell_m, (i1 + 1) * cell_m
+        y0, y1 = j0 * cell_m, (j1 + 1) * cell_m
+        ring = [projection.inverse(x, y) for x, y in ((x0, y0), (x1, y0), (x1, y1), (x0, y1), (x0, y0))]
+        polygons.append([[list(point) for point in ring]])
+    return {'type': 'MultiPolygon', 'coordinates': polygons}
+
+
+def load_graph(path=None):
+    """读取路网文件（.bin 为内存映射的二进制格式），文件不存在时返回 None"""
+    path = path or os.environ.get('WALK_GRAPH_FILE', DEFAULT_GRAPH_FILE)
+    try:
+        if path.endswith('.bin'):
+            return MappedWalkGraph(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    graph = WalkGraph(data['nodes'], data['edges'])
+    graph.source_path = path
+    return graph
+
+
+def graph_from_route_results(results, precision=5):
+    """把多条高德格式路线的折线合并为路网，坐标按 precision 位小数对齐以合并重合的节点"""
+    node_ids = {}
+    nodes = []
+    edges = {}
+    for result in results:
+        try:
+            steps = result['route']['paths'][0]['steps']
+        except (KeyError, IndexError, TypeError):
+            continue
+        prev = None
+        for step in steps:
+            for coord in step.get('polyline', '').split(';'):
+                if not coord:
+                    continue
+                lng, lat = parse_coord(coord)
+                key = (round(lng, precision), round(lat, precision))
+                if key not in node_ids:
+                    node_ids[key] = len(nodes)
+                    nodes.append([key[0], key[1]])
+                node = node_ids[key]
+                if prev is not None and prev != node:
+                    edge = (min(prev, node), max(prev, node))
+                    if edge not in edges:
+                        edges[edge] = haversine(*nodes[prev], *nodes[node])
+                prev = node
+    return {
+        'nodes': nodes,
+        'edges': [[u, v, round(length, 2)] for (u, v), length in edges.items()],
+    }
+
+
+def catalog_points(routes):
+    """景点目录中的所有地点（去重）：酒店、景点和附近推荐"""
+    points = {}
+    for day_data in routes.values():
+        for point in day_data['points']:
+            points[point['name']] = (point['lon'], point['lat'])
+            for places in point.get('nearby_places', {}).values():
+                for place in places:
+                    points[place['name']] = (place['lon'], place['lat'])
+    return points
+
+
+def build_graph_file(city, out=None, max_workers=8):
+    """在城市包的景点两两之间请求步行路线，合并为路网文件（默认写入城市包目录下的 walk_graph.bin）"""
+    from city_packs import get_registry
+    from routing_providers import build_router
+    from suzhou_tour_map import get_api_key
+
+    pack = get_registry().get(city)
+    out = out or os.path.join(pack.path, 'walk_graph.bin')
+    router = build_router(get_api_key())
+    points = list(catalog_points(pack.routes).values())
+    pairs = [(a, b) for i, a in enumerate(points) for b in points[i + 1:]]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(
+            lambda pair: router.route(f"{pair[0][0]},{pair[0][1]}", f"{pair[1][0]},{pair[1][1]}"),
+            pairs
+        ))
+    # 直线兜底的结果不是真实路网，不参与构建
+    results = [r for r in results if r is not None and r.get('provider') != 'local']
+    graph = graph_from_route_results(results)
+    save_graph(graph, out)
+    print(f"已写入 {out}：{len(graph['nodes'])} 个节点，{len(graph['edges'])} 条边（{len(results)}/{len(pairs)} 条路线）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地步行路网工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help='由景点间的步行路线生成路网文件')
+    build.add_argument('--city', default='suzhou', help='城市包名称（city_packs 下的目录名）')
+    build.add_argument('--out', help='输出文件，扩展名 .bin 为二进制格式（默认城市包目录下的 walk_graph.bin）')
+    pack = subparsers.add_parser('pack', help='JSON 路网转为内存映射的二进制格式')
+    pack.add_argument('source', help='JSON 路网文件')
+    pack.add_argument('--out', required=True, help='输出的 .bin 文件')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_graph_file(args.city, args.out)
+    elif args.command == 'pack':
+        with open(args.source, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        write_binary_graph(data, args.out)
+        print(f"已写入 {args.out}：{len(data['nodes'])} 个节点，{len(data['edges'])} 条边")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+Mean-absolute-percentage-error fitting of kinetic models.
+
+The PINN comparison scripts minimize
+
+    MAPE = mean |(y - f) / y| * 100
+
+with Nelder-Mead or finite-difference L-BFGS-B.  The objective is not smooth
+(|r| has a kink at every data point) and the relative residuals blow up for
+measurements near zero, so those calls need hundreds to thousands of model
+evaluations.  fit_mape() instead minimizes the pseudo-Huber surrogate
+
+    S_mu = sum w_i (sqrt(r_i^2 + mu^2) - mu),   w_i = 1 / d_i
+
+by iteratively reweighted least squares: each iteration solves the weighted
+normal equations J^T U J step = -J^T U r with U = w / sqrt(r^2 + mu^2) (the
+majorizer of S_mu at the current residuals), damped Levenberg-Marquardt
+style, using the model's analytic Jacobian.  Parameters on a bound that the
+step would push outward are held there and the system is re-solved for the
+others (an active set), so one pinned parameter does not stall the rest; a
+step that would cross a bound is damped further before it is projected onto it.
+mu starts at the scale of the initial residuals and shrinks geometrically
+whenever a step gains little, so S_mu approaches MAPE * n / 100.  A few
+Newton steps on the points the optimum interpolates (an L1 optimum passes
+through as many points as it has free parameters) finish the fit.
+
+The denominators d_i follow a safe denominator policy:
+
+    'measured'  |y_i| as in the scripts; a zero measurement is an error
+    'floor'     max(|y_i|, floor), floor = FLOOR_FRACTION * mean |y| unless given
+
+    result = fit_mape(logistic_decay, t, y, p0=[9, 0.18, 48])
+    result.params, result.mape, result.nfev, result.njev
+    result.history          (evaluations, MAPE) after every accepted step
+
+Benchmarks: python bench_mape_fit.py
+"""
+import numpy as np
+
+from kinetic_models import get_model
+
+DENOMINATORS = ('measured', 'floor')
+# Default floor of the 'floor' policy, relative to the mean absolute measurement
+FLOOR_FRACTION = 0.1
+
+# mu schedule: initial mu relative to the median absolute residual, shrink factor, and final mu
+# relative to the initial one
+MU_INIT_FRACTION = 0.3
+MU_SHRINK = 0.2
+MU_MIN_FRACTION = 1e-4
+# mu is shrunk once an accepted step improves S_mu by less than this (relative)
+MU_STEP_RTOL = 1e-3
+
+DEFAULT_MAX_ITER = 200
+DEFAULT_FTOL = 1e-8
+DEFAULT_XTOL = 1e-10
+LAMBDA_INIT = 1e-3
+LAMBDA_MAX = 1e12
+# A step that would cross a bound is damped up to this factor (on lambda) before it is projected onto
+# the bound instead
+BOUND_DAMPING = 1e4
+# Newton steps on the interpolated points after the IRLS phase
+POLISH_ITER = 20
+
+# Parameters of the library models that cannot be negative (rates, peak widths, capacities); without
+# explicit bounds they get a lower bound of zero and all others stay free
+NONNEGATIVE_PARAMS = {
+    'logistic_decay': ('alpha', 'beta', 'carrying_capacity'),
+    'gaussian_peak': ('beta',),
+    'double_gaussian': ('beta1', 'beta2'),
+    'monod_do': ('DO_max', 'Ks', 'mu_max'),
+    'first_order_do': ('DO_max', 'k'),
+    'exp_decay': ('beta',),
+    'exp_decay_offset': ('beta',),
+}
+
+
+class MapeFitResult:
+    """Result of fit_mape"""
+
+    def __init__(self, params, mape, nfev, njev, n_iter, converged, denominator, history):
+        self.params = params
+        self.mape = mape
+        self.nfev = nfev
+        self.njev = njev
+        self.n_iter = n_iter
+        self.converged = converged
+        self.denominator = denominator
+        self.history = history
+
+    def evaluations_to(self, target):
+        """Model plus Jacobian evaluations until MAPE first reached target (None if it never did)"""
+        reached = np.flatnonzero(self.history[:, 1] <= target)
+        return int(self.history[reached[0], 0]) if reached.size else None
+
+    def __repr__(self):
+        return (f"MapeFitResult(mape={self.mape:.6g}%, {self.nfev} model and {self.njev} Jacobian evaluations, "
+                f"{'converged' if self.converged else 'not converged'})")
+
+
+def safe_denominator(y, policy='floor', floor=None):
+    """Denominators d_i of the relative residuals under the given policy"""
+    y = np.asarray(y, dtype=float)
+    if policy == 'measured':
+        if np.any(y == 0):
+            raise ValueError("Measurements contain zeros; use the 'floor' denominator policy")
+        return np.abs(y)
+    if policy == 'floor':
+        if floor is None:
+            floor = FLOOR_FRACTION * np.mean(np.abs(y))
+        return np.maximum(np.abs(y), floor)
+    raise ValueError(f"Unknown denominator policy '{policy}', expected one of {', '.join(DENOMINATORS)}")
+
+
+def mape(y, predicted, denominator=None):
+    """Mean absolute percentage error; denominator defaults to |y| as in the scripts"""
+    y = np.asarray(y, dtype=float)
+    denominator = np.abs(y) if denominator is None else denominator
+    return float(np.mean(np.abs(y - predicted) / denominator) * 100)
+
+
+def _surrogate(residuals, weights, mu):
+    return float(weights @ (np.sqrt(residuals * residuals + mu * mu) - mu))
+
+
+def default_bounds(model):
+    """Sign constraints of a library model (NONNEGATIVE_PARAMS) as [(low, high)], None for other models"""
+    names = NONNEGATIVE_PARAMS.get(getattr(model, 'name', None))
+    if names is None:
+        return None
+    return [(0.0, np.inf) if name in names else (-np.inf, np.inf) for name in model.param_names]
+
+
+def _active_set_step(matrix, gradient, params, low, high):
+    """
+    Solve matrix @ step = -gradient with the parameters that sit on a bound and
+    would be pushed outward held fixed.
+
+    Parameters on a bound whose gradient points outward are dropped first; the
+    reduced system is re-solved while its step still pushes a bounded
+    parameter outward.  Raises LinAlgError when the reduced system is singular.
+    """
+    at_low = params <= low
+    at_high = params >= high
+    fixed = (at_low & (gradient > 0)) | (at_high & (gradient < 0))
+    step = np.zeros_like(params)
+    for _ in range(len(params)):
+        free = ~fixed
+        step[:] = 0.0
+        if not free.any():
+            break
+        step[free] = -np.linalg.solve(matrix[np.ix_(free, free)], gradient[free])
+        outward = free & ((at_low & (step < 0)) | (at_high & (step > 0)))
+        if not outward.any():
+            break
+        fixed |= outward
+    return step
+
+
+def _polish(model, t, y, weights, params, low, high):
+    """
+    Newton steps on the interpolation conditions of the weighted L1 optimum.
+
+    A minimizer of sum w_i |r_i| generically passes exactly through as many
+    points as it has free parameters.  The points with the smallest weighted
+    residuals are taken as that set and r_Z(params) = 0 is solved with the
+    Jacobian rows of those points; steps are kept only while MAPE decreases.
+    """
+    nfev = 0
+    residuals = model(t, *params) - y
+    current = float(weights @ np.abs(residuals))
+    for _ in range(POLISH_ITER):
+        free = (params > low) & (params < high)
+        n_free = int(free.sum())
+        if n_free == 0:
+            break
+        jac = np.broadcast_to(model.jac(t, *params), (len(t), len(params)))
+        nfev += 1
+        active = np.argsort(weights * np.abs(residuals), kind='stable')[:n_free]
+        step = np.zeros_like(params)
+        step[free] = -np.linalg.lstsq(jac[np.ix_(active, free)], residuals[active], rcond=None)[0]
+        trial = np.clip(params + step, low, high)
+        trial_residuals = model(t, *trial) - y
+        value = float(weights @ np.abs(trial_residuals))
+        if not np.isfinite(value) or value >= current:
+            break
+        params, residuals, current = trial, trial_residuals, value
+        if np.linalg.norm(step) <= DEFAULT_XTOL * (np.linalg.norm(params) + DEFAULT_XTOL):
+            break
+    return params, nfev
+
+
+def fit_mape(model, t, y, p0=None, bounds=None, denominator='floor', floor=None, max_iter=DEFAULT_MAX_ITER,
+             ftol=DEFAULT_FTOL, xtol=DEFAULT_XTOL):
+    """
+    Minimize the MAPE of model against (t, y) by IRLS on the smoothed surrogate.
+
+    p0           initial parameters, default model.p0
+    bounds       [(low, high)] per parameter (None or +-inf for no bound).  Defaults to the
+                 sign constraints of library models (default_bounds), unbounded for others:
+                 along flat directions of the objective, e.g. logistic_decay's carrying
+                 capacity, a fit without them drifts to negative, meaningless values.
+                 multistart.DEFAULT_BOUNDS are search boxes at the scale of the scripts' data
+                 and are only used when passed explicitly
+    denominator  'measured' or 'floor' (see safe_denominator)
+    """
+    if isinstance(model, str):
+        model = get_model(model)
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    keep = np.isfinite(t) & np.isfinite(y)
+    t, y = t[keep], y[keep]
+    if p0 is None:
+        if model.p0 is None:
+            raise ValueError(f"{model.name} has no default p0, pass one explicitly")
+        p0 = model.p0
+    if bounds is None:
+        bounds = default_bounds(model)
+    if bounds is None:
+        low, high = np.full(model.n_params, -np.inf), np.full(model.n_params, np.inf)
+    else:
+        low, high = np.array([(-np.inf if lo is None else lo, np.inf if hi is None else hi)
+                              for lo, hi in bounds], dtype=float).T
+    d = safe_denominator(y, denominator, floor)
+    weights = 1.0 / d
+
+    params = np.clip(np.array(p0, dtype=float), low, high)
+    residuals = model(t, *params) - y
+    nfev, njev = 1, 0
+    mu = MU_INIT_FRACTION * max(np.median(np.abs(residuals)), np.finfo(float).tiny)
+    mu_min = MU_MIN_FRACTION * mu
+    lam = LAMBDA_INIT
+    converged = False
+    n_iter = 0
+    history = [(nfev, mape(y, y + residuals, d))]
+
+    with np.errstate(over='ignore', invalid='ignore'):
+        for n_iter in range(1, max_iter + 1):
+            jac = np.broadcast_to(model.jac(t, *params), (len(t), model.n_params))
+            njev += 1
+            # IRLS weights: the quadratic majorizer of S_mu at the current residuals
+            u = weights / np.sqrt(residuals * residuals + mu * mu)
+            uj = jac * u[:, None]
+            jtuj = jac.T @ uj
+            gradient = uj.T @ residuals
+            current = _surrogate(residuals, weights, mu)
+            diag = np.maximum(np.diag(jtuj), 1e-12 * max(np.diag(jtuj).max(), 1e-300))
+
+            accepted = False
+            lam_bound = lam * BOUND_DAMPING
+            while lam <= LAMBDA_MAX:
+                try:
+                    step = _active_set_step(jtuj + np.diag(lam * diag), gradient, params, low, high)
+                except np.linalg.LinAlgError:
+                    lam *= 10
+                    continue
+                trial = params + step
+                if np.any((trial < low) | (trial > high)):
+                    # Clipping a long step flattens it onto the bounds and the fit can settle there
+                    # although the optimum is inside: shorten it first, project only short steps
+                    if lam < lam_bound:
+                        lam *= 4
+                        continue
+                    trial = np.clip(trial, low, high)
+                trial_residuals = model(t, *trial) - y
+                nfev += 1
+                trial_value = _surrogate(trial_residuals, weights, mu)
+                if np.isfinite(trial_value) and trial_value <= current:
+                    accepted = True
+                    break
+                lam *= 4
+            if not accepted:
+                # No descent direction left at this mu: shrink it, or stop at the smallest one
+                if mu <= mu_min:
+                    converged = True
+                    break
+                mu = max(mu * MU_SHRINK, mu_min)
+                lam = LAMBDA_INIT
+                continue
+
+            lam = max(lam / 3, 1e-12)
+            moved = np.linalg.norm(trial - params)
+            params, residuals = trial, trial_residuals
+            history.append((nfev + njev, float(weights @ np.abs(residuals)) * 100 / len(y)))
+            small_f = current - trial_value <= ftol * max(current, 1e-300)
+            small_x = moved <= xtol * (np.linalg.norm(params) + xtol)
+            if small_f or small_x or current - trial_value <= MU_STEP_RTOL * current:
+                # Converged (enough) at this mu: continue with a sharper surrogate
+                if mu <= mu_min and (small_f or small_x):
+                    converged = True
+                    break
+                mu = max(mu * MU_SHRINK, mu_min)
+
+    params, polish_nfev = _polish(model, t, y, weights, params, low, high)
+    nfev += polish_nfev
+    njev += polish_nfev
+    final = mape(y, model(t, *params), d)
+    history.append((nfev + njev, final))
+    return MapeFitResult(params, final, nfev, njev, n_iter, converged, denominator, np.array(history))
@@ -0,0 +1,226 @@
+"""
+Multi-start global fitting of kinetic models within parameter bounds.
+
+PINN与实验微生物浓度对比_4 fits its 7-parameter double-Gaussian model with a
+single L-BFGS-B run from hand-picked guesses inside tight hand-picked
+bounds.  multistart_fit() instead draws starting points from a scrambled
+Sobol sequence spanning the bounds and runs bounded L-BFGS-B from each, in
+rounds of round_size starts spread over a process pool.  The local runs use
+the model's analytic Jacobian (kinetic_models) for the gradient of the sum
+of squares, 2 J^T r; models without .jac fall back to finite differences.
+
+After every round the optima found so far are clustered (distance in the
+unit box of the bounds) and the run stops early once min_hits local runs
+have reached the best objective value, i.e. the best basin has been found
+repeatedly.  Optima that are equivalent by symmetry (the two peaks of
+double_gaussian swapped) have the same objective value and count as hits of
+the same best basin, but are listed as separate clusters.
+
+    result = multistart_fit(double_gaussian, do, y)          # DEFAULT_BOUNDS['double_gaussian']
+    result.x, result.fun                                     best parameters and SSE
+    result.cluster_x, result.cluster_fun, result.cluster_hits
+
+Benchmarks: python bench_multistart.py
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.optimize import minimize
+from scipy.stats import qmc
+
+from kinetic_models import model_reference, resolve_model
+
+# Wide search boxes for the library models (data scales of the analysis scripts)
+DEFAULT_BOUNDS = {
+    'logistic_decay': [(0.1, 50), (0.001, 2), (1, 1000)],
+    'gaussian_peak': [(0, 20), (0.05, 5), (2, 8), (-2, 5)],
+    'double_gaussian': [(0, 20), (0.05, 5), (2, 8), (0, 20), (0.05, 5), (2, 8), (-2, 5)],
+    'monod_do': [(0.1, 20), (0.01, 50), (0.001, 5)],
+    'first_order_do': [(0.1, 20), (0.001, 5)],
+    'exp_decay': [(0.01, 100), (0.001, 10)],
+    'exp_decay_offset': [(0.01, 100), (0.001, 10), (-10, 10)],
+    'fixed_decay': [(0.01, 100)],
+}
+
+DEFAULT_STARTS = 256
+DEFAULT_ROUND_SIZE = 16
+# Stop once this many local runs reached the best objective value
+DEFAULT_MIN_HITS = 4
+# Relative objective tolerance for a hit, and unit-box distance within which optima are one cluster
+HIT_RTOL = 1e-6
+CLUSTER_TOL = 1e-3
+SEED = 42
+
+# L-BFGS-B settings for the local runs (tighter than scipy's defaults so that optima cluster cleanly)
+LOCAL_OPTIONS = {'ftol': 1e-12, 'gtol': 1e-8, 'maxiter': 1000}
+
+
+class MultiStartResult:
+    """Best optimum, clusters of local optima and the individual local runs"""
+
+    def __init__(self, x, fun, starts, optima, funs, nfev, success, cluster_x, cluster_fun, cluster_hits,
+                 labels, stopped_early, seconds):
+        self.x = x
+        self.fun = fun
+        self.starts = starts
+        self.optima = optima
+        self.funs = funs
+        self.nfev = nfev
+        self.success = success
+        self.cluster_x = cluster_x
+        self.cluster_fun = cluster_fun
+        self.cluster_hits = cluster_hits
+        self.labels = labels
+        self.stopped_early = stopped_early
+        self.seconds = seconds
+
+    @property
+    def n_starts(self):
+        return len(self.starts)
+
+    @property
+    def n_clusters(self):
+        return len(self.cluster_fun)
+
+    @property
+    def n_evaluations(self):
+        return int(self.nfev.sum())
+
+    def hits(self, rtol=HIT_RTOL):
+        """Local runs that reached the best objective value"""
+        return int(np.sum(self.funs <= self.fun + rtol * max(abs(self.fun), 1e-300)))
+
+    def __repr__(self):
+        return (f"MultiStartResult(fun={self.fun:.6g}, {self.n_starts} starts, {self.n_clusters} clusters, "
+                f"{self.hits()} hits, {self.n_evaluations} evaluations, {self.seconds:.2f} s)")
+
+
+def sse_and_grad(params, model, t, y):
+    """Sum of squared residuals and its gradient 2 J^T r"""
+    residuals = model(t, *params) - y
+    grad = 2.0 * (residuals @ np.broadcast_to(model.jac(t, *params), (len(t), len(params))))
+    return float(residuals @ residuals), grad
+
+
+def _sse(params, model, t, y):
+    residuals = model(t, *params) - y
+    return float(residuals @ residuals)
+
+
+def sobol_starts(bounds, n, seed=SEED):
+    """n starting points from a scrambled Sobol sequence scaled to the bounds"""
+    bounds = np.asarray(bounds, dtype=float)
+    sampler = qmc.Sobol(len(bounds), scramble=True, seed=seed)
+    n_power = max(1, int(np.ceil(np.log2(max(n, 1)))))
+    return qmc.scale(sampler.random_base2(n_power)[:n], bounds[:, 0], bounds[:, 1])
+
+
+def _local_fits(job):
+    """Run L-BFGS-B from every start of one chunk (runs in a worker process)"""
+    model, t, y, bounds, starts, options = job
+    model = resolve_model(model)
+    if hasattr(model, 'jac'):
+        fun, jac = sse_and_grad, True
+    else:
+        fun, jac = _sse, None
+    out = []
+    with np.errstate(over='ignore', invalid='ignore'):
+        for start in starts:
+            result = minimize(fun, start, args=(model, t, y), jac=jac, method='L-BFGS-B', bounds=bounds,
+                              options=options)
+            out.append((result.x, float(result.fun), int(result.nfev), bool(result.success)))
+    return out
+
+
+def cluster_optima(optima, funs, bounds, tol=CLUSTER_TOL):
+    """
+    Greedy clustering in the unit box of the bounds, best objective first:
+    each optimum joins the first cluster whose best point is within tol.
+    Returns (labels, cluster indices into optima sorted by objective).
+    """
+    bounds = np.asarray(bounds, dtype=float)
+    unit = (optima - bounds[:, 0]) / (bounds[:, 1] - bounds[:, 0])
+    order = np.argsort(funs, kind='stable')
+    labels = np.full(len(optima), -1)
+    centres = []
+    for i in order:
+        if not np.isfinite(funs[i]):
+            continue
+        if centres:
+            distances = np.linalg.norm(unit[centres] - unit[i], axis=1)
+            nearest = int(np.argmin(distances))
+            if distances[nearest] <= tol:
+                labels[i] = nearest
+                continue
+        labels[i] = len(centres)
+        centres.append(i)
+    return labels, np.array(centres, dtype=int)
+
+
+def multistart_fit(model, t, y, bounds=None, n_starts=DEFAULT_STARTS, round_size=DEFAULT_ROUND_SIZE,
+                   min_hits=DEFAULT_MIN_HITS, p0=None, seed=SEED, workers=None, options=None):
+    """
+    Least-squares fit of model to (t, y) from up to n_starts Sobol starts.
+
+    bounds      [(low, high)] per parameter, default DEFAULT_BOUNDS[model.name]
+    round_size  starts per round; clusters and the stopping rule are checked between rounds
+    min_hits    stop once this many runs reached the best objective (None: run all starts)
+    p0          optional extra start tried first (e.g. the script's guesses)
+    workers     processes for the local runs (None: one per CPU, 1: in-process)
+    """
+    model = resolve_model(model)
+    start_time = time.perf_counter()
+    if bounds is None:
+        if model.name not in DEFAULT_BOUNDS:
+            raise ValueError(f"No default bounds for {model.name}, pass bounds explicitly")
+        bounds = DEFAULT_BOUNDS[model.name]
+    bounds = [tuple(map(float, bound)) for bound in bounds]
+    if len(bounds) != model.n_params:
+        raise ValueError(f"{model.name} has {model.n_params} parameters, got {len(bounds)} bounds")
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    keep = np.isfinite(t) & np.isfinite(y)
+    t, y = t[keep], y[keep]
+
+    starts = sobol_starts(bounds, n_starts, seed)
+    if p0 is not None:
+        low, high = np.array(bounds).T
+        starts = np.vstack([np.clip(np.asarray(p0, dtype=float), low, high), starts[:n_starts - 1]])
+    options = {**LOCAL_OPTIONS, **(options or {})}
+    model_ref = model_reference(model)
+
+    runs = []
+    stopped_early = False
+    pool = None if workers == 1 else ProcessPoolExecutor(max_workers=workers)
+    n_chunks = 1 if pool is None else (workers or os.cpu_count() or 1)
+    try:
+        for round_start in range(0, len(starts), round_size):
+            round_starts = starts[round_start:round_start + round_size]
+            chunks = [chunk for chunk in np.array_split(round_starts, min(n_chunks, len(round_starts))) if len(chunk)]
+            jobs = [(model_ref, t, y, bounds, chunk, options) for chunk in chunks]
+            outputs = map(_local_fits, jobs) if pool is None else pool.map(_local_fits, jobs)
+            for output in outputs:
+                runs.extend(output)
+            if min_hits is not None:
+                funs = np.array([run[1] for run in runs])
+                best = np.nanmin(funs)
+                if np.sum(funs <= best + HIT_RTOL * max(abs(best), 1e-300)) >= min_hits:
+                    stopped_early = round_start + round_size < len(starts)
+                    break
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    optima = np.array([run[0] for run in runs])
+    funs = np.array([run[1] for run in runs])
+    funs = np.where(np.isfinite(funs), funs, np.inf)
+    nfev = np.array([run[2] for run in runs])
+    success = np.array([run[3] for run in runs])
+    labels, centres = cluster_optima(optima, funs, bounds)
+    hits = np.bincount(labels[labels >= 0], minlength=len(centres))
+    best = centres[0]
+    return MultiStartResult(optima[best], float(funs[best]), starts[:len(runs)], optima, funs, nfev, success,
+                            optima[centres], funs[centres], hits, labels, stopped_early,
+                            time.perf_counter() - start_time)
@@ -0,0 +1,463 @@
+"""
+A physics-informed neural network (PINN) trainer in numpy, on the CPU.
+
+The "PINN" comparison scripts fit closed-form curves with minimize; here a
+small tanh MLP u(x) is trained on
+
+    loss = w_data * mean((u(x_i) - y_i)^2) + w_physics * mean((u'(x_c) - F(x_c, u(x_c); theta))^2)
+
+where the second term is the residual of an ODE u' = F(x, u; theta) at
+collocation points x_c, and the physical parameters theta are learned along
+with the network weights.  Values and residuals are scaled by the data range
+so both terms are dimensionless.
+
+The network carries du/dx through the forward pass next to u (one input, so
+forward-mode is exact and cheap), and the backward pass propagates the loss
+gradient through both streams by hand; everything is batched matrix algebra,
+no autodiff framework.  Parameters are trained with Adam on mini-batches of
+collocation points (plus all data points).  Every resample_every steps the
+collocation set is redrawn from a large uniform pool with probability
+proportional to the current residual (RAR-D: p ~ r^2 / mean(r^2) + 1), which
+concentrates points where the physics is violated.  Training state (weights,
+theta, Adam moments, collocation points, RNG) is checkpointed to .npz and can
+be resumed.
+
+Problems:
+    logistic   microbial_concentration_data.csv (PINN 与实验微生物浓度对比_2): concentration N
+               against DO, with the logistic ODE whose solution is the scripts' closed form,
+               dN/dDO = -beta N (1 - N / K); beta and K are learned
+    monod      the growth phase of the substrate-feedback model (fed_batch, 负反馈回调
+               parameters) between feed events: dX/dt = mu_max S / (K_s + S) X, dS/dt = -(dX/dt) / Y,
+               observed at a few noisy time points; mu_max and K_s are learned
+
+    problem = logistic_problem()
+    result = train(problem, steps=20000, target_loss=2e-3, checkpoint='pinn.npz')
+    result.predict(x), result.theta, result.history
+
+Command line:
+    python pinn.py --problem logistic --steps 20000 --out pinn_predictions.csv
+Benchmarks: python bench_pinn.py
+"""
+import argparse
+import csv
+import json
+import os
+import time
+
+import numpy as np
+
+from fed_batch import CALLBACK_PARAMS
+from mape_fit import mape, safe_denominator
+
+DATA_PATH = 'microbial_concentration_data.csv'
+
+HIDDEN = (32, 32)
+LEARNING_RATE = 5e-3
+# The learning rate decays by this factor over DECAY_STEPS
+LR_DECAY = 0.1
+DECAY_STEPS = 20000
+# The physical parameters sit in a flat valley of the loss and learn this much faster than the weights
+THETA_LR_FACTOR = 20.0
+BATCH_SIZE = 128
+N_COLLOCATION = 1024
+# Candidate pool for residual-based resampling, and how often the collocation set is redrawn
+POOL_SIZE = 8192
+RESAMPLE_EVERY = 500
+EVAL_EVERY = 100
+CHECKPOINT_EVERY = 1000
+WEIGHT_DATA = 1.0
+WEIGHT_PHYSICS = 1.0
+SEED = 42
+
+# Growth phase of 负反馈回调 used by the monod problem (substrate lasts about 15 h)
+MONOD_TIME = 12.0
+MONOD_POINTS = 13
+MONOD_NOISE = 0.01
+
+
+class MLP:
+    """Fully connected tanh network with one input, tracking d output / d input"""
+
+    def __init__(self, sizes, rng):
+        self.weights = []
+        self.biases = []
+        for n_in, n_out in zip(sizes[:-1], sizes[1:]):
+            # Glorot initialization
+            limit = np.sqrt(6.0 / (n_in + n_out))
+            self.weights.append(rng.uniform(-limit, limit, (n_in, n_out)))
+            self.biases.append(np.zeros(n_out))
+
+    @property
+    def params(self):
+        return self.weights + self.biases
+
+    def forward(self, u, du):
+        """
+        u (n, 1) normalized inputs and du = d u / d x (scalar).  Returns the
+        outputs, their derivatives with respect to x, and the activations
+        needed by backward().
+        """
+        a, da = u, np.full_like(u, du)
+        cache = []
+        for W, b in zip(self.weights[:-1], self.biases[:-1]):
+            z = a @ W + b
+            dz = da @ W
+            h = np.tanh(z)
+            slope = 1.0 - h * h
+            cache.append((a, da, h, dz, slope))
+            a, da = h, slope * dz
+        cache.append((a, da))
+        return a @ self.weights[-1] + self.biases[-1], da @ self.weights[-1], cache
+
+    def backward(self, cache, g_out, g_dout):
+        """Gradients of the loss for params, given d loss / d outputs and d loss / d (d outputs / dx)"""
+        a, da = cache[-1]
+        grad_w = [None] * len(self.weights)
+        grad_b = [None] * len(self.biases)
+        grad_w[-1] = a.T @ g_out + da.T @ g_dout
+        grad_b[-1] = g_out.sum(axis=0)
+        g_a = g_out @ self.weights[-1].T
+        g_da = g_dout @ self.weights[-1].T
+        for layer in range(len(self.weights) - 2, -1, -1):
+            a_prev, da_prev, h, dz, slope = cache[layer]
+            # da = slope * dz with slope = 1 - h^2: both h and dz depend on the weights
+            g_dz = g_da * slope
+            g_z = (g_a - 2.0 * h * g_da * dz) * slope
+            grad_w[layer] = a_prev.T @ g_z + da_prev.T @ g_dz
+            grad_b[layer] = g_z.sum(axis=0)
+            if layer:
+                g_a = g_z @ self.weights[layer].T
+                g_da = g_dz @ self.weights[layer].T
+        return grad_w + grad_b
+
+
+class LogisticPhysics:
+    """dN/dx = -beta N (1 - N / K), the ODE solved by the scripts' logistic_decay"""
+
+    output_names = ('N',)
+    param_names = ('beta', 'K')
+
+    def __init__(self, beta=0.2, K=50.0):
+        self.init = np.log([beta, K])
+
+    def rhs(self, x, values, theta):
+        """F, dF/dvalues (n, m, m) and dF/dtheta (n, m, p) with theta = log parameters"""
+        beta, K = np.exp(theta)
+        N = values[:, 0]
+        logistic = N * (1.0 - N / K)
+        F = -beta * logistic
+        dF_dN = -beta * (1.0 - 2.0 * N / K)
+        dF_dtheta = np.stack([F, -beta * N * N / K], axis=1)
+        return F[:, None], dF_dN[:, None, None], dF_dtheta[:, None, :]
+
+
+class MonodPhysics:
+    """dX/dt = mu_max S / (K_s + S) X, dS/dt = -(dX/dt) / Y (growth phase of fed_batch)"""
+
+    output_names = ('X', 'S')
+    param_names = ('mu_max', 'K_s')
+
+    def __init__(self, mu_max=1.0, K_s=1.0, Y=CALLBACK_PARAMS['Y']):
+        self.init = np.log([mu_max, K_s])
+        self.Y = Y
+
+    def rhs(self, t, values, theta):
+        mu_max, K_s = np.exp(theta)
+        X, S = values[:, 0], values[:, 1]
+        denom = K_s + S
+        g = S / denom
+        growth = mu_max * g * X
+        F = np.stack([growth, -growth / self.Y], axis=1)
+        d_growth = np.stack([mu_max * g, mu_max * X * K_s / (denom * denom)], axis=1)
+        dF_dvalues = np.stack([d_growth, -d_growth / self.Y], axis=1)
+        d_theta = np.stack([growth, -mu_max * X * S * K_s / (denom * denom)], axis=1)
+        dF_dtheta = np.stack([d_theta, -d_theta / self.Y], axis=1)
+        return F, dF_dvalues, dF_dtheta
+
+
+class PINNProblem:
+    """Observations (x, y[, NaN where unobserved]), the ODE domain and its physics"""
+
+    def __init__(self, name, x, y, domain, physics):
+        self.name = name
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float).reshape(len(self.x), -1)
+        self.domain = domain
+        self.physics = physics
+        self.mask = np.isfinite(self.y)
+        observed = np.where(self.mask, self.y, np.nan)
+        self.y_shift = np.nanmean(observed, axis=0)
+        self.y_scale = np.maximum(np.nanmax(observed, axis=0) - np.nanmin(observed, axis=0), 1e-12)
+
+
+def logistic_problem(path=DATA_PATH, beta=0.2, K=50.0):
+    """The exported comparison data: DO against Experimental_Data"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.DictReader(f))
+    x = np.array([float(row['DO']) for row in rows])
+    y = np.array([float(row['Experimental_Data']) for row in rows])
+    return PINNProblem('logistic', x, y, (float(x.min()), float(x.max())), LogisticPhysics(beta, K))
+
+
+def monod_problem(total_time=MONOD_TIME, n_points=MONOD_POINTS, noise=MONOD_NOISE, seed=SEED, params=None):
+    """Noisy X and S observations of the growth phase, from a fine reference integration"""
+    from scipy.integrate import solve_ivp
+
+    params = {**CALLBACK_PARAMS, **(params or {})}
+
+    def growth(t, state):
+        X, S = state
+        rate = params['mu_max'] * S / (params['K_s'] + S) * X
+        return [rate, -rate / params['Y']]
+
+    t = np.linspace(0.0, total_time, n_points)
+    solution = solve_ivp(growth, (0.0, total_time), [params['X0'], params['S0']], t_eval=t, rtol=1e-10, atol=1e-12)
+    y = solution.y.T + np.random.default_rng(seed).normal(0.0, noise, (n_points, 2))
+    return PINNProblem('monod', t, y, (0.0, total_time), MonodPhysics(Y=params['Y']))
+
+
+class Adam:
+    """Adam with an optional learning-rate multiplier per parameter array"""
+
+    def __init__(self, shapes, lr_factors=None, beta1=0.9, beta2=0.999, eps=1e-8):
+        self.lr_factors = [1.0] * len(shapes) if lr_factors is None else list(lr_factors)
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.eps = eps
+        self.m = [np.zeros(shape) for shape in shapes]
+        self.v = [np.zeros(shape) for shape in shapes]
+        self.step_count = 0
+
+    def step(self, params, grads, lr):
+        self.step_count += 1
+        correction1 = 1.0 - self.beta1 ** self.step_count
+        correction2 = 1.0 - self.beta2 ** self.step_count
+        for param, grad, m, v, factor in zip(params, grads, self.m, self.v, self.lr_factors):
+            m *= self.beta1
+            m += (1.0 - self.beta1) * grad
+            v *= self.beta2
+            v += (1.0 - self.beta2) * grad * grad
+            param -= factor * lr * (m / correction1) / (np.sqrt(v / correction2) + self.eps)
+
+
+class PINN:
+    """Network, physical parameters and the scaling of one problem"""
+
+    def __init__(self, problem, hidden=HIDDEN, seed=SEED):
+        self.problem = problem
+        rng = np.random.default_rng(seed)
+        n_outputs = problem.y.shape[1]
+        self.net = MLP((1, *hidden, n_outputs), rng)
+        self.theta = np.array(problem.physics.init, dtype=float)
+        low, high = problem.domain
+        self.x_centre = 0.5 * (low + high)
+        self.x_scale = 2.0 / (high - low)
+        # Residuals are measured in output ranges per domain length
+        self.residual_scale = (high - low) / problem.y_scale
+
+    @property
+    def params(self):
+        return self.net.params + [self.theta]
+
+    def _forward(self, x):
+        u = ((x - self.x_centre) * self.x_scale)[:, None]
+        out, dout, cache = self.net.forward(u, self.x_scale)
+        values = self.problem.y_shift + self.problem.y_scale * out
+        return values, self.problem.y_scale * dout, cache
+
+    def predict(self, x):
+        """Network outputs at x: (n, n_outputs)"""
+        return self._forward(np.asarray(x, dtype=float))[0]
+
+    def residuals(self, x):
+        """Scaled ODE residuals at x: (n, n_outputs)"""
+        values, derivs, _ = self._forward(np.asarray(x, dtype=float))
+        F = self.problem.physics.rhs(x, values, self.theta)[0]
+        return (derivs - F) * self.residual_scale
+
+    def loss_and_grads(self, x_colloc, w_data=WEIGHT_DATA, w_physics=WEIGHT_PHYSICS):
+        """(loss, data loss, physics loss) and gradients for params"""
+        problem = self.problem
+        n_data = len(problem.x)
+        x = np.concatenate([problem.x, x_colloc])
+        values, derivs, cache = self._forward(x)
+        scale = problem.y_scale
+
+        data_error = np.where(problem.mask, (values[:n_data] - np.nan_to_num(problem.y)) / scale, 0.0)
+        n_observed = max(int(problem.mask.sum()), 1)
+        data_loss = float(np.sum(data_error * data_error)) / n_observed
+
+        F, dF_dvalues, dF_dtheta = problem.physics.rhs(x_colloc, values[n_data:], self.theta)
+        residual = (derivs[n_data:] - F) * self.residual_scale
+        physics_loss = float(np.mean(residual * residual))
+
+        g_values = np.zeros_like(values)
+        g_derivs = np.zeros_like(derivs)
+        g_values[:n_data] = w_data * 2.0 * data_error / scale / n_observed
+        g_residual = w_physics * 2.0 * residual / residual.size * self.residual_scale
+        g_derivs[n_data:] = g_residual
+        g_values[n_data:] = -np.einsum('ni,nij->nj', g_residual, dF_dvalues)
+        g_theta = -np.einsum('ni,nip->p', g_residual, dF_dtheta)
+
+        grads = self.net.backward(cache, g_values * scale, g_derivs * scale)
+        loss = w_data * data_loss + w_physics * physics_loss
+        return (loss, data_loss, physics_loss), grads + [g_theta]
+
+
+class PINNResult:
+    """Trained PINN and its training history (step, seconds, loss, data loss, physics loss)"""
+
+    def __init__(self, model, history, steps, seconds, reached_target):
+        self.model = model
+        self.history = history
+        self.steps = steps
+        self.seconds = seconds
+        self.reached_target = reached_target
+
+    @property
+    def theta(self):
+        """Learned physical parameters by name"""
+        return dict(zip(self.model.problem.physics.param_names, np.exp(self.model.theta)))
+
+    def predict(self, x):
+        return self.model.predict(x)
+
+    @property
+    def final_loss(self):
+        return float(self.history[-1, 2]) if len(self.history) else np.nan
+
+    def __repr__(self):
+        params = ', '.join(f"{name}={value:.4g}" for name, value in self.theta.items())
+        return f"PINNResult({self.model.problem.name}, {self.steps} steps, loss={self.final_loss:.3g}, {params})"
+
+
+def resample_collocation(model, rng, n_points=N_COLLOCATION, pool_size=POOL_SIZE, adaptive=True):
+    """Collocation points: uniform, or drawn from a uniform pool with p ~ r^2 / mean(r^2) + 1"""
+    low, high = model.problem.domain
+    if not adaptive:
+        return rng.uniform(low, high, n_points)
+    pool = rng.uniform(low, high, pool_size)
+    error = np.sum(model.residuals(pool) ** 2, axis=1)
+    weights = error / max(float(error.mean()), 1e-300) + 1.0
+    return pool[rng.choice(pool_size, n_points, replace=True, p=weights / weights.sum())]
+
+
+def save_checkpoint(path, model, optimizer, colloc, rng, step, history):
+    state = {f'param_{i}': param for i, param in enumerate(model.params)}
+    state.update({f'adam_m_{i}': m for i, m in enumerate(optimizer.m)})
+    state.update({f'adam_v_{i}': v for i, v in enumerate(optimizer.v)})
+    state['adam_step'] = optimizer.step_count
+    state['colloc'] = colloc
+    state['step'] = step
+    state['history'] = np.asarray(history, dtype=float).reshape(-1, 5)
+    state['rng'] = np.array(json.dumps(rng.bit_generator.state))
+    # Write to a temporary file first so an interrupted save never leaves a truncated checkpoint
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, **state)
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path, model, optimizer, rng):
+    """Restore a checkpoint into model, optimizer and rng; returns (colloc, step, history)"""
+    with np.load(path) as state:
+        for i, param in enumerate(model.params):
+            param[...] = state[f'param_{i}']
+        for i in range(len(optimizer.m)):
+            optimizer.m[i][...] = state[f'adam_m_{i}']
+            optimizer.v[i][...] = state[f'adam_v_{i}']
+        optimizer.step_count = int(state['adam_step'])
+        rng.bit_generator.state = json.loads(str(state['rng']))
+        return state['colloc'].copy(), int(state['step']), [tuple(row) for row in state['history']]
+
+
+def train(problem, steps=DECAY_STEPS, target_loss=None, hidden=HIDDEN, lr=LEARNING_RATE, batch_size=BATCH_SIZE,
+          n_collocation=N_COLLOCATION, adaptive=True, resample_every=RESAMPLE_EVERY, eval_every=EVAL_EVERY,
+          w_data=WEIGHT_DATA, w_physics=WEIGHT_PHYSICS, checkpoint=None, checkpoint_every=CHECKPOINT_EVERY,
+          resume=True, theta_lr_factor=THETA_LR_FACTOR, seed=SEED):
+    """
+    Train a PINN on problem for up to `steps` Adam steps.
+
+    target_loss  stop once the loss on all collocation points and data falls below it
+    adaptive     residual-based collocation resampling (False: uniform redraws)
+    theta_lr_factor  learning rate of the physical parameters relative to lr
+    checkpoint   .npz path written every checkpoint_every steps and at the end;
+                 with resume, training continues from it if it exists
+    """
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    model = PINN(problem, hidden, seed)
+    shapes = [param.shape for param in model.params]
+    optimizer = Adam(shapes, [1.0] * (len(shapes) - 1) + [theta_lr_factor])
+    step, history = 0, []
+    if checkpoint and resume and os.path.exists(checkpoint):
+        colloc, step, history = load_checkpoint(checkpoint, model, optimizer, rng)
+    else:
+        colloc = rng.uniform(*problem.domain, n_collocation)
+    elapsed = history[-1][1] if history else 0.0
+
+    reached = False
+    while step < steps:
+        batch = colloc[rng.choice(len(colloc), min(batch_size, len(colloc)), replace=False)]
+        _, grads = model.loss_and_grads(batch, w_data, w_physics)
+        rate = lr * LR_DECAY ** (step / DECAY_STEPS)
+        optimizer.step(model.params, grads, rate)
+        step += 1
+
+        if step % eval_every == 0 or step == steps:
+            (loss, data_loss, physics_loss), _ = model.loss_and_grads(colloc, w_data, w_physics)
+            history.append((step, elapsed + time.perf_counter() - start, loss, data_loss, physics_loss))
+            if target_loss is not None and loss <= target_loss:
+                reached = True
+                break
+        if step % resample_every == 0:
+            colloc = resample_collocation(model, rng, n_collocation, adaptive=adaptive)
+        if checkpoint and step % checkpoint_every == 0:
+            save_checkpoint(checkpoint, model, optimizer, colloc, rng, step, history)
+
+    if checkpoint:
+        save_checkpoint(checkpoint, model, optimizer, colloc, rng, step, history)
+    return PINNResult(model, np.asarray(history, dtype=float).reshape(-1, 5), step,
+                      elapsed + time.perf_counter() - start, reached)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train a physics-informed network on the CPU')
+    parser.add_argument('--problem', default='logistic', choices=('logistic', 'monod'))
+    parser.add_argument('--data', default=DATA_PATH, help='CSV for the logistic problem')
+    parser.add_argument('--steps', type=int, default=DECAY_STEPS)
+    parser.add_argument('--target-loss', type=float, help='stop once the loss falls below this')
+    parser.add_argument('--uniform', action='store_true', help='uniform instead of residual-based collocation')
+    parser.add_argument('--checkpoint', help='.npz checkpoint (resumed if it exists)')
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--out', help='write data and PINN predictions to this CSV')
+    args = parser.parse_args()
+
+    problem = logistic_problem(args.data) if args.problem == 'logistic' else monod_problem(seed=args.seed)
+    result = train(problem, steps=args.steps, target_loss=args.target_loss, adaptive=not args.uniform,
+                   checkpoint=args.checkpoint, seed=args.seed)
+    print(result)
+    print(f"{result.seconds:.1f} s, data loss {result.history[-1, 3]:.3g}, physics loss {result.history[-1, 4]:.3g}")
+
+    prediction = result.predict(problem.x)
+    for column, name in enumerate(problem.physics.output_names):
+        observed = problem.y[problem.mask[:, column], column]
+        predicted = prediction[problem.mask[:, column], column]
+        # Floor denominator: S of the monod problem runs down to zero
+        print(f"{name}: MAPE {mape(observed, predicted, safe_denominator(observed, 'floor')):.2f}%")
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            x_name = 'DO' if problem.name == 'logistic' else 'Time'
+            if problem.y.shape[1] == 1:
+                # Same columns as the comparison scripts' export
+                percent = (problem.y[:, 0] - prediction[:, 0]) / problem.y[:, 0] * 100
+                writer.writerow([x_name, 'Experimental_Data', 'PINN_Prediction', 'Residuals_Percentage'])
+                writer.writerows(zip(problem.x, problem.y[:, 0], prediction[:, 0], percent))
+            else:
+                names = problem.physics.output_names
+                writer.writerow([x_name, *names, *(f'{name}_PINN' for name in names)])
+                writer.writerows(np.column_stack([problem.x, problem.y, prediction]).tolist())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+附近推荐：按真实步行时间对候选地点排序，每个类别取前 k 个
+
+有本地步行路网时，从景点出发做一次带截止时间的最短路径树（一对多查询），
+每个候选地点只需查找最近节点即可得到步行时间；没有路网（城市包未附带）或候选点不可达时，
+改用路线服务商的一对多步行距离（高德距离测量接口，每个景点一次请求，结果存入共享路线缓存）；
+仍然没有结果时才退化为直线距离乘绕行系数的估算值。
+"""
+import hashlib
+import heapq
+import json
+import threading
+
+from routing_providers import haversine, WALKING_SPEED
+
+# 无路网时直线距离的绕行系数
+DETOUR_FACTOR = 1.3
+
+
+class NearbyRanker:
+    """附近推荐排序器，排序结果按景点缓存"""
+
+    def __init__(self, graph=None, max_minutes=60, router=None, cache=None):
+        """router 为 HedgedRouter（提供 walking_distances），cache 为 route_cache.SharedCache，均可省略"""
+        self.graph = graph
+        self.max_seconds = max_minutes * 60.0
+        self.router = router
+        self.cache = cache
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def walking_times(self, origin, places):
+        """一对多步行时间：返回与 places 一一对应的 (秒, 米, 是否为实际路线结果)；估算结果的距离为直线距离"""
+        times = self._graph_times(origin, places)
+        missing = [i for i, value in enumerate(times) if value is None]
+        if missing:
+            routed = self._routed_times(origin, [places[i] for i in missing])
+            for i, value in zip(missing, routed):
+                times[i] = (*value, True) if value is not None else self._estimate(origin, places[i])
+        return times
+
+    def _graph_times(self, origin, places):
+        """本地路网上的步行时间，没有路网或不可达的地点为 None"""
+        graph = self.graph
+        if graph is None or len(graph) == 0:
+            return [None] * len(places)
+        source, access_m = graph.nearest_node(origin['lon'], origin['lat'])
+        if source is None:
+            return [None] * len(places)
+        dist, _ = graph.shortest_path_tree({source: access_m / graph.speed}, self.max_seconds)
+
+        times = []
+        for place in places:
+            node, egress_m = graph.nearest_node(place['lon'], place['lat'])
+            if node in dist:
+                seconds = dist[node] + egress_m / graph.speed
+                times.append((seconds, seconds * graph.speed, True))
+            else:
+                times.append(None)
+        return times
+
+    def _routed_times(self, origin, places):
+        """路线服务商的一对多步行 (秒, 米)；步行时间近似对称，以各地点为起点、景点为终点一次请求"""
+        if self.router is None or not places:
+            return [None] * len(places)
+        key = hashlib.sha256(json.dumps({
+            'origin': [origin['lon'], origin['lat']],
+            'places': [[place['lon'], place['lat']] for place in places],
+        }).encode('utf-8')).hexdigest()[:24]
+        if self.cache is not None:
+            cached = self.cache.get('matrix', f"nearby:{key}")
+            if cached is not None:
+                return [tuple(value) if value is not None else None for value in cached]
+        times = self.router.walking_distances(
+            [f"{place['lon']},{place['lat']}" for place in places], f"{origin['lon']},{origin['lat']}"
+        )
+        if times is None:
+            return [None] * len(places)
+        if self.cache is not None:
+            self.cache.set('matrix', f"nearby:{key}", [list(value) if value is not None else None for value in times])
+        return times
+
+    def _estimate(self, origin, place):
+        # 距离仍取直线距离，步行时间按绕行系数估算
+        distance = haversine(origin['lon'], origin['lat'], place['lon'], place['lat'])
+        return distance * DETOUR_FACTOR / WALKING_SPEED, distance, False
+
+    def top_k(self, stop, k=3):
+        """按类别返回步行时间最短的 k 个附近地点：{类别: [(地点, 秒, 米, 是否为路网结果), ...]}"""
+        key = (stop['name'], stop['lat'], stop['lon'], k)
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+
+        categories = stop.get('nearby_places', {})
+        flat = [(category, place) for category, places in categories.items() for place in places]
+        times = self.walking_times(stop, [place for _, place in flat])
+
+        grouped = {}
+        for index, ((category, place), (seconds, meters, routed)) in enumerate(zip(flat, times)):
+            # 序号参与比较，保证耗时相同时按原顺序排列且不比较字典
+            grouped.setdefault(category, []).append((seconds, index, place, meters, routed))
+        ranking = {
+            category: [(place, seconds, meters, routed)
+                       for seconds, _, place, meters, routed in heapq.nsmallest(k, entries)]
+            for category, entries in grouped.items()
+        }
+
+        with self._lock:
+            self._cache[key] = ranking
+        return ranking
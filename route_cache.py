@@ -0,0 +1,333 @@
+"""
+共享路线缓存：多个 Streamlit 副本共用同一份路线（和步行时间矩阵）结果，
+同一路段在所有副本中只请求一次高德
+
+结构：
+    SharedCache      进程内热点 LRU + 共享后端，按命名空间（'walking'、'matrix' 等）存取
+    SQLiteBackend    单机多进程共享：WAL 模式，每次写入为一个事务（原子写入）
+    RedisBackend     多机共享（需要安装 redis），可参照其实现接入其他网络存储
+
+失效：每个命名空间有一个版本号，写入的条目带版本戳，invalidate() 将版本号加一，
+旧版本条目随即失效（SQLite 后端同时删除）；invalidate_all() 对 NAMESPACES 中的所有命名空间执行。进程内热点层最多每 version_check_s 秒
+向后端确认一次版本号，其他副本的失效操作在该间隔内生效。
+
+后端由环境变量 ROUTE_CACHE_URL 指定：
+    sqlite:///route_cache.sqlite3   （默认）
+    redis://localhost:6379/0
+    memory                          只用进程内缓存
+
+多进程自检和失效：
+    python route_cache.py selfcheck --processes 8
+    python route_cache.py invalidate            所有命名空间
+    python route_cache.py invalidate matrix     指定命名空间
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_URL = 'sqlite:///route_cache.sqlite3'
+# 应用使用的命名空间：各出行方式的路线、步行时间矩阵（含附近推荐的一对多步行时间）和地理编码结果
+NAMESPACES = ('walking', 'bicycling', 'transit', 'matrix', 'geocode')
+
+
+class CacheBackend:
+    """共享缓存后端接口；值为可 JSON 序列化的对象"""
+
+    def get(self, namespace, key, version):
+        """返回版本号为 version 且未过期的值，不存在时返回 None"""
+        raise NotImplementedError
+
+    def set(self, namespace, key, version, value, ttl=None):
+        raise NotImplementedError
+
+    def version(self, namespace):
+        """命名空间当前版本号（从未失效过为 0）"""
+        raise NotImplementedError
+
+    def bump_version(self, namespace):
+        """版本号加一并返回新版本号，旧版本条目全部失效"""
+        raise NotImplementedError
+
+
+class SQLiteBackend(CacheBackend):
+    """基于 SQLite 文件的后端，同一台机器上的多个进程可安全并发读写"""
+
+    def __init__(self, path, busy_timeout_ms=5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        with _Transaction(self._connect()) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, version INTEGER NOT NULL,"
+                " value TEXT NOT NULL, expires_at REAL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS versions ("
+                " namespace TEXT PRIMARY KEY, version INTEGER NOT NULL)"
+            )
+
+    def _connect(self):
+        # 每个线程一个连接；fork 出的子进程不能复用父进程的连接
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000.0, isolation_level=None)
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, namespace, key, version):
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM entries WHERE namespace = ? AND key = ? AND version = ?",
+            (namespace, key, version)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return json.loads(row[0])
+
+    def set(self, namespace, key, version, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with _Transaction(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, version, value, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, version, json.dumps(value, ensure_ascii=False), expires_at)
+            )
+
+    def version(self, namespace):
+        row = self._connect().execute("SELECT version FROM versions WHERE namespace = ?", (namespace,)).fetchone()
+        return row[0] if row else 0
+
+    def bump_version(self, namespace):
+        with _Transaction(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO versions (namespace, version) VALUES (?, 1)"
+                " ON CONFLICT(namespace) DO UPDATE SET version = version + 1",
+                (namespace,)
+            )
+            version = conn.execute("SELECT version FROM versions WHERE namespace = ?", (namespace,)).fetchone()[0]
+            conn.execute("DELETE FROM entries WHERE namespace = ? AND version < ?", (namespace, version))
+        return version
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT；异常时回滚，保证写入要么全部生效要么不生效"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+class RedisBackend(CacheBackend):
+    """基于 Redis 的网络后端：版本号保存在 <prefix>:<namespace>:version，
+    条目键带版本号，失效后旧条目不再被读取，由 TTL 或 Redis 淘汰策略回收"""
+
+    def __init__(self, url, prefix='route_cache', default_ttl=7 * 24 * 3600):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+
+    def _key(self, namespace, key, version):
+        return f"{self.prefix}:{namespace}:v{version}:{key}"
+
+    def get(self, namespace, key, version):
+        value = self.client.get(self._key(namespace, key, version))
+        return None if value is None else json.loads(value)
+
+    def set(self, namespace, key, version, value, ttl=None):
+        self.client.set(
+            self._key(namespace, key, version),
+            json.dumps(value, ensure_ascii=False),
+            ex=int(ttl or self.default_ttl)
+        )
+
+    def version(self, namespace):
+        value = self.client.get(f"{self.prefix}:{namespace}:version")
+        return int(value) if value is not None else 0
+
+    def bump_version(self, namespace):
+        return int(self.client.incr(f"{self.prefix}:{namespace}:version"))
+
+
+class SharedCache:
+    """进程内热点 LRU + 共享后端；backend 为 None 时只使用进程内缓存"""
+
+    def __init__(self, backend=None, max_entries=2048, version_check_s=2.0):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.version_check_s = version_check_s
+        self._hot = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def _version(self, namespace):
+        """命名空间的当前版本号；后端的版本号按 version_check_s 间隔刷新"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._versions.get(namespace)
+            if cached is not None and (self.backend is None or now - cached[1] < self.version_check_s):
+                return cached[0]
+        version = self.backend.version(namespace) if self.backend is not None else 0
+        with self._lock:
+            self._versions[namespace] = (version, now)
+        return version
+
+    def _remember(self, hot_key, value):
+        with self._lock:
+            self._hot[hot_key] = value
+            self._hot.move_to_end(hot_key)
+            while len(self._hot) > self.max_entries:
+                self._hot.popitem(last=False)
+
+    def peek(self, namespace, key):
+        """只查进程内热点层"""
+        hot_key = (namespace, self._version(namespace), key)
+        with self._lock:
+            return self._hot.get(hot_key)
+
+    def get(self, namespace, key):
+        version = self._version(namespace)
+        hot_key = (namespace, version, key)
+        with self._lock:
+            if hot_key in self._hot:
+                self._hot.move_to_end(hot_key)
+                return self._hot[hot_key]
+        if self.backend is None:
+            return None
+        value = self.backend.get(namespace, key, version)
+        if value is not None:
+            self._remember(hot_key, value)
+        return value
+
+    def set(self, namespace, key, value, ttl=None):
+        version = self._version(namespace)
+        self._remember((namespace, version, key), value)
+        if self.backend is not None:
+            self.backend.set(namespace, key, version, value, ttl)
+
+    def invalidate(self, namespace):
+        """使命名空间下所有条目失效（包括其他进程中的热点层，在 version_check_s 内生效）"""
+        if self.backend is not None:
+            version = self.backend.bump_version(namespace)
+        else:
+            version = self._version(namespace) + 1
+        with self._lock:
+            self._versions[namespace] = (version, time.monotonic())
+            for hot_key in [k for k in self._hot if k[0] == namespace]:
+                del self._hot[hot_key]
+        return version
+
+    def invalidate_all(self, namespaces=NAMESPACES):
+        """使所有命名空间失效，返回 {命名空间: 当前版本}"""
+        return {namespace: self.invalidate(namespace) for namespace in namespaces}
+
+
+def backend_from_url(url):
+    """根据 URL 创建后端：sqlite:///path、redis://...、memory"""
+    if url == 'memory':
+        return None
+    if url.startswith('sqlite:///'):
+        return SQLiteBackend(url[len('sqlite:///'):])
+    if url.startswith(('redis://', 'rediss://')):
+        return RedisBackend(url)
+    raise ValueError(f"不支持的缓存地址：{url}")
+
+
+def build_cache(url=None, **kwargs):
+    return SharedCache(backend_from_url(url or os.environ.get('ROUTE_CACHE_URL', DEFAULT_CACHE_URL)), **kwargs)
+
+
+def _selfcheck_worker(args):
+    """自检子进程：并发写入、读取自己和其他进程写入的条目"""
+    path, worker_id, n_keys, n_workers = args
+    cache = SharedCache(SQLiteBackend(path), max_entries=64, version_check_s=0.0)
+    for i in range(n_keys):
+        cache.set('walking', f"{worker_id}:{i}", {'worker': worker_id, 'i': i})
+    missing = 0
+    mismatched = 0
+    for other in range(n_workers):
+        for i in range(n_keys):
+            value = cache.get('walking', f"{other}:{i}")
+            if value is None:
+                # 其他进程可能还没写完，只统计自己写入的缺失
+                missing += other == worker_id
+            elif value != {'worker': other, 'i': i}:
+                mismatched += 1
+    return missing, mismatched
+
+
+def selfcheck(processes=8, n_keys=200):
+    """多进程对同一个 SQLite 文件并发读写并检查失效，返回是否通过"""
+    import tempfile
+    from multiprocessing import Pool
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'route_cache.sqlite3')
+        SQLiteBackend(path)
+        started = time.perf_counter()
+        with Pool(processes) as pool:
+            results = pool.map(_selfcheck_worker, [(path, w, n_keys, processes) for w in range(processes)])
+        elapsed = time.perf_counter() - started
+        missing = sum(r[0] for r in results)
+        mismatched = sum(r[1] for r in results)
+
+        # 写完后每个条目都应能从新进程读到
+        reader = SharedCache(SQLiteBackend(path), version_check_s=0.0)
+        absent = sum(reader.get('walking', f"{w}:{i}") is None for w in range(processes) for i in range(n_keys))
+
+        # 另一个进程失效后，带热点层的读者应在刷新版本号后看不到旧条目
+        stale_reader = SharedCache(SQLiteBackend(path), version_check_s=0.0)
+        stale_reader.get('walking', '0:0')
+        with Pool(1) as pool:
+            pool.apply(_selfcheck_invalidate, (path,))
+        stale = stale_reader.get('walking', '0:0') is not None
+
+    total = processes * n_keys
+    print(f"{processes} 个进程各写入 {n_keys} 条，用时 {elapsed:.2f} 秒（{total / elapsed:.0f} 条/秒）")
+    print(f"自身写入缺失 {missing}，内容不一致 {mismatched}，写入后缺失 {absent}，失效后仍可读 {stale}")
+    ok = missing == 0 and mismatched == 0 and absent == 0 and not stale
+    print("自检通过" if ok else "自检失败")
+    return ok
+
+
+def _selfcheck_invalidate(path):
+    SharedCache(SQLiteBackend(path)).invalidate('walking')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='共享路线缓存工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    check = subparsers.add_parser('selfcheck', help='多进程并发读写 SQLite 后端并检查一致性和失效')
+    check.add_argument('--processes', type=int, default=8)
+    check.add_argument('--keys', type=int, default=200, help='每个进程写入的条目数')
+    invalidate = subparsers.add_parser('invalidate', help='使缓存失效（默认所有命名空间）')
+    invalidate.add_argument('namespaces', nargs='*', metavar='namespace',
+                            help=f"要失效的命名空间（默认全部：{'、'.join(NAMESPACES)}）")
+    args = parser.parse_args()
+
+    if args.command == 'selfcheck':
+        raise SystemExit(0 if selfcheck(args.processes, args.keys) else 1)
+    if args.command == 'invalidate':
+        versions = build_cache().invalidate_all(args.namespaces or NAMESPACES)
+        for namespace, version in versions.items():
+            print(f"{namespace} 已失效，当前版本 {version}")
+
+
+if __name__ == "__main__":
+    main()
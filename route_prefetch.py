@@ -0,0 +1,158 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from route_cache import SharedCache
+from routing_providers import TRAVEL_MODES
+from tracing import bind, span
+
+# 共享缓存中路线结果的命名空间，每种出行方式单独一个命名空间（与出行方式同名）
+ROUTE_NAMESPACE = 'walking'
+# 本地直线兜底结果在进程内保留的秒数：期间不再重复请求在线服务商，过期后重试
+LOCAL_FALLBACK_TTL = 60.0
+
+
+def format_coord(lat, lng):
+    """生成路线接口使用的 "lng,lat" 坐标字符串"""
+    return f"{lng},{lat}"
+
+
+def chain_points(start_point, end_point, waypoints):
+    """路段的完整点序列：起点、途经点、终点（均为 [lat, lng]）"""
+    points = [[start_point['lat'], start_point['lon']]]
+    points.extend(waypoints or [])
+    points.append([end_point['lat'], end_point['lon']])
+    return points
+
+
+def cache_key(origin, destination):
+    return f"{origin}|{destination}"
+
+
+class RoutePrefetcher:
+    """路线缓存与后台预取：在 rerun 之前提前请求下一次渲染需要的路段
+
+    fetch(origin, destination, mode) 为路线请求函数（如 HedgedRouter.route）。
+    cache 为 route_cache.SharedCache，多个副本共用同一后端时同一路段只请求一次；
+    不传时只使用进程内缓存。在线服务商都失败时的本地直线兜底结果不写入共享缓存，
+    只在进程内保留 fallback_ttl 秒，避免每次 rerun 都重新等待在线服务商超时
+    """
+
+    def __init__(self, fetch, cache=None, max_workers=4, max_entries=2048, fallback_ttl=LOCAL_FALLBACK_TTL):
+        self.fetch = fetch
+        self.cache = cache if cache is not None else SharedCache(max_entries=max_entries)
+        self.max_entries = max_entries
+        self.fallback_ttl = fallback_ttl
+        self._fallbacks = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='prefetch')
+
+    def _store(self, key, result):
+        if result is None:
+            return
+        if result.get('provider') == 'local':
+            now = time.monotonic()
+            with self._lock:
+                if len(self._fallbacks) >= self.max_entries:
+                    self._fallbacks = {k: v for k, v in self._fallbacks.items() if v[0] > now}
+                self._fallbacks[key] = (now + self.fallback_ttl, result)
+            return
+        origin, destination, mode = key
+        self.cache.set(mode, cache_key(origin, destination), result)
+
+    def _fallback(self, key):
+        """未过期的本地兜底结果"""
+        with self._lock:
+            entry = self._fallbacks.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._fallbacks[key]
+                return None
+            return entry[1]
+
+    def _cached(self, key):
+        origin, destination, mode = key
+        result = self.cache.get(mode, cache_key(origin, destination))
+        return result if result is not None else self._fallback(key)
+
+    def _run(self, key):
+        origin, destination, mode = key
+        try:
+            with span('route.prefetch', origin=origin, destination=destination, mode=mode) as s:
+                result = self._cached(key)
+                s.set(cache_hit=result is not None)
+                if result is not None:
+                    return result
+                result = self.fetch(origin, destination, mode)
+                self._store(key, result)
+                return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def lookup(self, origin, destination, mode=ROUTE_NAMESPACE):
+        """只查进程内热点缓存和本地兜底结果，不访问共享后端，也不发起请求"""
+        result = self.cache.peek(mode, cache_key(origin, destination))
+        return result if result is not None else self._fallback((origin, destination, mode))
+
+    def prefetch(self, origin, destination, mode=ROUTE_NAMESPACE):
+        """在后台请求路段，已缓存或正在请求时直接返回（共享后端的查询也在后台线程中进行）"""
+        key = (origin, destination, mode)
+        if self.lookup(origin, destination, mode) is not None:
+            return
+        with self._lock:
+            if key in self._inflight:
+                return
+            self._inflight[key] = self._executor.submit(bind(self._run), key)
+
+    def get(self, origin, destination, mode=ROUTE_NAMESPACE):
+        """获取路段：优先命中缓存（热点层、共享后端），其次等待进行中的预取，最后同步请求"""
+        key = (origin, destination, mode)
+        with span('route.get', origin=origin, destination=destination, mode=mode) as s:
+            with self._lock:
+                future = self._inflight.get(key)
+            if future is not None:
+                s.set(cache_hit='inflight')
+                return future.result()
+            result = self._cached(key)
+            if result is not None:
+                s.set(cache_hit=True)
+                return result
+            s.set(cache_hit=False)
+            result = self.fetch(origin, destination, mode)
+            self._store(key, result)
+            return result
+
+    def get_modes(self, origin, destination, modes=TRAVEL_MODES):
+        """同时获取多种出行方式的路段：全部提交到后台并发请求，总耗时接近最慢的一种
+
+        返回 {出行方式: 路线数据或 None}
+        """
+        with span('route.modes', origin=origin, destination=destination, modes=len(modes)):
+            for mode in modes:
+                self.prefetch(origin, destination, mode)
+            return {mode: self.get(origin, destination, mode) for mode in modes}
+
+    def prefetch_chain(self, points, mode=ROUTE_NAMESPACE):
+        """按出行方式预取点序列中每一段路线"""
+        for i in range(len(points) - 1):
+            self.prefetch(format_coord(*points[i]), format_coord(*points[i + 1]), mode)
+
+    def prefetch_waypoint_added(self, start_point, end_point, waypoints, new_point, mode=ROUTE_NAMESPACE):
+        """追加途经点后新增的两段：最后一个点→新点，新点→终点"""
+        points = chain_points(start_point, end_point, waypoints)
+        self.prefetch_chain([points[-2], new_point, points[-1]], mode)
+
+    def prefetch_waypoint_removed(self, start_point, end_point, waypoints, index, mode=ROUTE_NAMESPACE):
+        """删除途经点后新增的一段：前一个点→后一个点"""
+        points = chain_points(start_point, end_point, waypoints)
+        self.prefetch_chain([points[index], points[index + 2]], mode)
+
+    def prefetch_nearby(self, start_point, end_point, waypoints, mode=ROUTE_NAMESPACE):
+        """预取用户可能添加的下一个途经点（终点附近推荐地点）对应的两段路线"""
+        points = chain_points(start_point, end_point, waypoints)
+        for places in end_point.get('nearby_places', {}).values():
+            for place in places:
+                self.prefetch_chain([points[-2], [place['lat'], place['lon']], points[-1]], mode)
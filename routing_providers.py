@@ -0,0 +1,484 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from tracing import bind, current_span, percentile, span
+
+
+# 应用内部统一使用高德坐标系（GCJ-02），坐标字符串格式为 "lng,lat"
+X_PI = math.pi * 3000.0 / 180.0
+
+# 步行速度（米/秒），用于本地路由估算时长
+WALKING_SPEED = 1.2
+
+# 支持的出行方式及本地估算使用的平均速度（米/秒，公交含候车和换乘）
+TRAVEL_MODES = ('walking', 'bicycling', 'transit')
+MODE_SPEEDS = {'walking': WALKING_SPEED, 'bicycling': 4.0, 'transit': 5.0}
+# 高德距离测量接口每次请求最多的起点数
+DISTANCE_BATCH = 100
+
+
+def gcj02_to_bd09(lng, lat):
+    """高德坐标（GCJ-02）转百度坐标（BD-09）"""
+    z = math.sqrt(lng * lng + lat * lat) + 0.00002 * math.sin(lat * X_PI)
+    theta = math.atan2(lat, lng) + 0.000003 * math.cos(lng * X_PI)
+    return z * math.cos(theta) + 0.0065, z * math.sin(theta) + 0.006
+
+
+def bd09_to_gcj02(lng, lat):
+    """百度坐标（BD-09）转高德坐标（GCJ-02）"""
+    x = lng - 0.0065
+    y = lat - 0.006
+    z = math.sqrt(x * x + y * y) - 0.00002 * math.sin(y * X_PI)
+    theta = math.atan2(y, x) - 0.000003 * math.cos(x * X_PI)
+    return z * math.cos(theta), z * math.sin(theta)
+
+
+def _gcj02_delta(lng, lat):
+    """GCJ-02 相对 WGS-84 的偏移量（度）"""
+    a = 6378245.0
+    ee = 0.00669342162296594323
+    x = lng - 105.0
+    y = lat - 35.0
+    dlat = (-100.0 + 2.0 * x + 3.0 * y + 0.2 * y * y + 0.1 * x * y + 0.2 * math.sqrt(abs(x))
+            + (20.0 * math.sin(6.0 * x * math.pi) + 20.0 * math.sin(2.0 * x * math.pi)) * 2.0 / 3.0
+            + (20.0 * math.sin(y * math.pi) + 40.0 * math.sin(y / 3.0 * math.pi)) * 2.0 / 3.0
+            + (160.0 * math.sin(y / 12.0 * math.pi) + 320 * math.sin(y * math.pi / 30.0)) * 2.0 / 3.0)
+    dlng = (300.0 + x + 2.0 * y + 0.1 * x * x + 0.1 * x * y + 0.1 * math.sqrt(abs(x))
+            + (20.0 * math.sin(6.0 * x * math.pi) + 20.0 * math.sin(2.0 * x * math.pi)) * 2.0 / 3.0
+            + (20.0 * math.sin(x * math.pi) + 40.0 * math.sin(x / 3.0 * math.pi)) * 2.0 / 3.0
+            + (150.0 * math.sin(x / 12.0 * math.pi) + 300.0 * math.sin(x / 30.0 * math.pi)) * 2.0 / 3.0)
+    rad_lat = lat / 180.0 * math.pi
+    magic = 1 - ee * math.sin(rad_lat) ** 2
+    sqrt_magic = math.sqrt(magic)
+    dlat = (dlat * 180.0) / ((a * (1 - ee)) / (magic * sqrt_magic) * math.pi)
+    dlng = (dlng * 180.0) / (a / sqrt_magic * math.cos(rad_lat) * math.pi)
+    return dlng, dlat
+
+
+def gcj02_to_wgs84(lng, lat):
+    """高德坐标（GCJ-02）转 GPS 坐标（WGS-84），误差约 1 米；国外坐标不做偏移，原样返回"""
+    if not (72.004 <= lng <= 137.8347 and 0.8293 <= lat <= 55.8271):
+        return lng, lat
+    dlng, dlat = _gcj02_delta(lng, lat)
+    return lng - dlng, lat - dlat
+
+
+def parse_coord(coord):
+    """解析 "lng,lat" 字符串"""
+    lng, lat = map(float, coord.split(','))
+    return lng, lat
+
+
+def haversine(lng1, lat1, lng2, lat2):
+    """计算两点之间的球面距离（单位：米）"""
+    R = 6371000
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    delta_phi = math.radians(lat2 - lat1)
+    delta_lambda = math.radians(lng2 - lng1)
+    a = math.sin(delta_phi / 2) ** 2 + \
+        math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
+    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def straight_line_route(origin, destination, speed=WALKING_SPEED):
+    """用直线连接构造与高德返回格式一致的路线数据"""
+    origin_lng, origin_lat = parse_coord(origin)
+    dest_lng, dest_lat = parse_coord(destination)
+    distance = haversine(origin_lng, origin_lat, dest_lng, dest_lat)
+    return {
+        'route': {
+            'paths': [{
+                'distance': str(int(distance)),
+                'duration': str(int(distance / speed)),
+                'steps': [{
+                    'polyline': f"{origin_lng},{origin_lat};{dest_lng},{dest_lat}"
+                }]
+            }]
+        }
+    }
+
+
+def is_valid_route(result):
+    """判断路线结果是否包含可绘制的折线"""
+    try:
+        steps = result['route']['paths'][0]['steps']
+    except (KeyError, IndexError, TypeError):
+        return False
+    return any(step.get('polyline') for step in steps)
+
+
+class LatencyTracker:
+    """记录某个服务商最近的响应耗时，用于估算 p95"""
+
+    def __init__(self, default_p95, window=200, min_samples=20):
+        self.default_p95 = default_p95
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def p95(self):
+        with self._lock:
+            samples = list(self._samples)
+        if len(samples) < self.min_samples:
+            return self.default_p95
+        return percentile(samples, 95)
+
+
+class RoutingProvider:
+    """路线服务商接口：输入输出均为高德坐标，返回高德格式的路线数据，失败返回 None
+
+    每种出行方式对应一个同名方法（walking / bicycling / transit），modes 列出已实现的方式
+    """
+
+    name = 'base'
+    modes = ('walking',)
+
+    def __init__(self, timeout=5.0, default_p95=1.0):
+        self.timeout = timeout
+        self.default_p95 = min(default_p95, timeout)
+        self.latency = LatencyTracker(self.default_p95)
+        self._latency = {'walking': self.latency}
+
+    def latency_for(self, mode):
+        """各出行方式的接口耗时分别统计（公交规划通常明显慢于步行）"""
+        tracker = self._latency.get(mode)
+        if tracker is None:
+            tracker = self._latency.setdefault(mode, LatencyTracker(self.default_p95))
+        return tracker
+
+    def walking(self, origin, destination):
+        raise NotImplementedError
+
+    def walking_distances(self, origins, destination):
+        """多个起点到同一终点的步行时间和距离：返回与 origins 一一对应的 (秒, 米)，无结果的为 None；
+        服务商不支持或请求失败时返回 None"""
+        return None
+
+    def route(self, origin, destination, mode='walking'):
+        """调用服务商并记录耗时（仅记录成功返回的请求）；不支持该出行方式时返回 None"""
+        if mode not in self.modes:
+            return None
+        with span('route.provider', provider=self.name, mode=mode) as s:
+            started = time.perf_counter()
+            result = getattr(self, mode)(origin, destination)
+            ok = is_valid_route(result)
+            s.set(ok=ok)
+            if ok:
+                self.latency_for(mode).record(time.perf_counter() - started)
+                return result
+            return None
+
+
+class AMapProvider(RoutingProvider):
+    """高德地图步行、骑行和公交路线规划"""
+
+    name = 'amap'
+    modes = TRAVEL_MODES
+
+    def __init__(self, api_key, timeout=5.0, default_p95=1.0, host=None, city='0512'):
+        super().__init__(timeout, default_p95)
+        self.api_key = api_key
+        self.city = city
+        # 可通过环境变量 AMAP_REST_HOST 指向本地替身服务（见 amap_stub_server.py）
+        host = (host or os.environ.get('AMAP_REST_HOST', 'https://restapi.amap.com')).rstrip('/')
+        self.base_url = f"{host}/v3/direction/walking"
+        self.bicycling_url = f"{host}/v4/direction/bicycling"
+        self.transit_url = f"{host}/v3/direction/transit/integrated"
+        self.distance_url = f"{host}/v3/distance"
+
+    def walking(self, origin, destination):
+        import requests  # 延迟导入，缩短应用冷启动时间
+
+        params = {
+            'key': self.api_key,
+            'origin': origin,
+            'destination': destination,
+            'output': 'json'
+        }
+        response = requests.get(self.base_url, params=params, timeout=self.timeout)
+        current_span().set(http_status=response.status_code)
+        result = response.json()
+        if result.get('status') == '1':
+            return result
+        return None
+
+    def walking_distances(self, origins, destination):
+        """高德距离测量接口（type=3 步行），一次请求最多 DISTANCE_BATCH 个起点"""
+        import requests  # 延迟导入，缩短应用冷启动时间
+
+        times = []
+        with span('route.distance', provider=self.name, origins=len(origins)) as s:
+            for start in range(0, len(origins), DISTANCE_BATCH):
+                batch = origins[start:start + DISTANCE_BATCH]
+                params = {
+                    'key': self.api_key,
+                    'origins': '|'.join(batch),
+                    'destination': destination,
+                    'type': '3',
+                    'output': 'json'
+                }
+                response = requests.get(self.distance_url, params=params, timeout=self.timeout)
+                s.set(http_status=response.status_code)
+                result = response.json()
+                if result.get('status') != '1':
+                    return None
+                # origin_id 从 1 开始；超出步行测距范围的起点带 code 字段且没有距离
+                found = {}
+                for item in result.get('results', []):
+                    if item.get('distance') and not item.get('code'):
+                        found[int(item['origin_id'])] = (float(item['duration']), float(item['distance']))
+                times.extend(found.get(i + 1) for i in range(len(batch)))
+        return times
+
+    def bicycling(self, origin, destination):
+        import requests  # 延迟导入，缩短应用冷启动时间
+
+        params = {'key': self.api_key, 'origin': origin, 'destination': destination}
+        response = requests.get(self.bicycling_url, params=params, timeout=self.timeout)
+        current_span().set(http_status=response.status_code)
+        result = response.json()
+        # 骑行接口为 v4 版本，返回格式与步行不同
+        paths = (result.get('data') or {}).get('paths') if result.get('errcode') == 0 else None
+        if not paths:
+            return None
+        path = paths[0]
+        return {
+            'status': '1',
+            'route': {
+                'paths': [{
+                    'distance': str(path.get('distance', 0)),
+                    'duration': str(path.get('duration', 0)),
+                    'steps': [{'polyline': step['polyline']} for step in path.get('steps', []) if step.get('polyline')]
+                }]
+            }
+        }
+
+    def transit(self, origin, destination):
+        import requests  # 延迟导入，缩短应用冷启动时间
+
+        params = {
+            'key': self.api_key,
+            'origin': origin,
+            'destination': destination,
+            # city 可以是固定的城市编码，也可以是按起点坐标返回城市编码的函数（多城市部署）
+            'city': self.city(origin) if callable(self.city) else self.city,
+            'output': 'json'
+        }
+        response = requests.get(self.transit_url, params=params, timeout=self.timeout)
+        current_span().set(http_status=response.status_code)
+        result = response.json()
+        transits = result.get('route', {}).get('transits') if result.get('status') == '1' else None
+        if not transits:
+            return None
+
+        # 换乘方案由步行段和公交/地铁段组成，依次拼接各段折线
+        transit = transits[0]
+        steps = []
+        lines = []
+        for segment in transit.get('segments', []):
+            for step in (segment.get('walking') or {}).get('steps', []) or []:
+                if step.get('polyline'):
+                    steps.append({'polyline': step['polyline']})
+            for busline in (segment.get('bus') or {}).get('buslines', []) or []:
+                if busline.get('polyline'):
+                    steps.append({'polyline': busline['polyline']})
+                    lines.append(busline.get('name', ''))
+        return {
+            'status': '1',
+            'route': {
+                'paths': [{
+                    'distance': str(transit.get('distance') or result['route'].get('distance', 0)),
+                    'duration': str(transit.get('duration', 0)),
+                    'walking_distance': str(transit.get('walking_distance', 0)),
+                    'lines': lines,
+                    'steps': steps
+                }]
+            }
+        }
+
+
+class BaiduProvider(RoutingProvider):
+    """百度地图步行路线规划（请求前后自动完成 GCJ-02 与 BD-09 的坐标转换）"""
+
+    name = 'baidu'
+
+    def __init__(self, ak, timeout=5.0, default_p95=1.0, coord_type='bd09ll',
+                 base_url="https://api.map.baidu.com/directionlite/v1/walking"):
+        super().__init__(timeout, default_p95)
+        self.ak = ak
+        self.coord_type = coord_type
+        self.base_url = base_url
+
+    def _to_provider(self, coord):
+        lng, lat = parse_coord(coord)
+        if self.coord_type == 'bd09ll':
+            lng, lat = gcj02_to_bd09(lng, lat)
+        # 百度接口的坐标顺序为 "lat,lng"
+        return f"{lat:.6f},{lng:.6f}"
+
+    def _to_polyline(self, path):
+        points = []
+        for coord in path.split(';'):
+            if not coord:
+                continue
+            lng, lat = parse_coord(coord)
+            if self.coord_type == 'bd09ll':
+                lng, lat = bd09_to_gcj02(lng, lat)
+            points.append(f"{lng:.6f},{lat:.6f}")
+        return ';'.join(points)
+
+    def walking(self, origin, destination):
+        import requests  # 延迟导入，缩短应用冷启动时间
+
+        params = {
+            'ak': self.ak,
+            'origin': self._to_provider(origin),
+            'destination': self._to_provider(destination),
+            'coord_type': self.coord_type,
+            'ret_coordtype': self.coord_type,
+        }
+        response = requests.get(self.base_url, params=params, timeout=self.timeout)
+        current_span().set(http_status=response.status_code)
+        result = response.json()
+        if result.get('status') != 0 or not result.get('result', {}).get('routes'):
+            return None
+
+        # 转换为高德的返回格式，便于下游统一处理
+        route = result['result']['routes'][0]
+        return {
+            'status': '1',
+            'provider': self.name,
+            'route': {
+                'paths': [{
+                    'distance': str(route.get('distance', 0)),
+                    'duration': str(route.get('duration', 0)),
+                    'steps': [
+                        {'polyline': self._to_polyline(step['path'])}
+                        for step in route.get('steps', []) if step.get('path')
+                    ]
+                }]
+            }
+        }
+
+
+class LocalProvider(RoutingProvider):
+    """本地路由：不依赖网络，始终返回直线连接，时长按各出行方式的平均速度估算"""
+
+    name = 'local'
+    modes = TRAVEL_MODES
+
+    def __init__(self):
+        super().__init__(timeout=0.1, default_p95=0.01)
+
+    def _straight(self, origin, destination, mode):
+        result = straight_line_route(origin, destination, MODE_SPEEDS[mode])
+        result['provider'] = self.name
+        return result
+
+    def walking(self, origin, destination):
+        return self._straight(origin, destination, 'walking')
+
+    def bicycling(self, origin, destination):
+        return self._straight(origin, destination, 'bicycling')
+
+    def transit(self, origin, destination):
+        return self._straight(origin, destination, 'transit')
+
+
+class HedgedRouter:
+    """按顺序对冲调用多个服务商：前一个在其 p95 耗时内未返回时启动下一个，取最先返回的有效结果"""
+
+    def __init__(self, providers, fallback=None, max_workers=8):
+        self.providers = list(providers)
+        self.fallback = fallback
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='route')
+
+    def _call(self, provider, origin, destination, mode):
+        try:
+            return provider.route(origin, destination, mode)
+        except Exception:
+            return None
+
+    def route(self, origin, destination, mode='walking'):
+        with span('route.hedged', origin=origin, destination=destination, mode=mode) as s:
+            result = self._route(origin, destination, mode)
+            s.set(provider=result.get('provider', 'amap') if result else None)
+            return result
+
+    def _route(self, origin, destination, mode):
+        pending = {}
+        remaining = [p for p in self.providers if mode in p.modes]
+        deadline = 0.0
+
+        while remaining or pending:
+            # 当前无在途请求或已超过上一个服务商的 p95，启动下一个服务商
+            if remaining and (not pending or time.monotonic() >= deadline):
+                provider = remaining.pop(0)
+                future = self._executor.submit(bind(self._call), provider, origin, destination, mode)
+                pending[future] = provider
+                deadline = time.monotonic() + provider.latency_for(mode).p95()
+
+            timeout = max(deadline - time.monotonic(), 0) if remaining else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.pop(future)
+                result = future.result()
+                if result is not None:
+                    return result
+
+        if self.fallback is not None:
+            return self.fallback.route(origin, destination, mode)
+        return None
+
+    def walking_distances(self, origins, destination):
+        """按顺序询问各服务商的一对多步行距离（不对冲），都不支持或都失败时返回 None"""
+        for provider in self.providers:
+            try:
+                times = provider.walking_distances(origins, destination)
+            except Exception:
+                times = None
+            if times is not None:
+                return times
+        return None
+
+
+def load_baidu_config(path='baidu_map_config.json'):
+    """读取百度地图配置，文件不存在时返回 None"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('baidu_map')
+    except FileNotFoundError:
+        return None
+
+
+def build_router(amap_key, order=None, city='0512'):
+    """根据配置构建路由器，服务商顺序可通过环境变量 ROUTING_PROVIDERS 指定（如 "amap,baidu"）
+
+    city 为公交规划使用的高德城市编码，或按起点坐标返回城市编码的函数
+    """
+    order = order or os.environ.get('ROUTING_PROVIDERS', 'amap,baidu')
+    providers = []
+    for name in [n.strip() for n in order.split(',') if n.strip()]:
+        if name == 'amap' and amap_key:
+            providers.append(AMapProvider(amap_key, city=city))
+        elif name == 'baidu':
+            config = load_baidu_config()
+            if config and config.get('ak'):
+                providers.append(BaiduProvider(
+                    config['ak'],
+                    timeout=config.get('timeout', 5000) / 1000.0,
+                    coord_type=config.get('coord_type', 'bd09ll')
+                ))
+        elif name == 'local':
+            providers.append(LocalProvider())
+    return HedgedRouter(providers, fallback=LocalProvider())
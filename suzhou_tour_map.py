@@ -1,42 +1,35 @@
 import streamlit as st
 import streamlit.components.v1 as components
-import folium
-from folium import plugins
-import pandas as pd
-from streamlit_folium import st_folium
-import time
 import json
-from datetime import datetime
-import numpy as np
 import math
 import os
-from urllib.parse import quote, urlencode
-import requests
+from urllib.parse import urlencode
+from routing_providers import TRAVEL_MODES, build_router
+from route_prefetch import RoutePrefetcher
+from route_cache import build_cache
+from city_packs import DEFAULT_CITY, get_registry
+from recommendations import NearbyRanker
+from itinerary_bundle import load_bundle
+from day_scheduler import apply_schedule, schedule_routes
+from itinerary_export import EXPORT_FORMATS, iter_export, prefetch_legs
+from geocoding import build_geocoder
+from tracing import current_span, span, traced
+
+# folium / streamlit_folium 导入较慢，在首次绘制地图时才加载（见 load_map_libs）
 
 # 从环境变量或 Streamlit Secrets 获取 API 密钥
 def get_api_key():
-    # 优先从 Streamlit Secrets 获取
-    if 'AMAP_API_KEY' in st.secrets:
-        return st.secrets['AMAP_API_KEY']
+    # 优先从 Streamlit Secrets 获取（未配置 secrets.toml 时访问会抛出 FileNotFoundError）
+    try:
+        if 'AMAP_API_KEY' in st.secrets:
+            return st.secrets['AMAP_API_KEY']
+    except FileNotFoundError:
+        pass
     # 否则从环境变量获取
     return os.environ.get('AMAP_API_KEY', '')
 
-# 检查 API 密钥
-api_key = get_api_key()
-if not api_key:
-    st.error('请设置高德地图 API 密钥！')
-    st.stop()
-
-# 设置页面标题和简介
-st.set_page_config(layout="wide")
-st.title('苏州两日精华游')
-st.markdown("""
-这是一份为期两天的苏州精华景点游览路线。每个景点都经过精心挑选，包含了苏州最具代表性的园林、古街、寺庙等景点。
-路线设计考虑了景点之间的距离和游览时间，让您能够充分体验苏州的古典园林之美和江南水乡风情。
-""")
-
-# 添加自定义CSS和JavaScript
-st.markdown("""
+# 自定义CSS
+PAGE_CSS = """
 <style>
     /* 当处于规划模式时，将鼠标改为十字 */
     .planning-mode {
@@ -48,10 +41,10 @@ st.markdown("""
         cursor: pointer !important;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
 
-# 添加JavaScript代码以处理右键点击和鼠标样式
-js_code = """
+# JavaScript代码，用于处理右键点击和鼠标样式
+PAGE_JS = """
 <script>
 // 禁用默认的右键菜单
 document.addEventListener('contextmenu', function(e) {
@@ -73,67 +66,28 @@ function setPlanningMode(enabled) {
 }
 </script>
 """
-st.components.v1.html(js_code, height=0)
-
-# 定义路线数据
-ROUTES = {
-    'day1': {
-        'name': '第一天行程',
-        'points': [
-            {'name': '维也纳国际酒店', 'lat': 31.339867, 'lon': 120.617061, 'info': '酒店位置优越，交通便利', 'type': 'hotel'},
-            {'name': '拙政园', 'lat': 31.330214, 'lon': 120.635739, 'info': '中国四大名园之一，UNESCO世界文化遗产', 'type': 'day1'},
-            {'name': '苏州博物馆', 'lat': 31.329108, 'lon': 120.634235, 'info': '由著名建筑师贝聿铭设计，藏品丰富', 'type': 'day1'},
-            {
-                'name': '平江历史文化街区', 
-                'lat': 31.320661, 
-                'lon': 120.639862, 
-                'info': '保存完好的宋代街区，体现苏州古城风貌', 
-                'type': 'day1',
-                'nearby_places': {
-                    '美食': [
-                        {'name': '松鹤楼', 'desc': '百年老字号，苏州名点', 'lat': 31.321661, 'lon': 120.638862},
-                        {'name': '东山沙锅面', 'desc': '传统苏州面食', 'lat': 31.320861, 'lon': 120.639962},
-                        {'name': '平江路小吃', 'desc': '各类地道苏州小吃', 'lat': 31.320461, 'lon': 120.639762}
-                    ],
-                    '游玩': [
-                        {'name': '平江路工艺品店', 'desc': '传统手工艺品', 'lat': 31.320561, 'lon': 120.639662},
-                        {'name': '评弹博物馆', 'desc': '了解苏州评弹文化', 'lat': 31.320761, 'lon': 120.639562}
-                    ]
-                }
-            }
-        ],
-        'color': 'blue',
-        'description': '第一天主要游览苏州经典园林和历史文化街区，体验苏州的传统文化底蕴。'
-    },
-    'day2': {
-        'name': '第二天行程',
-        'points': [
-            {'name': '维也纳国际酒店', 'lat': 31.339867, 'lon': 120.617061, 'info': '酒店位置优越，交通便利', 'type': 'hotel'},
-            {'name': '留园', 'lat': 31.321718, 'lon': 120.598973, 'info': '以山水园林艺术著称，建筑精美绝伦', 'type': 'day2'},
-            {'name': '寒山寺', 'lat': 31.316962, 'lon': 120.576878, 'info': '闻名于世的佛教古刹，枫桥夜泊胜地', 'type': 'day2'},
-            {
-                'name': '山塘街', 
-                'lat': 31.323273, 
-                'lon': 120.609658, 
-                'info': '千年历史文化街区，古建筑保存完好', 
-                'type': 'day2',
-                'nearby_places': {
-                    '美食': [
-                        {'name': '山塘人家', 'desc': '传统苏帮菜', 'lat': 31.323373, 'lon': 120.609758},
-                        {'name': '五芳斋', 'desc': '百年老字号，特色粽子', 'lat': 31.323173, 'lon': 120.609558},
-                        {'name': '同得兴', 'desc': '传统面点', 'lat': 31.323073, 'lon': 120.609458}
-                    ],
-                    '游玩': [
-                        {'name': '山塘古戏台', 'desc': '传统昆曲表演', 'lat': 31.323473, 'lon': 120.609858},
-                        {'name': '江南丝绸博物馆', 'desc': '了解苏州丝绸文化', 'lat': 31.323573, 'lon': 120.609958}
-                    ]
-                }
-            }
-        ],
-        'color': 'red',
-        'description': '第二天游览苏州另一处著名园林和古街，感受不同风格的园林艺术和市井文化。'
-    }
-}
+
+def init_page():
+    """页面初始化：页面配置、API 密钥检查和自定义样式（须在其他 Streamlit 命令之前调用）"""
+    st.set_page_config(layout="wide")
+
+    # 检查 API 密钥
+    if not get_api_key():
+        st.error('请设置高德地图 API 密钥！')
+        st.stop()
+
+    st.markdown(PAGE_CSS, unsafe_allow_html=True)
+    components.html(PAGE_JS, height=0)
+
+@st.cache_resource
+def load_map_libs():
+    """按需加载地图相关依赖（进程内只加载一次）"""
+    import folium
+    from streamlit_folium import st_folium
+    return folium, st_folium
+
+# 默认城市的路线数据（见 city_packs/suzhou/routes.json；其他模块和静态包构建直接使用）
+ROUTES = get_registry().get(DEFAULT_CITY).routes
 
 # 定义地点类型对应的颜色
 POINT_COLORS = {
@@ -142,6 +96,28 @@ POINT_COLORS = {
     'day2': 'red'
 }
 
+# 附近推荐每个类别显示的地点数
+NEARBY_TOP_K = 3
+
+# 步行等时圈的时间预算（分钟）及填充颜色，由外到内绘制
+ISOCHRONE_BUDGETS = {
+    45: '#c6dbef',
+    30: '#6baed6',
+    15: '#2171b5'
+}
+
+# 出行方式的显示名称，以及高德导航链接中对应的 type 参数
+MODE_LABELS = {
+    'walking': '步行',
+    'bicycling': '骑行',
+    'transit': '公交'
+}
+AMAP_URL_TYPES = {
+    'walking': 'walk',
+    'bicycling': 'ride',
+    'transit': 'bus'
+}
+
 def calculate_distance(lat1, lon1, lat2, lon2):
     """计算两点之间的距离（单位：米）"""
     R = 6371000  # 地球半径（米）
@@ -158,7 +134,7 @@ def calculate_distance(lat1, lon1, lat2, lon2):
 
     return R * c
 
-def get_amap_url(start_point, end_point, waypoints=None):
+def get_amap_url(start_point, end_point, waypoints=None, mode='walking'):
     """生成高德地图导航链接"""
     base_url = "https://maps.amap.com/dir"
     
@@ -172,7 +148,7 @@ def get_amap_url(start_point, end_point, waypoints=None):
         'from[lnglat]': start_coord,
         'to[name]': end_point.get('name', '终点'),
         'to[lnglat]': end_coord,
-        'type': 'walk',  # 步行导航
+        'type': AMAP_URL_TYPES[mode],  # 导航方式：步行 / 骑行 / 公交
         'policy': '0'    # 最优路线
     }
     
@@ -180,43 +156,164 @@ def get_amap_url(start_point, end_point, waypoints=None):
     query_string = urlencode(params, safe=',[]')
     return f"{base_url}?{query_string}"
 
-def mcp_amap_maps_maps_direction_walking(origin, destination):
-    """高德地图步行路线规划API"""
+@st.cache_resource
+def get_router():
+    """构建路线服务商路由器（高德为主，百度为对冲备选，本地直线兜底；公交规划按起点所在城市查询）"""
+    return build_router(get_api_key(), city=get_registry().amap_city_code)
+
+@st.cache_resource
+def get_route_cache():
+    """共享路线缓存（后端由环境变量 ROUTE_CACHE_URL 指定，默认本地 SQLite 文件，多个副本可共用）"""
+    return build_cache()
+
+def get_walk_graph(city=DEFAULT_CITY):
+    """城市包中的本地步行路网，不存在时返回 None（由城市包注册表按需加载和释放，不放进 st.cache_resource）"""
+    return get_registry().get(city).graph
+
+def get_nearby_ranker(city=DEFAULT_CITY):
+    """附近推荐排序器（本地步行路网优先，没有路网时用高德一对多步行距离，排序结果按景点缓存，随城市包释放）"""
+    return get_registry().get(city).resource(
+        'nearby_ranker', lambda pack: NearbyRanker(pack.graph, router=get_router(), cache=get_route_cache())
+    )
+
+@st.cache_data(max_entries=64)
+def get_day_schedule(routes_json, city=DEFAULT_CITY):
+    """按开放时间和游览时长排出每日时间表（景点保持在原定的那一天，只调整游览顺序）"""
+    return schedule_routes(json.loads(routes_json), get_walk_graph(city), cache=get_route_cache())
+
+def get_geocoder(city=DEFAULT_CITY):
+    """批量地理编码：先匹配景点目录和持久缓存，其余地名一轮并发请求远程服务"""
+    return get_registry().get(city).resource(
+        'geocoder', lambda pack: build_geocoder(get_api_key(), pack.routes, get_route_cache(), city=pack.name)
+    )
+
+def active_routes(added_stops, routes=ROUTES):
+    """行程加上用户通过地名添加的景点（接在当天行程末尾）"""
+    if not added_stops:
+        return routes
+    base_routes = routes
+    routes = {}
+    for day_key, day_data in base_routes.items():
+        routes[day_key] = dict(day_data, points=day_data['points'] + added_stops.get(day_key, []))
+    return routes
+
+def draw_isochrones(m, origin, city=DEFAULT_CITY):
+    """以 origin 为起点绘制步行等时圈（结果在路网对象内按起点和时间预算缓存）"""
+    folium, _ = load_map_libs()
+    graph = get_walk_graph(city)
+    if graph is None:
+        st.info(f"城市包 {city} 中没有本地步行路网，请先运行 `python local_graph.py build --city {city}` 生成")
+        return
+
+    geometries = graph.isochrones(origin['lon'], origin['lat'], list(ISOCHRONE_BUDGETS))
+    for budget, color in ISOCHRONE_BUDGETS.items():
+        folium.GeoJson(
+            geometries[budget],
+            name=f"步行{budget}分钟",
+            style_function=lambda _, color=color: {
+                'fillColor': color,
+                'fillOpacity': 0.25,
+                'stroke': False
+            },
+            tooltip=f"{origin['name']}步行{budget}分钟可达"
+        ).add_to(m)
+
+@st.cache_resource(ttl=300)
+def get_static_bundle(city=DEFAULT_CITY):
+    """读取与该城市行程数据匹配的预渲染静态包（itinerary_bundle.py 生成），没有时返回 None"""
+    return load_bundle(get_registry().get(city).routes)
+
+@st.cache_resource
+def get_prefetcher():
+    """路线缓存与后台预取器（进程内共享，结果写入共享路线缓存）"""
+    return RoutePrefetcher(get_router().route, get_route_cache())
+
+def find_route_points(route_key, routes=ROUTES):
+    """根据路段名称查找起点和终点"""
+    for day_data in routes.values():
+        points = day_data['points']
+        for i in range(len(points) - 1):
+            if f"{points[i]['name']}-{points[i + 1]['name']}" == route_key:
+                return points[i], points[i + 1]
+    return None, None
+
+def mcp_amap_maps_maps_direction_walking(origin, destination, mode='walking'):
+    """路线规划API，默认步行（坐标均为高德坐标，返回高德格式的路线数据）"""
     try:
-        base_url = "https://restapi.amap.com/v3/direction/walking"
-        params = {
-            'key': api_key,
-            'origin': origin,
-            'destination': destination,
-            'output': 'json'
-        }
-        
-        response = requests.get(base_url, params=params)
-        result = response.json()
-        
-        if result.get('status') == '1':
-            return result
-        else:
-            # 如果API调用失败，使用直线连接作为备选方案
-            origin_lng, origin_lat = map(float, origin.split(','))
-            dest_lng, dest_lat = map(float, destination.split(','))
-            
-            route_data = {
-                'route': {
-                    'paths': [{
-                        'steps': [{
-                            'polyline': f"{origin_lng},{origin_lat};{dest_lng},{dest_lat}"
-                        }]
-                    }]
-                }
-            }
-            return route_data
+        # 优先使用缓存或后台预取的结果；主服务商在其 p95 耗时内未返回时自动启用备选服务商，都失败时使用直线连接
+        return get_prefetcher().get(origin, destination, mode)
     except Exception as e:
         st.warning(f"路线规划API调用失败: {str(e)}")
         return None
 
-def draw_route_with_waypoints(m, start_point, end_point, waypoints, color):
+@traced('polyline.parse')
+def parse_route_points(result):
+    """从高德格式的路线数据中提取 [lat, lng] 点列表"""
+    points_list = []
+    if result and 'route' in result:
+        route_data = result['route']
+        if 'paths' in route_data and len(route_data['paths']) > 0:
+            path = route_data['paths'][0]
+            for step in path.get('steps', []):
+                if 'polyline' in step:
+                    coords = step['polyline'].split(';')
+                    for coord in coords:
+                        lng, lat = map(float, coord.split(','))
+                        points_list.append([lat, lng])
+    current_span().set(points=len(points_list))
+    return points_list
+
+def create_base_map(city=DEFAULT_CITY):
+    """创建以城市中心为中心的高德底图"""
+    folium, _ = load_map_libs()
+    pack = get_registry().get(city)
+    return folium.Map(
+        location=pack.center,
+        zoom_start=pack.zoom,
+        tiles="http://webrd02.is.autonavi.com/appmaptile?lang=zh_cn&size=1&scale=1&style=7&x={x}&y={y}&z={z}",
+        attr='高德地图'
+    )
+
+def add_point_marker(m, point):
+    """添加景点标记"""
+    folium, _ = load_map_libs()
+    marker_color = POINT_COLORS.get(point['type'], 'green')
+    folium.Marker(
+        [point['lat'], point['lon']],
+        popup=folium.Popup(
+            f"<b>{point['name']}</b><br>{point['info']}",
+            max_width=300
+        ),
+        icon=folium.Icon(color=marker_color)
+    ).add_to(m)
+
+@traced('leg')
+def draw_default_route(m, start_point, end_point, color, mode='walking'):
+    """绘制起点到终点的默认路线（默认步行），返回绘制的 [lat, lng] 点列表（无结果时为空）"""
+    folium, _ = load_map_libs()
+    current_span().set(route_key=f"{start_point['name']}-{end_point['name']}", waypoints=0, mode=mode)
+    result = mcp_amap_maps_maps_direction_walking(
+        origin=f"{start_point['lon']},{start_point['lat']}",
+        destination=f"{end_point['lon']},{end_point['lat']}",
+        mode=mode
+    )
+    points_list = parse_route_points(result)
+    if points_list:
+        folium.PolyLine(
+            points_list,
+            weight=3,
+            color=color,
+            opacity=0.8
+        ).add_to(m)
+    return points_list
+
+@traced('leg')
+def draw_route_with_waypoints(m, start_point, end_point, waypoints, color, mode='walking'):
     """绘制包含途经点的路线"""
+    folium, _ = load_map_libs()
+    current_span().set(route_key=f"{start_point['name']}-{end_point['name']}", waypoints=len(waypoints or []),
+                       mode=mode)
+
     # 构建完整的路径点列表
     all_points = [[start_point['lat'], start_point['lon']]]
     all_points.extend(waypoints or [])
@@ -235,29 +332,18 @@ def draw_route_with_waypoints(m, start_point, end_point, waypoints, color):
             # 调用高德地图API获取路线规划
             result = mcp_amap_maps_maps_direction_walking(
                 origin=f"{curr_start[1]},{curr_start[0]}",
-                destination=f"{curr_end[1]},{curr_end[0]}"
+                destination=f"{curr_end[1]},{curr_end[0]}",
+                mode=mode
             )
             
-            if result and 'route' in result:
-                route_data = result['route']
-                if 'paths' in route_data and len(route_data['paths']) > 0:
-                    path = route_data['paths'][0]
-                    if 'steps' in path:
-                        points_list = []
-                        for step in path['steps']:
-                            if 'polyline' in step:
-                                coords = step['polyline'].split(';')
-                                for coord in coords:
-                                    lng, lat = map(float, coord.split(','))
-                                    points_list.append([lat, lng])
-                        
-                        if points_list:
-                            folium.PolyLine(
-                                points_list,
-                                weight=3,
-                                color=color,
-                                opacity=0.8
-                            ).add_to(m)
+            points_list = parse_route_points(result)
+            if points_list:
+                folium.PolyLine(
+                    points_list,
+                    weight=3,
+                    color=color,
+                    opacity=0.8
+                ).add_to(m)
         except Exception as e:
             # 只在第一次出现错误时显示警告
             if not warning_shown:
@@ -286,7 +372,7 @@ def draw_route_with_waypoints(m, start_point, end_point, waypoints, color):
         ).add_to(m)
     
     # 添加高德地图链接
-    amap_url = get_amap_url(start_point, end_point, waypoints)
+    amap_url = get_amap_url(start_point, end_point, waypoints, mode)
     folium.Element(f"""
         <div style="position: absolute; bottom: 10px; left: 10px; z-index: 1000; background-color: white; padding: 10px; border-radius: 5px; box-shadow: 0 2px 5px rgba(0,0,0,0.2);">
             <a href="{amap_url}" target="_blank" style="text-decoration: none; color: #333;">
@@ -296,45 +382,106 @@ def draw_route_with_waypoints(m, start_point, end_point, waypoints, color):
         </div>
     """).add_to(m)
 
-def main():
-    st.title("苏州两日游路线规划")
-    
-    # 初始化session state
-    if 'manual_routes' not in st.session_state:
-        st.session_state.manual_routes = {}
-    if 'current_route' not in st.session_state:
-        st.session_state.current_route = None
-    if 'waypoints' not in st.session_state:
-        st.session_state.waypoints = {}
-    if 'planning_mode' not in st.session_state:
-        st.session_state.planning_mode = False
-    
+def itinerary_lines(manual_routes, ranker, schedule=None, routes=ROUTES, leg_modes=None):
+    """逐行生成"行程安排"的 Markdown 文本；schedule 为 schedule_routes 的结果时附上每日时间表
+
+    leg_modes 为 {路段名称: 出行方式}，未指定的路段按步行
+    """
+    leg_modes = leg_modes or {}
+    yield "## 行程安排"
+    for day_key, day_data in routes.items():
+        yield f"### {day_data['name']}"
+        yield day_data['description']
+        if schedule is not None:
+            yield "**时间安排（按开放时间和建议游览时长）：**"
+            for stop in schedule['days'].get(day_key, []):
+                wait = f"，等待开门{stop['wait']}分钟" if stop['wait'] > 0 else ""
+                yield f"- {stop['start']}–{stop['depart']} {stop['name']}（{stop['arrive']} 到达{wait}）"
+            unscheduled = [name for name in schedule['unscheduled']
+                           if any(p['name'] == name for p in day_data['points'])]
+            if unscheduled:
+                yield f"- ⚠️ 以下景点无法在开放时间内游览完毕：{'、'.join(unscheduled)}"
+        points = day_data['points']
+        
+        for i in range(len(points) - 1):
+            start_point = points[i]
+            end_point = points[i + 1]
+            route_key = f"{start_point['name']}-{end_point['name']}"
+            
+            # 获取该段路线的途经点
+            waypoints = None
+            if route_key in manual_routes:
+                waypoints = manual_routes[route_key]
+            
+            # 生成高德地图链接
+            mode = leg_modes.get(route_key, 'walking')
+            amap_url = get_amap_url(start_point, end_point, waypoints, mode)
+            
+            label = "" if mode == 'walking' else f"（{MODE_LABELS[mode]}）"
+            yield f"- **{start_point['name']} → {end_point['name']}**{label}"
+            yield f"  - {end_point['info']}"
+            yield f"  - [在高德地图中查看详细路线]({amap_url})"
+            
+            # 如果是终点且有nearby_places信息，显示附近推荐
+            if i == len(points) - 2 and 'nearby_places' in end_point:
+                yield f"  - **{end_point['name']}附近推荐：**"
+                # 按步行时间排序，每个类别只显示最近的几个
+                ranking = ranker.top_k(end_point, k=NEARBY_TOP_K)
+                for category, ranked in ranking.items():
+                    yield f"    - {category}："
+                    for place, seconds, distance, routed in ranked:
+                        # 生成到推荐地点的导航链接
+                        place_url = get_amap_url(
+                            end_point,
+                            {'name': place['name'], 'lat': place['lat'], 'lon': place['lon']}
+                        )
+                        walk = f"步行约{max(1, round(seconds / 60))}分钟" + ("" if routed else "（估算）")
+                        yield f"      - [{place['name']}]({place_url}) ({place['desc']}) - 距离{end_point['name']}约{int(distance)}米，{walk}"
+
+@st.cache_data(max_entries=16, show_spinner="正在生成导出文件...")
+def export_itinerary(fmt, manual_routes_json, routes_json, leg_modes_json='{}', title='苏州行程'):
+    """生成导出文件内容（st.download_button 需要完整数据，命令行导出见 itinerary_export.py，为流式写出）"""
+    manual_routes = json.loads(manual_routes_json)
+    routes = json.loads(routes_json)
+    leg_modes = json.loads(leg_modes_json)
+    prefetch_legs(get_prefetcher(), routes, manual_routes, leg_modes)
+    return ''.join(iter_export(fmt, routes, mcp_amap_maps_maps_direction_walking, manual_routes,
+                               leg_modes=leg_modes, title=title)).encode('utf-8')
+
+def show_export(manual_routes, routes, city=DEFAULT_CITY, leg_modes=None):
+    """导出行程（GPX / GeoJSON），勾选后才生成文件，避免每次 rerun 都请求全部路线"""
+    if not st.checkbox("导出行程路线（GPX / GeoJSON，含途经点）", key="show_export"):
+        return
+    manual_routes_json = json.dumps(manual_routes, sort_keys=True, ensure_ascii=False)
+    routes_json = json.dumps(routes, ensure_ascii=False)
+    # 出行方式也是缓存键的一部分：切换某段的方式后导出对应的路线几何
+    leg_modes_json = json.dumps(leg_modes or {}, sort_keys=True, ensure_ascii=False)
+    title = f"{get_registry().get(city).name}行程"
+    columns = st.columns(len(EXPORT_FORMATS))
+    for column, (fmt, (mime, extension)) in zip(columns, EXPORT_FORMATS.items()):
+        with column:
+            st.download_button(
+                f"下载 {fmt.upper()}",
+                data=export_itinerary(fmt, manual_routes_json, routes_json, leg_modes_json, title),
+                file_name=f"{city}_itinerary.{extension}",
+                mime=mime,
+                key=f"export_{fmt}"
+            )
+
+@traced('folium.assemble')
+def build_map(enable_manual, show_isochrones, hotel, routes, leg_modes=None, city=DEFAULT_CITY):
+    """组装 folium 地图：底图、等时圈、每天的路线和景点标记（启用手动规划时同时显示各路段的规划按钮）"""
     # 创建地图对象
-    m = folium.Map(
-        location=[31.330214, 120.617061],  # 苏州中心位置
-        zoom_start=12,
-        tiles="http://webrd02.is.autonavi.com/appmaptile?lang=zh_cn&size=1&scale=1&style=7&x={x}&y={y}&z={z}",
-        attr='高德地图'
-    )
-    
-    # 添加手动路线规划控件
-    col1, col2 = st.columns(2)
-    with col1:
-        if st.button("重新规划所有路线"):
-            st.session_state.manual_routes = {}
-            st.session_state.current_route = None
-            st.session_state.waypoints = {}
-            st.session_state.planning_mode = False
-            st.rerun()
-    
-    with col2:
-        enable_manual = st.checkbox("启用手动路线规划", key="enable_manual")
+    folium, _ = load_map_libs()
+    m = create_base_map(city)
+    if show_isochrones:
+        draw_isochrones(m, hotel, city)
     
     if enable_manual:
         st.info("使用说明：\n1. 点击'开始规划'按钮选择要规划的路段\n2. 在地图上点击添加途经点\n3. 点击已添加的途经点可以删除它\n4. 点击'完成规划'保存路线")
     
     # 添加景点标记和路线
-    for day_key, day_data in ROUTES.items():
+    for day_key, day_data in routes.items():
         points = day_data['points']
         color = day_data['color']
         
@@ -343,6 +490,7 @@ def main():
             start_point = points[i]
             end_point = points[i + 1]
             route_key = f"{start_point['name']}-{end_point['name']}"
+            mode = (leg_modes or {}).get(route_key, 'walking')
             
             # 如果启用手动规划
             if enable_manual:
@@ -355,6 +503,10 @@ def main():
                         st.session_state.planning_mode = True
                         if route_key not in st.session_state.waypoints:
                             st.session_state.waypoints[route_key] = []
+                        # 预取附近推荐地点作为途经点时的路段
+                        get_prefetcher().prefetch_nearby(
+                            start_point, end_point, st.session_state.waypoints[route_key], mode
+                        )
                         st.rerun()
                 
                 with col2:
@@ -375,7 +527,8 @@ def main():
                         start_point, 
                         end_point, 
                         st.session_state.manual_routes[route_key],
-                        color
+                        color,
+                        mode
                     )
                 elif st.session_state.current_route == route_key and route_key in st.session_state.waypoints:
                     # 显示正在规划的路线
@@ -384,35 +537,12 @@ def main():
                         start_point, 
                         end_point, 
                         st.session_state.waypoints[route_key],
-                        color
+                        color,
+                        mode
                     )
                 else:
                     # 使用默认路线
-                    result = mcp_amap_maps_maps_direction_walking(
-                        origin=f"{start_point['lon']},{start_point['lat']}",
-                        destination=f"{end_point['lon']},{end_point['lat']}"
-                    )
-                    
-                    if result and 'route' in result:
-                        route_data = result['route']
-                        if 'paths' in route_data and len(route_data['paths']) > 0:
-                            path = route_data['paths'][0]
-                            if 'steps' in path:
-                                points_list = []
-                                for step in path['steps']:
-                                    if 'polyline' in step:
-                                        coords = step['polyline'].split(';')
-                                        for coord in coords:
-                                            lng, lat = map(float, coord.split(','))
-                                            points_list.append([lat, lng])
-                                
-                                if points_list:
-                                    folium.PolyLine(
-                                        points_list,
-                                        weight=3,
-                                        color=color,
-                                        opacity=0.8
-                                    ).add_to(m)
+                    draw_default_route(m, start_point, end_point, color, mode)
             except Exception as e:
                 st.warning(f"路线规划失败: {str(e)}")
                 # 使用直线连接作为备选
@@ -426,34 +556,200 @@ def main():
                 ).add_to(m)
             
             # 添加景点标记
-            marker_color = POINT_COLORS.get(start_point['type'], 'green')
-            folium.Marker(
-                [start_point['lat'], start_point['lon']],
-                popup=folium.Popup(
-                    f"<b>{start_point['name']}</b><br>{start_point['info']}",
-                    max_width=300
-                ),
-                icon=folium.Icon(color=marker_color)
-            ).add_to(m)
-            
+            add_point_marker(m, start_point)
             if i == len(points) - 2:
-                marker_color = POINT_COLORS.get(end_point['type'], 'green')
-                folium.Marker(
-                    [end_point['lat'], end_point['lon']],
-                    popup=folium.Popup(
-                        f"<b>{end_point['name']}</b><br>{end_point['info']}",
-                        max_width=300
-                    ),
-                    icon=folium.Icon(color=marker_color)
-                ).add_to(m)
+                add_point_marker(m, end_point)
+    return m
+
+def format_mode_result(result):
+    """路线结果的时长和距离，如 "12分钟 · 1.3公里"；本地直线兜底的结果标注为估算"""
+    if not result:
+        return "无结果"
+    path = result['route']['paths'][0]
+    minutes = max(1, round(float(path.get('duration', 0)) / 60))
+    text = f"{minutes}分钟 · {float(path.get('distance', 0)) / 1000:.1f}公里"
+    if path.get('lines'):
+        text += f"（{' → '.join(path['lines'])}）"
+    if result.get('provider') == 'local':
+        text += "（估算）"
+    return text
+
+def compare_leg_modes(routes):
+    """同时请求每个路段的步行、骑行和公交路线，返回 {路段名称: {出行方式: 路线数据}}
+
+    所有路段和出行方式一次性提交到后台并发请求，各出行方式分别缓存
+    """
+    prefetcher = get_prefetcher()
+    legs = {}
+    for day_data in routes.values():
+        points = day_data['points']
+        for i in range(len(points) - 1):
+            route_key = f"{points[i]['name']}-{points[i + 1]['name']}"
+            legs[route_key] = (f"{points[i]['lon']},{points[i]['lat']}",
+                               f"{points[i + 1]['lon']},{points[i + 1]['lat']}")
+    for origin, destination in legs.values():
+        for mode in TRAVEL_MODES:
+            prefetcher.prefetch(origin, destination, mode)
+    return {route_key: prefetcher.get_modes(origin, destination) for route_key, (origin, destination) in legs.items()}
+
+def show_mode_comparison(routes):
+    """比较每个路段的步行、骑行和公交时长与距离，并为每个路段选择出行方式"""
+    if not st.checkbox("比较交通方式（步行 / 骑行 / 公交）", key="compare_modes"):
+        return
+    with span('mode_comparison'):
+        comparison = compare_leg_modes(routes)
+    st.table([
+        dict({'路段': route_key.replace('-', ' → ')},
+             **{MODE_LABELS[mode]: format_mode_result(results[mode]) for mode in TRAVEL_MODES})
+        for route_key, results in comparison.items()
+    ])
+    labels = list(MODE_LABELS.values())
+    columns = st.columns(3)
+    for i, route_key in enumerate(comparison):
+        current = st.session_state.leg_modes.get(route_key, 'walking')
+        with columns[i % len(columns)]:
+            label = st.selectbox(route_key.replace('-', ' → '), labels,
+                                 index=labels.index(MODE_LABELS[current]), key=f"mode_{route_key}")
+        # 关闭比较后选择框不再渲染，所选方式另存在 leg_modes 中
+        mode = next(mode for mode, mode_label in MODE_LABELS.items() if mode_label == label)
+        if mode == 'walking':
+            st.session_state.leg_modes.pop(route_key, None)
+        else:
+            st.session_state.leg_modes[route_key] = mode
+
+def show_add_stops(city=DEFAULT_CITY):
+    """输入地名添加景点：批量地理编码后接在所选那天的行程末尾"""
+    base_routes = get_registry().get(city).routes
+    with st.expander("添加景点（输入地名自动查找坐标）"):
+        day_keys = {day_data['name']: day_key for day_key, day_data in base_routes.items()}
+        day_key = day_keys[st.selectbox("添加到", list(day_keys), key="add_stop_day")]
+        text = st.text_area("地名（每行一个）", key="add_stop_names")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("查找并添加", key="add_stops"):
+                day_points = active_routes(st.session_state.added_stops, base_routes)[day_key]['points']
+                existing = {point['name'] for point in day_points}
+                missing = []
+                for name, found in get_geocoder(city).geocode(text.splitlines()).items():
+                    if found is None:
+                        missing.append(name)
+                        continue
+                    # 与景点目录匹配时沿用目录中的名称
+                    stop_name = found['name'] if found['source'] == 'catalog' else name
+                    if stop_name in existing:
+                        continue
+                    existing.add(stop_name)
+                    st.session_state.added_stops.setdefault(day_key, []).append({
+                        'name': stop_name,
+                        'lat': found['lat'],
+                        'lon': found['lon'],
+                        'info': found['address'] or '自行添加的景点',
+                        'type': day_key,
+                        'dwell': 60,
+                    })
+                if missing:
+                    st.warning(f"未找到：{'、'.join(missing)}")
+        with col2:
+            if st.session_state.added_stops and st.button("清空添加的景点", key="clear_added_stops"):
+                st.session_state.added_stops = {}
+
+def reset_plan():
+    """清空手动规划、添加的景点和交通方式选择"""
+    st.session_state.manual_routes = {}
+    st.session_state.current_route = None
+    st.session_state.waypoints = {}
+    st.session_state.planning_mode = False
+    st.session_state.added_stops = {}
+    st.session_state.leg_modes = {}
+
+def select_city():
+    """侧边栏选择城市（只有一个城市包时不显示），切换城市时清空上一个城市的规划"""
+    cities = get_registry().available()
+    city = DEFAULT_CITY
+    if len(cities) > 1:
+        names = list(cities.values())
+        name = st.sidebar.selectbox("城市", names, key="city")
+        city = list(cities)[names.index(name)]
+    if st.session_state.get('city_id', city) != city:
+        reset_plan()
+    st.session_state.city_id = city
+    return get_registry().get(city)
+
+@traced('rerun')
+def main():
+    init_page()
+    pack = select_city()
+    st.title(pack.heading)
+    st.markdown(pack.intro)
+    st.title(pack.title)
     
-    # 显示地图并获取点击事件
-    map_data = st_folium(
-        m,
-        width=1200,
-        height=600,
-        key="map"
+    # 初始化session state
+    if 'manual_routes' not in st.session_state:
+        st.session_state.manual_routes = {}
+    if 'current_route' not in st.session_state:
+        st.session_state.current_route = None
+    if 'waypoints' not in st.session_state:
+        st.session_state.waypoints = {}
+    if 'planning_mode' not in st.session_state:
+        st.session_state.planning_mode = False
+    if 'added_stops' not in st.session_state:
+        st.session_state.added_stops = {}
+    if 'leg_modes' not in st.session_state:
+        st.session_state.leg_modes = {}
+    
+    # 添加手动路线规划控件
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("重新规划所有路线"):
+            st.session_state.manual_routes = {}
+            st.session_state.current_route = None
+            st.session_state.waypoints = {}
+            st.session_state.planning_mode = False
+            st.rerun()
+    
+    with col2:
+        enable_manual = st.checkbox("启用手动路线规划", key="enable_manual")
+
+    hotel = next(iter(pack.routes.values()))['points'][0]
+    show_isochrones = st.checkbox(f"显示{hotel['name']}步行等时圈（15/30/45分钟）", key="show_isochrones")
+    show_add_stops(pack.id)
+    routes = active_routes(st.session_state.added_stops, pack.routes)
+    # 地图路线、行程安排、路段比较和导出都按时间表的游览顺序，与每日时间表一致
+    schedule = get_day_schedule(json.dumps(routes, ensure_ascii=False), pack.id)
+    routes = apply_schedule(routes, schedule)
+    show_mode_comparison(routes)
+    leg_modes = st.session_state.leg_modes
+
+    current_span().set(
+        city=pack.id,
+        enable_manual=enable_manual,
+        manual_routes=len(st.session_state.manual_routes),
+        planning_mode=st.session_state.planning_mode,
     )
+
+    # 默认行程直接使用预渲染的静态包，不加载 folium，也不请求路线接口
+    if (not enable_manual and not show_isochrones and not st.session_state.manual_routes
+            and not st.session_state.added_stops and not leg_modes):
+        bundle = get_static_bundle(pack.id)
+        current_span().set(static_bundle=bundle is not None)
+        if bundle is not None:
+            components.html(bundle['map_html'], width=1200, height=600)
+            st.markdown(bundle['itinerary_md'])
+            show_export(st.session_state.manual_routes, routes, pack.id, leg_modes)
+            return
+
+    # 创建地图对象
+    _, st_folium = load_map_libs()
+    m = build_map(enable_manual, show_isochrones, hotel, routes, leg_modes, pack.id)
+    
+    # 显示地图并获取点击事件
+    with span('st_folium'):
+        map_data = st_folium(
+            m,
+            width=1200,
+            height=600,
+            key="map"
+        )
     
     # 处理地图点击事件
     if map_data and map_data.get('last_clicked') and st.session_state.current_route:
@@ -464,6 +760,9 @@ def main():
             # 检查是否点击了已有的途经点
             current_waypoints = st.session_state.waypoints.get(st.session_state.current_route, [])
             clicked_point = [clicked_lat, clicked_lng]
+            route_start, route_end = find_route_points(st.session_state.current_route, routes)
+            prefetcher = get_prefetcher()
+            route_mode = leg_modes.get(st.session_state.current_route, 'walking')
             
             # 检查是否点击了已有的途经点（允许一定的误差范围）
             tolerance = 0.0001  # 约10米的误差范围
@@ -471,7 +770,9 @@ def main():
             for i, point in enumerate(current_waypoints):
                 if (abs(point[0] - clicked_lat) < tolerance and 
                     abs(point[1] - clicked_lng) < tolerance):
-                    # 删除被点击的途经点
+                    # 删除被点击的途经点，并在 rerun 前后台预取合并后的路段
+                    if route_start is not None:
+                        prefetcher.prefetch_waypoint_removed(route_start, route_end, current_waypoints, i, route_mode)
                     current_waypoints.pop(i)
                     clicked_existing = True
                     st.rerun()
@@ -479,49 +780,20 @@ def main():
             
             # 如果不是点击已有途经点，则添加新的途经点
             if not clicked_existing:
+                # 在 rerun 前后台预取新增的两段路线
+                if route_start is not None:
+                    prefetcher.prefetch_waypoint_added(route_start, route_end, current_waypoints, clicked_point,
+                                                       route_mode)
+                    prefetcher.prefetch_nearby(route_start, route_end, current_waypoints + [clicked_point], route_mode)
                 current_waypoints.append(clicked_point)
                 st.rerun()
     
     # 显示行程信息
-    st.write("## 行程安排")
-    for day_key, day_data in ROUTES.items():
-        st.write(f"### {day_data['name']}")
-        st.write(day_data['description'])
-        points = day_data['points']
-        
-        for i in range(len(points) - 1):
-            start_point = points[i]
-            end_point = points[i + 1]
-            route_key = f"{start_point['name']}-{end_point['name']}"
-            
-            # 获取该段路线的途经点
-            waypoints = None
-            if route_key in st.session_state.manual_routes:
-                waypoints = st.session_state.manual_routes[route_key]
-            
-            # 生成高德地图链接
-            amap_url = get_amap_url(start_point, end_point, waypoints)
-            
-            st.write(f"- **{start_point['name']} → {end_point['name']}**")
-            st.write(f"  - {end_point['info']}")
-            st.write(f"  - [在高德地图中查看详细路线]({amap_url})")
-            
-            # 如果是终点且有nearby_places信息，显示附近推荐
-            if i == len(points) - 2 and 'nearby_places' in end_point:
-                st.write(f"  - **{end_point['name']}附近推荐：**")
-                for category, places in end_point['nearby_places'].items():
-                    st.write(f"    - {category}：")
-                    for place in places:
-                        distance = calculate_distance(
-                            end_point['lat'], end_point['lon'],
-                            place['lat'], place['lon']
-                        )
-                        # 生成到推荐地点的导航链接
-                        place_url = get_amap_url(
-                            end_point,
-                            {'name': place['name'], 'lat': place['lat'], 'lon': place['lon']}
-                        )
-                        st.write(f"      - [{place['name']}]({place_url}) ({place['desc']}) - 距离{end_point['name']}约{int(distance)}米")
+    with span('itinerary'):
+        for line in itinerary_lines(st.session_state.manual_routes, get_nearby_ranker(pack.id), schedule, routes,
+                                    leg_modes):
+            st.write(line)
+    show_export(st.session_state.manual_routes, routes, pack.id, leg_modes)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
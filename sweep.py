@@ -0,0 +1,471 @@
+"""
+Parameter sweeps and sensitivity analysis for the fed-batch model (fed_batch.py).
+
+Instead of editing params in 负反馈2.py and rerunning it one point at a time,
+a sweep draws a design over parameter ranges, simulates every point and
+reports per-run metrics:
+
+    n_triggers           number of feed triggers
+    first_trigger_time   time of the first trigger (NaN if the feed never triggers)
+    final_X              microbial concentration at the end of the run
+
+and the solver status of every run (fed_batch.STATUS_*; rk45 runs can stop early at
+max_events or max_steps, and their final_X is then NaN).  For the sensitivity
+indices a feed that never triggers counts as triggering at the end of the run;
+samples with any other NaN (runs that stopped early) are left out with a warning.
+
+Designs (in the unit cube, scaled to the ranges):
+    grid      full factorial with `levels` values per parameter
+    lhs       Latin hypercube (scipy.stats.qmc)
+    sobol     scrambled Sobol sequence
+    saltelli  Sobol matrices A, B and A_B(i) for Sobol indices, N (d + 2) runs
+    morris    r one-at-a-time trajectories for Morris elementary effects, r (d + 1) runs
+
+Runs are split into chunks; each chunk is one vectorized simulate_ensemble()
+call, and chunks are fanned out over a process pool.  Results are cached in
+SQLite keyed by a hash of the full parameter set and the simulation settings,
+so repeated and overlapping sweeps only simulate new points.
+
+Command line:
+    python sweep.py run --design lhs --n 100000 --out sweep.npz
+    python sweep.py sobol --n 4096 --metric n_triggers
+    python sweep.py morris --r 200 --metric first_trigger_time
+    python sweep.py sobol --param mu_max 0.8 1.6 --param k_decay 0.3 1.2
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.stats import qmc
+
+from fed_batch import (DEFAULT_PARAMS, DT, PARAM_NAMES, STATUS_MAX_EVENTS, STATUS_MAX_STEPS, STATUS_OK,
+                       STATUS_STEP_SIZE, TOTAL_TIME, simulate_ensemble)
+
+# Ranges around the hand-tuned values of 负反馈2.py
+DEFAULT_RANGES = {
+    'mu_max': (0.6, 1.8),
+    'K_s': (1.0, 4.0),
+    'Y': (0.3, 0.9),
+    'k_decay': (0.2, 1.2),
+    'threshold_speed': (-0.6, -0.05),
+    'S0': (10.0, 50.0),
+}
+METRICS = ('n_triggers', 'first_trigger_time', 'final_X')
+STATUS_NAMES = {STATUS_MAX_EVENTS: 'max_events', STATUS_MAX_STEPS: 'max_steps', STATUS_STEP_SIZE: 'step size underflow'}
+
+DEFAULT_CACHE_PATH = 'sweep_cache.sqlite3'
+# Runs per simulate_ensemble call (each keeps its trajectories in memory until its metrics are taken)
+CHUNK_SIZE = 2000
+# Rows per SQLite query (below SQLite's limit on bound variables)
+CACHE_BATCH = 900
+# Part of every cache key; bumped when the cached columns change
+CACHE_FORMAT = 2
+
+
+class SweepCache:
+    """Run metrics keyed by parameter hash, in a SQLite file shared by all sweeps"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                " key TEXT PRIMARY KEY, n_triggers INTEGER NOT NULL,"
+                " first_trigger_time REAL, final_X REAL, status INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(runs)")}
+            if 'status' not in columns:
+                # Older caches: their rows no longer match any key (CACHE_FORMAT) and are only kept until cleared
+                self.conn.execute("ALTER TABLE runs ADD COLUMN status INTEGER NOT NULL DEFAULT 0")
+
+    def get_many(self, keys):
+        """{key: (n_triggers, first_trigger_time, final_X, status)} for the keys found"""
+        found = {}
+        for start in range(0, len(keys), CACHE_BATCH):
+            batch = keys[start:start + CACHE_BATCH]
+            placeholders = ','.join('?' * len(batch))
+            rows = self.conn.execute(
+                f"SELECT key, n_triggers, first_trigger_time, final_X, status FROM runs WHERE key IN ({placeholders})",
+                batch
+            )
+            for key, n_triggers, first, final, status in rows:
+                found[key] = (n_triggers, np.nan if first is None else first, np.nan if final is None else final,
+                              status)
+        return found
+
+    def put_many(self, keys, metrics, status):
+        def nullable(value):
+            return None if not np.isfinite(value) else float(value)
+
+        rows = [(key, int(n), nullable(first), nullable(final), int(code))
+                for key, n, first, final, code in zip(keys, *(metrics[name] for name in METRICS), status)]
+        # One transaction for the whole batch
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO runs (key, n_triggers, first_trigger_time, final_X, status)"
+                " VALUES (?, ?, ?, ?, ?)", rows)
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM runs")
+
+
+class SweepResult:
+    """Design points (in parameter units), their metrics and solver status"""
+
+    def __init__(self, names, points, metrics, fixed, n_cached=0, seconds=0.0, status=None):
+        self.names = tuple(names)
+        self.points = points
+        self.metrics = metrics
+        self.status = np.full(len(points), STATUS_OK) if status is None else status
+        self.fixed = fixed
+        self.n_cached = n_cached
+        self.seconds = seconds
+
+    def __len__(self):
+        return len(self.points)
+
+    def column(self, name):
+        return self.points[:, self.names.index(name)]
+
+    def summary(self):
+        """{metric: {min, median, max, nan}} over the runs"""
+        out = {}
+        for name in METRICS:
+            values = self.metrics[name]
+            finite = values[np.isfinite(values)]
+            out[name] = {
+                'min': float(finite.min()) if finite.size else np.nan,
+                'median': float(np.median(finite)) if finite.size else np.nan,
+                'max': float(finite.max()) if finite.size else np.nan,
+                'nan': int(len(values) - finite.size),
+            }
+        return out
+
+    def early_stops(self):
+        """{reason: runs} for the runs that stopped before the end (rk45 only)"""
+        codes, counts = np.unique(self.status[self.status != STATUS_OK], return_counts=True)
+        return {STATUS_NAMES.get(int(code), str(code)): int(count) for code, count in zip(codes, counts)}
+
+    def save(self, path):
+        np.savez_compressed(path, names=np.array(self.names), points=self.points, status=self.status,
+                            fixed=json.dumps(self.fixed), **self.metrics)
+
+    def __repr__(self):
+        return f"SweepResult({len(self)} runs over {', '.join(self.names)}, {self.n_cached} cached)"
+
+
+def scale(unit, ranges):
+    """Map unit-cube points to parameter ranges (columns in the order of ranges)"""
+    low = np.array([lo for lo, _ in ranges.values()], dtype=float)
+    high = np.array([hi for _, hi in ranges.values()], dtype=float)
+    return low + unit * (high - low)
+
+
+def _sobol(d, n, seed):
+    sampler = qmc.Sobol(d, scramble=True, seed=seed)
+    with warnings.catch_warnings():
+        # Balance properties need a power of two; any prefix is still low-discrepancy
+        warnings.simplefilter('ignore', UserWarning)
+        return sampler.random(n)
+
+
+def make_design(design, ranges, n=None, levels=None, seed=42):
+    """Unit-cube design scaled to ranges: grid, lhs or sobol"""
+    d = len(ranges)
+    if design == 'grid':
+        levels = levels or max(2, int(round((n or 1000) ** (1 / d))))
+        axes = [np.linspace(0, 1, levels)] * d
+        unit = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, d)
+    elif design == 'lhs':
+        unit = qmc.LatinHypercube(d, seed=seed).random(n)
+    elif design == 'sobol':
+        unit = _sobol(d, n, seed)
+    else:
+        raise ValueError(f"Unknown design '{design}', expected grid, lhs or sobol")
+    return scale(unit, ranges)
+
+
+def saltelli_design(ranges, n, seed=42):
+    """
+    Saltelli sampling for Sobol indices: rows A (n), B (n), then A with column
+    i taken from B for each parameter i (n each); n (d + 2) rows in total.
+    """
+    d = len(ranges)
+    base = _sobol(2 * d, n, seed)
+    a, b = base[:, :d], base[:, d:]
+    blocks = [a, b]
+    for i in range(d):
+        ab = a.copy()
+        ab[:, i] = b[:, i]
+        blocks.append(ab)
+    return scale(np.vstack(blocks), ranges)
+
+
+def morris_design(ranges, r, levels=4, seed=42):
+    """
+    r Morris trajectories of d + 1 points on a `levels`-level grid; each step
+    changes one parameter by delta = levels / (2 (levels - 1)).  Returns the
+    points and, per trajectory step, the parameter changed and the signed delta.
+    """
+    d = len(ranges)
+    rng = np.random.default_rng(seed)
+    delta = levels / (2 * (levels - 1))
+    # Base values from the grid points that stay inside [0, 1] after adding delta
+    starts = rng.integers(0, levels // 2, size=(r, d)) / (levels - 1)
+    order = np.argsort(rng.random((r, d)), axis=1)
+    signs = rng.choice([-1.0, 1.0], size=(r, d))
+    # A step down from the upper half mirrors a step up from the lower half
+    base = np.where(signs > 0, starts, starts + delta)
+    points = np.empty((r, d + 1, d))
+    points[:, 0] = base
+    for step in range(d):
+        points[:, step + 1] = points[:, step]
+        rows = np.arange(r)
+        points[rows, step + 1, order[:, step]] += signs[rows, order[:, step]] * delta
+    steps = signs[np.arange(r)[:, None], order] * delta
+    return scale(points.reshape(-1, d), ranges), order, steps
+
+
+def _settings_digest(fixed, method, total_time, dt):
+    payload = json.dumps({'fixed': {name: fixed[name] for name in sorted(fixed)}, 'method': method,
+                          'total_time': total_time, 'dt': dt, 'format': CACHE_FORMAT}, sort_keys=True)
+    return hashlib.blake2b(payload.encode(), digest_size=16).digest()
+
+
+def run_keys(full_points, settings_digest):
+    """Cache key per run: hash of the settings and the run's full parameter vector (float64 bytes)"""
+    rows = np.ascontiguousarray(full_points, dtype=np.float64)
+    return [hashlib.blake2b(settings_digest + row.tobytes(), digest_size=16).hexdigest() for row in rows]
+
+
+def _simulate_chunk(job):
+    """Metrics for one chunk of parameter rows (runs in a worker process)"""
+    full_points, method, total_time, dt = job
+    params = {name: full_points[:, i] for i, name in enumerate(PARAM_NAMES)}
+    result = simulate_ensemble(params, total_time=total_time, dt=dt, method=method)
+    metrics = {
+        'n_triggers': result.n_triggers.astype(float),
+        'first_trigger_time': result.first_trigger_time(),
+        'final_X': result.X[:, -1].copy(),
+    }
+    status = np.full(len(full_points), STATUS_OK) if result.status is None else result.status
+    return metrics, status
+
+
+def run_sweep(points, names, fixed=None, method='euler', total_time=TOTAL_TIME, dt=DT, workers=None,
+              cache=None, chunk_size=CHUNK_SIZE):
+    """
+    Simulate every row of points (columns in the order of names); parameters
+    not swept take their values from fixed, then DEFAULT_PARAMS.
+
+    workers  processes for the simulations (None: one per CPU, 1: in-process)
+    cache    a SweepCache, or None to simulate everything
+    """
+    start = time.perf_counter()
+    fixed = {name: float(value) for name, value in {**DEFAULT_PARAMS, **(fixed or {})}.items()
+             if name not in names}
+    points = np.asarray(points, dtype=float)
+    full_points = np.empty((len(points), len(PARAM_NAMES)))
+    for i, name in enumerate(PARAM_NAMES):
+        full_points[:, i] = points[:, names.index(name)] if name in names else fixed[name]
+
+    metrics = {name: np.full(len(points), np.nan) for name in METRICS}
+    status = np.full(len(points), STATUS_OK)
+    todo = np.arange(len(points))
+    keys = None
+    if cache is not None:
+        keys = run_keys(full_points, _settings_digest(fixed, method, total_time, dt))
+        found = cache.get_many(keys)
+        hit = np.array([key in found for key in keys], dtype=bool)
+        for i in np.flatnonzero(hit):
+            (metrics['n_triggers'][i], metrics['first_trigger_time'][i], metrics['final_X'][i],
+             status[i]) = found[keys[i]]
+        todo = np.flatnonzero(~hit)
+
+    chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+    jobs = [(full_points[chunk], method, total_time, dt) for chunk in chunks]
+    if workers == 1 or len(jobs) <= 1:
+        outputs = map(_simulate_chunk, jobs)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        outputs = pool.map(_simulate_chunk, jobs)
+    try:
+        for chunk, (output, chunk_status) in zip(chunks, outputs):
+            for name in METRICS:
+                metrics[name][chunk] = output[name]
+            status[chunk] = chunk_status
+            if cache is not None:
+                cache.put_many([keys[i] for i in chunk], output, chunk_status)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return SweepResult(names, points, metrics, fixed, n_cached=len(points) - len(todo),
+                       seconds=time.perf_counter() - start, status=status)
+
+
+def _sensitivity_values(result, metric, total_time, samples):
+    """
+    Metric values arranged as samples[sample, run] (index array into the runs),
+    and the samples whose runs all have a finite value.
+
+    A feed that never triggers in a run that reached the end counts as
+    triggering at the end (first_trigger_time only).  Any other NaN, e.g.
+    final_X of an rk45 run stopped at max_events, is not imputed: its sample
+    is left out with a warning.
+    """
+    values = result.metrics[metric]
+    if metric == 'first_trigger_time':
+        values = np.where(np.isnan(values) & (result.status == STATUS_OK), total_time, values)
+    y = values[samples]
+    complete = np.flatnonzero(np.isfinite(y).all(axis=1))
+    n_left_out = len(y) - len(complete)
+    if not len(complete):
+        raise ValueError(f"Every sample has a run with NaN {metric}, no indices can be computed")
+    if n_left_out:
+        warnings.warn(f"{n_left_out} of {len(y)} samples left out: {metric} is NaN in some of their runs "
+                      f"(runs stopped early: {result.early_stops() or 'none'})")
+    return y, complete
+
+
+def sobol_indices(result, n, metric='n_triggers', total_time=TOTAL_TIME, n_bootstrap=200, seed=0):
+    """
+    First-order (Saltelli 2010) and total (Jansen) Sobol indices from a run
+    of saltelli_design(); confidence half-widths from bootstrap resampling.
+    Returns {parameter: {'S1', 'S1_conf', 'ST', 'ST_conf'}}.
+    """
+    d = len(result.names)
+    # Sample j consists of row j of each block A, B, A_B(1) ... A_B(d)
+    y, complete = _sensitivity_values(result, metric, total_time, np.arange((d + 2) * n).reshape(d + 2, n).T)
+    y = y.T
+    # Centring leaves the indices unchanged but keeps the first-order estimator's variance down
+    y = y - y[:2, complete].mean()
+    f_a, f_b, f_ab = y[0], y[1], y[2:]
+
+    def indices(rows):
+        a, b, ab = f_a[rows], f_b[rows], f_ab[:, rows]
+        variance = np.var(np.concatenate([a, b]))
+        if variance == 0:
+            return np.zeros(d), np.zeros(d)
+        first = np.mean(b * (ab - a), axis=1) / variance
+        total = 0.5 * np.mean((a - ab) ** 2, axis=1) / variance
+        return first, total
+
+    first, total = indices(complete)
+    rng = np.random.default_rng(seed)
+    samples = [indices(rng.choice(complete, len(complete))) for _ in range(n_bootstrap)]
+    first_conf = 1.96 * np.std([s[0] for s in samples], axis=0)
+    total_conf = 1.96 * np.std([s[1] for s in samples], axis=0)
+    return {name: {'S1': float(first[i]), 'S1_conf': float(first_conf[i]),
+                   'ST': float(total[i]), 'ST_conf': float(total_conf[i])}
+            for i, name in enumerate(result.names)}
+
+
+def morris_indices(result, order, steps, ranges, metric='n_triggers', total_time=TOTAL_TIME):
+    """
+    Morris screening from a run of morris_design(): mean absolute elementary
+    effect mu_star, mean mu and standard deviation sigma per parameter (effects
+    per unit of the normalized range).  Returns {parameter: {'mu_star', 'mu', 'sigma'}}.
+    """
+    d = len(result.names)
+    y, complete = _sensitivity_values(result, metric, total_time, np.arange(len(result)).reshape(-1, d + 1))
+    y, order, steps = y[complete], order[complete], steps[complete]
+    r = len(y)
+    effects = np.empty((r, d))
+    effects[np.arange(r)[:, None], order] = np.diff(y, axis=1) / steps
+    return {name: {'mu_star': float(np.mean(np.abs(effects[:, i]))), 'mu': float(np.mean(effects[:, i])),
+                   'sigma': float(np.std(effects[:, i], ddof=1)) if r > 1 else 0.0}
+            for i, name in enumerate(ranges)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parameter sweeps and sensitivity analysis for fed_batch.py')
+    parser.add_argument('command', choices=['run', 'sobol', 'morris', 'clear-cache'])
+    parser.add_argument('--design', default='lhs', choices=['grid', 'lhs', 'sobol'], help='design for run')
+    parser.add_argument('--n', type=int, default=4096,
+                        help='runs (run), or base samples N for sobol (N (d + 2) runs)')
+    parser.add_argument('--levels', type=int, help='grid levels per parameter (grid design)')
+    parser.add_argument('--r', type=int, default=100, help='Morris trajectories (r (d + 1) runs)')
+    parser.add_argument('--param', nargs=3, action='append', metavar=('NAME', 'LOW', 'HIGH'),
+                        help='parameter range to sweep (repeatable; default: DEFAULT_RANGES)')
+    parser.add_argument('--metric', default='n_triggers', choices=METRICS)
+    parser.add_argument('--method', default='euler', choices=['euler', 'rk45'])
+    parser.add_argument('--total-time', type=float, default=TOTAL_TIME)
+    parser.add_argument('--workers', type=int, help='processes (default: one per CPU)')
+    parser.add_argument('--cache', default=os.environ.get('SWEEP_CACHE', DEFAULT_CACHE_PATH),
+                        help="SQLite cache file, or 'none'")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', help='save the sweep (points and metrics) to this .npz file')
+    args = parser.parse_args()
+
+    cache = None if args.cache == 'none' else SweepCache(args.cache)
+    if args.command == 'clear-cache':
+        if cache is not None:
+            cache.clear()
+        return
+
+    ranges = ({name: (float(low), float(high)) for name, low, high in args.param}
+              if args.param else DEFAULT_RANGES)
+    unknown = set(ranges) - set(PARAM_NAMES)
+    if unknown:
+        raise SystemExit(f"Unknown parameters: {', '.join(sorted(unknown))}")
+    names = list(ranges)
+    options = {'method': args.method, 'total_time': args.total_time, 'workers': args.workers, 'cache': cache}
+
+    if args.command == 'run':
+        points = make_design(args.design, ranges, n=args.n, levels=args.levels, seed=args.seed)
+    elif args.command == 'sobol':
+        points = saltelli_design(ranges, args.n, seed=args.seed)
+    else:
+        points, order, steps = morris_design(ranges, args.r, seed=args.seed)
+    result = run_sweep(points, names, **options)
+    print(f"{len(result)} runs in {result.seconds:.1f} s ({result.n_cached} from cache, "
+          f"{(len(result) - result.n_cached) / max(result.seconds, 1e-9):.0f} simulated runs/s)")
+    early = result.early_stops()
+    if early:
+        print("stopped early (final_X is NaN): " + ', '.join(f"{count} at {reason}" for reason, count in early.items()))
+
+    if args.command == 'run':
+        for metric, stats in result.summary().items():
+            print(f"{metric:<20} min {stats['min']:.4g}  median {stats['median']:.4g}  max {stats['max']:.4g}"
+                  f"  never triggered/NaN {stats['nan']}")
+    elif args.command == 'sobol':
+        try:
+            indices = sobol_indices(result, args.n, args.metric, args.total_time)
+        except ValueError as exc:
+            raise SystemExit(str(exc)) from None
+        print(f"\nSobol indices of {args.metric} (±95% bootstrap)")
+        print(f"{'parameter':<16} {'S1':>14} {'ST':>14}")
+        for name, value in indices.items():
+            print(f"{name:<16} {value['S1']:>7.3f} ±{value['S1_conf']:.3f} "
+                  f"{value['ST']:>7.3f} ±{value['ST_conf']:.3f}")
+    else:
+        try:
+            indices = morris_indices(result, order, steps, ranges, args.metric, args.total_time)
+        except ValueError as exc:
+            raise SystemExit(str(exc)) from None
+        print(f"\nMorris screening of {args.metric}")
+        print(f"{'parameter':<16} {'mu*':>10} {'mu':>10} {'sigma':>10}")
+        for name, value in indices.items():
+            print(f"{name:<16} {value['mu_star']:>10.4g} {value['mu']:>10.4g} {value['sigma']:>10.4g}")
+
+    if args.out:
+        result.save(args.out)
+
+
+if __name__ == "__main__":
+    main()
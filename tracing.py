@@ -0,0 +1,325 @@
+"""
+轻量级 span 追踪：记录每次 rerun 中各环节（路线请求、折线解析、地图组装、st_folium）的耗时，
+写入 JSON Lines 文件，供离线分析
+
+启用（默认关闭，关闭时 span() 直接返回空对象，几乎没有开销）：
+    TRACE_FILE=traces.jsonl TRACE_SAMPLE_RATE=0.2 streamlit run suzhou_tour_map.py
+
+在代码中使用：
+    with span('leg', route_key=route_key) as s:
+        ...
+        s.set(cache_hit=True)
+
+    @traced('polyline.parse')
+    def parse_route_points(result): ...
+
+采样以整条追踪为单位：根 span 决定是否采样，子 span 随之记录或跳过。
+后台线程（预取、对冲请求）中的 span 需用 bind() 包装任务函数才能挂到提交它的 span 下。
+
+每行一条 span：trace_id、span_id、parent_id、name、start（Unix 时间戳）、duration_ms、
+thread、attrs，出错时另有 error。st.rerun() / st.stop() 靠抛出异常实现，
+这类控制流异常不算出错，记在 attrs['control'] 中。
+
+离线分析（按调用路径汇总次数、总耗时、自身耗时和 p50/p95，可输出折叠栈供火焰图工具使用）：
+    python tracing.py report traces.jsonl
+    python tracing.py report traces.jsonl --folded traces.folded
+"""
+import argparse
+import atexit
+import contextvars
+import functools
+import json
+import math
+import os
+import random
+import threading
+import time
+
+_current = contextvars.ContextVar('trace_span', default=None)
+
+# Streamlit 用异常实现的控制流（st.rerun、st.stop），按类名识别，避免依赖 streamlit
+CONTROL_FLOW_EXCEPTIONS = frozenset({'RerunException', 'StopException'})
+
+
+class _NoopSpan:
+    """追踪关闭或未被采样时使用的空 span"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        return self
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _Unsampled(_NoopSpan):
+    """未被采样的追踪：作为上下文中的当前 span，使其子 span 也跳过"""
+
+    __slots__ = ('_token',)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        return False
+
+
+class Span:
+    __slots__ = ('tracer', 'name', 'trace_id', 'span_id', 'parent_id', 'attrs',
+                 'start', '_started', '_token')
+
+    def __init__(self, tracer, name, parent, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.trace_id = parent.trace_id if parent is not None else self.span_id
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def __enter__(self):
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._started
+        _current.reset(self._token)
+        record = {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': round(self.start, 6),
+            'duration_ms': round(duration * 1000, 3),
+            'thread': threading.current_thread().name,
+            'attrs': self.attrs,
+        }
+        if exc_type is not None:
+            if exc_type.__name__ in CONTROL_FLOW_EXCEPTIONS:
+                self.attrs['control'] = exc_type.__name__
+            else:
+                record['error'] = exc_type.__name__
+        self.tracer.emit(record, flush=self.parent_id is None)
+        return False
+
+
+class Tracer:
+    """把结束的 span 写入 JSON Lines 文件；缓冲后一次写入，多进程追加同一文件时各行保持完整"""
+
+    def __init__(self, path, sample_rate=1.0, buffer_size=64):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def emit(self, record, flush=False):
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        with self._lock:
+            self._buffer.append(line)
+            if flush or len(self._buffer) >= self.buffer_size:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._buffer:
+            os.write(self._fd, ''.join(self._buffer).encode('utf-8'))
+            self._buffer = []
+
+
+_tracer = None
+
+
+def configure(path=None, sample_rate=None):
+    """启用或关闭追踪；path 为空时从环境变量 TRACE_FILE 读取，仍为空则关闭"""
+    global _tracer
+    path = path or os.environ.get('TRACE_FILE')
+    if sample_rate is None:
+        sample_rate = float(os.environ.get('TRACE_SAMPLE_RATE', '1.0'))
+    if _tracer is not None:
+        _tracer.flush()
+    _tracer = Tracer(path, sample_rate) if path else None
+    return _tracer
+
+
+def enabled():
+    return _tracer is not None
+
+
+def span(name, **attrs):
+    """创建 span（用作上下文管理器）；没有父 span 时为根 span，并在此决定整条追踪是否采样"""
+    tracer = _tracer
+    if tracer is None:
+        return NOOP_SPAN
+    parent = _current.get()
+    if parent is None:
+        if tracer.sample_rate < 1.0 and random.random() >= tracer.sample_rate:
+            return _Unsampled()
+    elif not isinstance(parent, Span):
+        return NOOP_SPAN
+    return Span(tracer, name, parent, attrs)
+
+
+def current_span():
+    """当前 span，用于补充属性；不在 span 内时返回空 span"""
+    current = _current.get()
+    return current if current is not None else NOOP_SPAN
+
+
+def traced(name):
+    """函数装饰器：每次调用记录一个 span"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def bind(fn):
+    """让提交到线程池的任务继承当前 span；追踪关闭时原样返回"""
+    if _tracer is None or _current.get() is None:
+        return fn
+    context = contextvars.copy_context()
+    return functools.partial(context.run, fn)
+
+
+configure()
+
+
+@atexit.register
+def _flush_at_exit():
+    if _tracer is not None:
+        _tracer.flush()
+
+
+def load_spans(paths):
+    spans = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        spans.append(json.loads(line))
+                    except ValueError:
+                        continue
+    return spans
+
+
+def percentile(values, q):
+    """最近秩法求百分位数（报告、压测和服务商 p95 估算共用）；values 为空时返回 NaN"""
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(spans):
+    """按调用路径（根;子;孙）汇总：{路径: {'count', 'total_ms', 'self_ms', 'durations', 'errors'}}"""
+    by_id = {s['span_id']: s for s in spans}
+    child_total = {}
+    for s in spans:
+        if s.get('parent_id') in by_id:
+            child_total[s['parent_id']] = child_total.get(s['parent_id'], 0.0) + s['duration_ms']
+
+    paths = {}
+
+    def path_of(s):
+        if s['span_id'] not in paths:
+            parent = by_id.get(s.get('parent_id'))
+            # 父 span 缺失（例如进程退出前未写入）时作为根处理
+            paths[s['span_id']] = f"{path_of(parent)};{s['name']}" if parent is not None else s['name']
+        return paths[s['span_id']]
+
+    summary = {}
+    for s in spans:
+        entry = summary.setdefault(path_of(s), {'count': 0, 'total_ms': 0.0, 'self_ms': 0.0,
+                                                'durations': [], 'errors': 0})
+        entry['count'] += 1
+        entry['total_ms'] += s['duration_ms']
+        # 子 span 在其他线程中并行执行时总和可能超过父 span，自身耗时取 0
+        entry['self_ms'] += max(s['duration_ms'] - child_total.get(s['span_id'], 0.0), 0.0)
+        entry['durations'].append(s['duration_ms'])
+        entry['errors'] += 'error' in s
+    return summary
+
+
+def print_report(summary, top=None):
+    roots_total = sum(v['total_ms'] for k, v in summary.items() if ';' not in k) or 1.0
+    print(f"{'调用路径':<48} {'次数':>6} {'总耗时(ms)':>11} {'占比':>6} {'自身(ms)':>10} "
+          f"{'p50(ms)':>9} {'p95(ms)':>9} {'错误':>4}")
+
+    def children(prefix):
+        depth = prefix.count(';') + 1 if prefix else 0
+        keys = [k for k in summary if k.count(';') == depth and (not prefix or k.startswith(prefix + ';'))]
+        return sorted(keys, key=lambda k: -summary[k]['total_ms'])
+
+    def walk(prefix, shown):
+        for key in children(prefix):
+            if top is not None and shown[0] >= top:
+                return
+            shown[0] += 1
+            entry = summary[key]
+            depth = key.count(';')
+            label = '  ' * depth + key.rsplit(';', 1)[-1]
+            print(f"{label:<48} {entry['count']:>6} {entry['total_ms']:>11.1f} "
+                  f"{entry['total_ms'] / roots_total:>6.1%} {entry['self_ms']:>10.1f} "
+                  f"{percentile(entry['durations'], 50):>9.2f} {percentile(entry['durations'], 95):>9.2f} "
+                  f"{entry['errors']:>4}")
+            walk(key, shown)
+
+    walk('', [0])
+
+
+def write_folded(summary, path):
+    """折叠栈格式（每行 "路径 自身耗时微秒"），可直接交给 flamegraph.pl 或 speedscope"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for key, entry in sorted(summary.items()):
+            f.write(f"{key} {int(round(entry['self_ms'] * 1000))}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='追踪文件分析工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    report = subparsers.add_parser('report', help='按调用路径汇总耗时')
+    report.add_argument('files', nargs='+', help='JSON Lines 追踪文件')
+    report.add_argument('--top', type=int, help='只显示前 N 行')
+    report.add_argument('--folded', help='同时输出折叠栈文件，供火焰图工具使用')
+    args = parser.parse_args()
+
+    if args.command == 'report':
+        spans = load_spans(args.files)
+        traces = len({s['trace_id'] for s in spans})
+        print(f"{len(spans)} 个 span，{traces} 条追踪")
+        summary = summarize(spans)
+        print_report(summary, args.top)
+        if args.folded:
+            write_folded(summary, args.folded)
+            print(f"折叠栈已写入 {args.folded}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Uncertainty of fitted kinetic parameters by bootstrap and Monte-Carlo refits.
+
+The analysis scripts report a single point estimate and drop curve_fit's
+pcov.  Here the model is first fitted to the data (batch_fit.fit_batch), then
+n_resamples synthetic data sets are generated and refitted in vectorized
+batches, every refit warm-started from the base fit:
+
+    residual     fitted curve + base-fit residuals resampled with replacement
+                 (centred and inflated by sqrt(n / (n - k)) for the lost degrees of freedom)
+    parametric   fitted curve + N(0, s^2), s^2 = SSE / (n - k)
+    montecarlo   measured data + N(0, sigma^2): propagates a known measurement error
+                 (sigma scalar or per point, default s)
+
+Resamples are split into chunks of CHUNK_SIZE; each chunk draws from its own
+stream spawned from one SeedSequence, so the samples depend only on the seed,
+not on how the chunks are spread across the process pool.
+
+Warm starts make the refits cheap, but they also keep them near the base fit
+along directions the data do not constrain.  Compare stderr with
+linear_stderr (curve_fit's pcov at the base fit): a parameter whose linearized
+error is far larger than its resampled spread (such as the carrying capacity
+of PINN 与实验微生物浓度对比_0) is not identified, and its interval means nothing.
+
+    result = fit_uncertainty(logistic_decay, t, y, method='residual', n_resamples=10000)
+    result.params                    base fit
+    result.interval(0.95)            percentile intervals (lower, upper)
+    result.correlation               parameter correlations over the resamples
+    result.linear_stderr             sqrt(diag(pcov)) of the base fit, for comparison
+
+Command line (first CSV column is time, every other column is a series):
+    python uq.py 生成数据_带噪音.csv --model exp_decay_offset --method residual --n 10000
+Benchmarks: python bench_uq.py
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from batch_fit import fit_batch, read_series_csv
+from kinetic_models import MODELS, get_model, model_reference, resolve_model
+
+METHODS = ('residual', 'parametric', 'montecarlo')
+DEFAULT_RESAMPLES = 10000
+DEFAULT_LEVEL = 0.95
+SEED = 42
+
+# Resamples per vectorized refit (and per task sent to the process pool)
+CHUNK_SIZE = 2000
+
+
+class UQResult:
+    """Base fit and refitted resamples of fit_uncertainty"""
+
+    def __init__(self, model, params, sse, base_covariance, samples, converged, method, seconds):
+        self.model = model
+        self.params = params
+        self.sse = sse
+        self.base_covariance = base_covariance
+        self.samples = samples
+        self.converged = converged
+        self.method = method
+        self.seconds = seconds
+
+    @property
+    def n_resamples(self):
+        return len(self.samples)
+
+    @property
+    def valid(self):
+        """Refits that converged to finite parameters; statistics use only these"""
+        return self.samples[self.converged & np.isfinite(self.samples).all(axis=1)]
+
+    def interval(self, level=DEFAULT_LEVEL):
+        """Percentile interval per parameter: (lower, upper)"""
+        tail = 50 * (1 - level)
+        lower, upper = np.percentile(self.valid, [tail, 100 - tail], axis=0)
+        return lower, upper
+
+    @property
+    def stderr(self):
+        return self.valid.std(axis=0, ddof=1)
+
+    @property
+    def linear_stderr(self):
+        return np.sqrt(np.abs(np.diagonal(self.base_covariance)))
+
+    @property
+    def covariance(self):
+        return np.cov(self.valid, rowvar=False)
+
+    @property
+    def correlation(self):
+        return np.corrcoef(self.valid, rowvar=False)
+
+    def summary(self, level=DEFAULT_LEVEL):
+        """{parameter: {'estimate', 'stderr', 'linear_stderr', 'lower', 'upper'}}"""
+        lower, upper = self.interval(level)
+        stderr, linear_stderr = self.stderr, self.linear_stderr
+        return {name: {'estimate': float(self.params[i]), 'stderr': float(stderr[i]),
+                       'linear_stderr': float(linear_stderr[i]), 'lower': float(lower[i]), 'upper': float(upper[i])}
+                for i, name in enumerate(self.model.param_names)}
+
+    def __repr__(self):
+        return (f"UQResult({self.model.name}, {self.method}, {len(self.valid)}/{self.n_resamples} "
+                f"resamples, {self.seconds:.2f} s)")
+
+
+def linear_covariance(model, t, params, sse, dof):
+    """curve_fit's pcov at params: SVD of the Jacobian, tiny singular values dropped, scaled by SSE / dof"""
+    jac = np.broadcast_to(model.jac(t, *params), (len(t), model.n_params))
+    _, s, vt = np.linalg.svd(jac, full_matrices=False)
+    keep = s > np.finfo(float).eps * max(jac.shape) * s[0]
+    vt = vt[:keep.sum()]
+    return (vt.T / s[keep] ** 2) @ vt * (sse / dof)
+
+
+def synthetic_data(method, y, fitted, residuals, sigma, size, rng):
+    """size data sets of the given resampling method: (size, n_points); residuals already centred and inflated"""
+    if method == 'residual':
+        return fitted + rng.choice(residuals, (size, len(y)))
+    if method == 'parametric':
+        return fitted + rng.normal(0.0, sigma, (size, len(y)))
+    return y + rng.normal(0.0, sigma, (size, len(y)))
+
+
+def _resample_chunk(job):
+    """Generate and refit one chunk of resamples (runs in a worker process)"""
+    model, t, y, fitted, residuals, sigma, params, method, size, seed = job
+    model = resolve_model(model)
+    rng = np.random.default_rng(seed)
+    data = synthetic_data(method, y, fitted, residuals, sigma, size, rng)
+    result = fit_batch(model, t, data, p0=params, workers=1)
+    return result.params, result.converged
+
+
+def fit_uncertainty(model, t, y, method='residual', n_resamples=DEFAULT_RESAMPLES, p0=None, sigma=None,
+                    seed=SEED, workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Fit model to (t, y) and refit n_resamples resampled data sets.
+
+    method   'residual', 'parametric' or 'montecarlo' (see the module docstring)
+    sigma    measurement sd for 'montecarlo' (scalar or per point); default
+             the residual sd of the base fit
+    workers  processes for the refits (None: one per CPU, 1: in-process)
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method '{method}', expected one of {', '.join(METHODS)}")
+    model = resolve_model(model)
+    start = time.perf_counter()
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    keep = np.isfinite(t) & np.isfinite(y)
+    t, y = t[keep], y[keep]
+
+    base = fit_batch(model, t, y[None, :], p0=p0, workers=1)
+    if not base.converged[0]:
+        raise RuntimeError(f"Base fit of {model.name} did not converge")
+    params, sse = base.params[0], float(base.sse[0])
+    fitted = model(t, *params)
+    residuals = y - fitted
+    dof = len(y) - model.n_params
+    if dof <= 0:
+        raise ValueError(f"{len(y)} points cannot constrain {model.n_params} parameters")
+    if method == 'residual':
+        # Resampled residuals are centred and inflated for the degrees of freedom spent on the fit
+        residuals = (residuals - residuals.mean()) * np.sqrt(len(y) / dof)
+    if sigma is None:
+        sigma = np.sqrt(sse / dof)
+
+    sizes = [min(chunk_size, n_resamples - i) for i in range(0, n_resamples, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    model_ref = model_reference(model)
+    jobs = [(model_ref, t, y, fitted, residuals, sigma, params, method, size, chunk_seed)
+            for size, chunk_seed in zip(sizes, seeds)]
+    if workers == 1 or len(jobs) <= 1:
+        outputs = list(map(_resample_chunk, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outputs = list(pool.map(_resample_chunk, jobs))
+
+    samples = np.concatenate([output[0] for output in outputs]) if outputs else np.empty((0, model.n_params))
+    converged = np.concatenate([output[1] for output in outputs]) if outputs else np.empty(0, dtype=bool)
+    covariance = linear_covariance(model, t, params, sse, dof)
+    return UQResult(model, params, sse, covariance, samples, converged, method, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bootstrap / Monte-Carlo intervals for fitted kinetic parameters')
+    parser.add_argument('csv', help='first column time, every other column one series')
+    parser.add_argument('--model', default='logistic_decay', choices=sorted(MODELS))
+    parser.add_argument('--method', default='residual', choices=METHODS)
+    parser.add_argument('--n', type=int, default=DEFAULT_RESAMPLES, help='resamples per series')
+    parser.add_argument('--level', type=float, default=DEFAULT_LEVEL, help='interval coverage')
+    parser.add_argument('--sigma', type=float, help='measurement sd for --method montecarlo')
+    parser.add_argument('--p0', type=float, nargs='+', help='initial parameters (default: model.p0)')
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--workers', type=int, help='processes for the refits')
+    args = parser.parse_args()
+
+    model = get_model(args.model)
+    names, t, y = read_series_csv(args.csv)
+    for name, series in zip(names, y):
+        try:
+            result = fit_uncertainty(model, t, series, method=args.method, n_resamples=args.n, p0=args.p0,
+                                     sigma=args.sigma, seed=args.seed, workers=args.workers)
+        except (RuntimeError, ValueError) as exc:
+            # A series that cannot be fitted (too few points, no convergence) is skipped
+            print(f"{name}: {exc}")
+            continue
+        print(f"{name}: {len(result.valid)}/{result.n_resamples} {args.method} resamples in {result.seconds:.2f} s")
+        for param, row in result.summary(args.level).items():
+            print(f"  {param:<18} {row['estimate']:>12.6g}  ±{row['stderr']:<10.3g} "
+                  f"{args.level:.0%} [{row['lower']:.6g}, {row['upper']:.6g}]  (pcov ±{row['linear_stderr']:.3g})")
+        correlation = result.correlation
+        print("  correlation  " + ' '.join(f"{param:>10}" for param in model.param_names))
+        for param, row in zip(model.param_names, np.atleast_2d(correlation)):
+            print(f"  {param:<12} " + ' '.join(f"{value:>10.3f}" for value in row))
+
+
+if __name__ == "__main__":
+    main()